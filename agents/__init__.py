@@ -1,5 +1,10 @@
 # Dit bestand maakt de agents directory een Python package
 
-from .workflow import process_query
-
 __all__ = ['process_query']
+
+def __getattr__(name):
+    # Importeer de workflow pas bij gebruik, zodat 'import agents' snel blijft
+    if name == 'process_query':
+        from .workflow import process_query
+        return process_query
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
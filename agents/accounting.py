@@ -0,0 +1,236 @@
+"""
+Verbruik per run: LLM calls, tokens, tool calls en kosten, met budgetten.
+
+Een UsageCallbackHandler wordt per run in de config meegegeven en ziet via de
+LangChain callbacks elke model- en tool-aanroep, ook die binnen nodes. Het
+verbruik wordt per node bijgehouden (metadata `langgraph_node`). Als een run
+over zijn budget gaat wordt de volgende aanroep geweigerd met een
+BudgetExceededError; de entry points vangen die af en geven de run terug met
+een duidelijke foutmelding en het verbruik tot dan toe.
+"""
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import logging
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prijzen in dollar per miljoen tokens (input, output), op model prefix
+MODEL_PRICES = {
+    "claude-3-opus": (15.0, 75.0),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-haiku": (0.25, 1.25),
+}
+
+class BudgetExceededError(RuntimeError):
+    """Een run is over zijn budget gegaan."""
+
+    def __init__(self, message: str, usage: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.usage = usage or {}
+
+def model_cost(model: Optional[str], input_tokens: int, output_tokens: int) -> float:
+    """Kosten in dollar voor een aantal tokens; 0 voor onbekende modellen."""
+    for prefix, (input_price, output_price) in sorted(MODEL_PRICES.items(), key=lambda p: -len(p[0])):
+        if model and model.startswith(prefix):
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+def _env_number(name: str, default: Optional[float], cast=int):
+    value = getenv(name, "")
+    if value == "":
+        return default
+    if value.lower() in ("none", "0", "off"):
+        return None
+    return cast(value)
+
+@dataclass
+class RunBudget:
+    """Limieten per run; None betekent onbeperkt."""
+    max_llm_calls: Optional[int] = 30
+    max_tool_calls: Optional[int] = 60
+    max_input_tokens: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = 1.0
+
+    @classmethod
+    def from_env(cls) -> "RunBudget":
+        """Lees de limieten uit RUN_BUDGET_* environment variables (0 of none = onbeperkt)."""
+        defaults = cls()
+        return cls(
+            max_llm_calls=_env_number("RUN_BUDGET_LLM_CALLS", defaults.max_llm_calls),
+            max_tool_calls=_env_number("RUN_BUDGET_TOOL_CALLS", defaults.max_tool_calls),
+            max_input_tokens=_env_number("RUN_BUDGET_INPUT_TOKENS", defaults.max_input_tokens),
+            max_output_tokens=_env_number("RUN_BUDGET_OUTPUT_TOKENS", defaults.max_output_tokens),
+            max_cost_usd=_env_number("RUN_BUDGET_COST_USD", defaults.max_cost_usd, cast=float),
+        )
+
+@dataclass
+class NodeUsage:
+    """Verbruik van een enkele node (of van de hele run)."""
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    tool_calls: Dict[str, int] = field(default_factory=dict)
+    cost_usd: float = 0.0
+
+    @property
+    def total_tool_calls(self) -> int:
+        return sum(self.tool_calls.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["cost_usd"] = round(self.cost_usd, 6)
+        return data
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Verzamelt het verbruik van een run en bewaakt het budget."""
+
+    # Fouten (zoals BudgetExceededError) moeten de aanroep echt afbreken
+    raise_error = True
+    # Ook in async runs direct in de aanroepende task draaien
+    run_inline = True
+
+    def __init__(self, budget: Optional[RunBudget] = None):
+        self.budget = budget or RunBudget()
+        self.total = NodeUsage()
+        self.nodes: Dict[str, NodeUsage] = {}
+        self._runs: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _node(self, metadata: Optional[Dict[str, Any]]) -> str:
+        return (metadata or {}).get("langgraph_node") or "-"
+
+    def _check_budget(self, kind: str) -> None:
+        """Weiger een nieuwe aanroep van deze soort ("llm" of "tool") als het budget op is."""
+        budget, total = self.budget, self.total
+        limits = [
+            ("input tokens", total.input_tokens, budget.max_input_tokens),
+            ("output tokens", total.output_tokens, budget.max_output_tokens),
+            ("kosten (USD)", total.cost_usd, budget.max_cost_usd),
+        ]
+        if kind == "llm":
+            limits.append(("LLM calls", total.llm_calls, budget.max_llm_calls))
+        else:
+            limits.append(("tool calls", total.total_tool_calls, budget.max_tool_calls))
+        for label, used, limit in limits:
+            if limit is not None and used >= limit:
+                message = f"Budget overschreden: {label} {used:g} van maximaal {limit:g}"
+                logger.warning(message)
+                raise BudgetExceededError(message, self.as_dict())
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        model = (metadata or {}).get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model")
+        node = self._node(metadata)
+        with self._lock:
+            # Eerst controleren, zodat een run over budget geen nieuwe call meer doet
+            self._check_budget("llm")
+            self._runs[run_id] = (node, model)
+            self.total.llm_calls += 1
+            self.nodes.setdefault(node, NodeUsage()).llm_calls += 1
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not (input_tokens or output_tokens):
+            usage = (response.llm_output or {}).get("usage") or {}
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+
+        with self._lock:
+            node, model = self._runs.pop(run_id, ("-", None))
+            cost = model_cost(model, input_tokens, output_tokens)
+            for usage_entry in (self.total, self.nodes.setdefault(node, NodeUsage())):
+                usage_entry.input_tokens += input_tokens
+                usage_entry.output_tokens += output_tokens
+                usage_entry.cost_usd += cost
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        self.record_tool_call((serialized or {}).get("name") or "tool", self._node(metadata))
+
+    def record_tool_call(self, name: str, node: str = "-") -> None:
+        """Tel een tool aanroep; ook voor tools die direct (zonder callbacks) aangeroepen worden."""
+        with self._lock:
+            self._check_budget("tool")
+            for usage_entry in (self.total, self.nodes.setdefault(node, NodeUsage())):
+                usage_entry.tool_calls[name] = usage_entry.tool_calls.get(name, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Totalen en verbruik per node, voor de eindstatus en logs."""
+        return {
+            **self.total.as_dict(),
+            "nodes": {node: usage.as_dict() for node, usage in self.nodes.items()},
+        }
+
+    def summary(self) -> str:
+        total = self.total
+        return (
+            f"{total.llm_calls} LLM calls, {total.input_tokens} input / {total.output_tokens} output tokens, "
+            f"{total.total_tool_calls} tool calls, ${total.cost_usd:.4f}"
+        )
+
+def track_usage(config: Dict[str, Any], budget: Optional[RunBudget] = None) -> UsageCallbackHandler:
+    """
+    Voeg een UsageCallbackHandler toe aan de config van een run.
+
+    Returns:
+        De handler, om na de run het verbruik uit te lezen
+    """
+    handler = UsageCallbackHandler(budget or RunBudget.from_env())
+    config.setdefault("callbacks", []).append(handler)
+    return handler
+
+def record_tool_call(name: str) -> None:
+    """
+    Tel een directe tool aanroep bij de run waarin hij gebeurt.
+
+    Voor zoekfuncties die nodes rechtstreeks aanroepen; die gaan niet langs de
+    callbacks. Buiten een gevolgde run doet dit niets.
+    """
+    from langchain_core.runnables.config import ensure_config
+
+    config = ensure_config()
+    callbacks = config.get("callbacks")
+    handlers = getattr(callbacks, "handlers", callbacks) or []
+    for handler in handlers:
+        if isinstance(handler, UsageCallbackHandler):
+            handler.record_tool_call(name, (config.get("metadata") or {}).get("langgraph_node") or "-")
+            return
+
+def finish_usage(handler: UsageCallbackHandler, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Zet het verbruik in de eindstatus en log het."""
+    state["usage"] = handler.as_dict()
+    logger.info(f"Run verbruik: {handler.summary()}")
+    return state
@@ -0,0 +1,189 @@
+"""
+Verwerk een lijst met vragen in batch.
+
+Gebruik:
+    python -m agents.batch queries.jsonl --output results.jsonl --workflow v1 --concurrency 4
+
+Elke regel in de input is een JSON object met "query" (en optioneel "id"),
+of een JSON string. Resultaten worden per vraag direct naar de output
+geschreven; bij een herstart worden vragen die al klaar zijn overgeslagen.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Set
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from agents import metrics
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKFLOWS = ["v1", "v2", "graph"]
+
+def _get_runner(workflow: str) -> Callable[[str, str], Dict[str, Any]]:
+    """Importeer de gekozen workflow pas als die nodig is."""
+    if workflow == "v1":
+        from agents.research_agents import process_query_external
+        return process_query_external
+    if workflow == "v2":
+        from agents.workflow_v2 import process_query_v2
+        return process_query_v2
+    from agents.workflow import process_query
+    return process_query
+
+def read_queries(path: str) -> Iterator[Dict[str, str]]:
+    """Lees vragen uit een JSONL bestand; lege regels worden overgeslagen."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Regel {line_number} is geen geldige JSON, overgeslagen")
+                continue
+            if isinstance(item, str):
+                item = {"query": item}
+            query = item.get("query")
+            if not query:
+                logger.warning(f"Regel {line_number} heeft geen 'query', overgeslagen")
+                continue
+            query_id = str(item.get("id") or hashlib.sha256(query.encode("utf-8")).hexdigest()[:12])
+            yield {"id": query_id, "query": query}
+
+def completed_ids(path: str) -> Set[str]:
+    """Geef de ids die in een eerdere run al succesvol verwerkt zijn."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Een half geschreven laatste regel na een crash
+                continue
+            if record.get("status") in ("completed", "awaiting_review"):
+                done.add(record["id"])
+            else:
+                done.discard(record.get("id"))
+    return done
+
+def _summarize(item: Dict[str, str], state: Dict[str, Any], duration: float) -> Dict[str, Any]:
+    """Maak een compact resultaat voor de output JSONL."""
+    if state.get("pdf_path"):
+        status = "completed"
+    elif state.get("review_status") == "pending":
+        status = "awaiting_review"
+    elif state.get("partial"):
+        # Deadline verstreken; bij een volgende run opnieuw proberen
+        status = "partial"
+    else:
+        status = "failed"
+
+    error = state.get("error_message")
+    if status == "failed" and not error and state.get("messages"):
+        error = str(getattr(state["messages"][-1], "content", ""))
+    return {
+        "id": item["id"],
+        "query": item["query"],
+        "status": status,
+        "pdf_path": state.get("pdf_path"),
+        "thread_id": state.get("thread_id"),
+        "error": error,
+        "duration": round(duration, 2),
+        "usage": state.get("usage"),
+        "terminal_reason": state.get("terminal_reason"),
+        "node_visits": state.get("node_visits"),
+    }
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workflow: str = "v1",
+    concurrency: int = 2
+) -> Dict[str, int]:
+    """
+    Verwerk alle vragen uit input_path die nog niet in output_path staan.
+
+    Returns:
+        Aantal vragen per status
+    """
+    runner = _get_runner(workflow)
+    done = completed_ids(output_path)
+    todo: List[Dict[str, str]] = [item for item in read_queries(input_path) if item["id"] not in done]
+    logger.info(f"{len(done)} vragen al verwerkt, {len(todo)} te gaan")
+
+    counts: Dict[str, int] = {"skipped": len(done)}
+    write_lock = threading.Lock()
+
+    def process(item: Dict[str, str]) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            state = runner(item["query"], thread_id=f"batch-{item['id']}")
+            return _summarize(item, state, time.monotonic() - start)
+        except Exception as e:
+            logger.error(f"Error bij vraag {item['id']}: {str(e)}")
+            return {
+                "id": item["id"],
+                "query": item["query"],
+                "status": "failed",
+                "pdf_path": None,
+                "thread_id": None,
+                "error": str(e),
+                "duration": round(time.monotonic() - start, 2),
+            }
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as executor:
+        futures = [executor.submit(process, item) for item in todo]
+        for future in as_completed(futures):
+            record = future.result()
+            if record.get("pdf_path"):
+                # Een record mag pas naar een PDF verwijzen als die op disk staat
+                from agents.tools.pdf_tools import flush_pdf_writes
+                try:
+                    flush_pdf_writes(path=record["pdf_path"])
+                except Exception as e:
+                    logger.error(f"PDF voor vraag {record['id']} niet weggeschreven: {str(e)}")
+                    record = {**record, "status": "failed", "pdf_path": None, "error": str(e)}
+            with write_lock:
+                # Direct wegschrijven zodat een crash geen werk kost
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            logger.info(f"[{record['status']}] {record['query']} ({record['duration']}s)")
+
+    return counts
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Genereer rapporten voor een lijst met vragen.")
+    parser.add_argument("input", help="JSONL bestand met vragen")
+    parser.add_argument("--output", "-o", default=os.path.join("output", "batch_results.jsonl"),
+                        help="JSONL bestand voor resultaten en voortgang")
+    parser.add_argument("--workflow", "-w", choices=WORKFLOWS, default="v1",
+                        help="v1 (research_agents), v2 (met review) of graph (agents.workflow)")
+    parser.add_argument("--concurrency", "-c", type=int, default=2,
+                        help="Aantal vragen dat tegelijk verwerkt wordt")
+    args = parser.parse_args(argv)
+
+    counts = run_batch(args.input, args.output, args.workflow, args.concurrency)
+    print(json.dumps(counts))
+    logger.info(f"Latency per model tier: {json.dumps(metrics.snapshot()['latency'])}")
+    return 0 if not counts.get("failed") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
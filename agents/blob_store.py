@@ -0,0 +1,58 @@
+from typing import Any, Optional
+from functools import lru_cache
+import hashlib
+import logging
+import os
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Grote velden worden buiten de state bewaard en alleen als referentie meegegeven;
+# de directory (BLOB_STORE_DIR) en drempel (BLOB_STORE_THRESHOLD) worden bij gebruik gelezen
+BLOB_PREFIX = "blob:sha256:"
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(getenv("BLOB_STORE_DIR", os.path.join("output", "blobs")), digest[:2], digest)
+
+def put_blob(text: str) -> str:
+    """
+    Sla tekst content-addressed op en geef een referentie terug.
+
+    Dezelfde inhoud wordt maar een keer weggeschreven.
+    """
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return BLOB_PREFIX + digest
+
+@lru_cache(maxsize=64)
+def load_blob(ref: str) -> str:
+    """Laad de tekst achter een referentie."""
+    if not is_blob_ref(ref):
+        raise ValueError(f"Geen blob referentie: {ref[:40]}")
+    with open(_blob_path(ref[len(BLOB_PREFIX):]), "rb") as f:
+        return f.read().decode("utf-8")
+
+def offload(value: Optional[str]) -> Optional[str]:
+    """Vervang een grote string door een blob referentie; kleine waarden blijven inline."""
+    if not isinstance(value, str) or is_blob_ref(value) or len(value) < int(getenv("BLOB_STORE_THRESHOLD", "4096")):
+        return value
+    return put_blob(value)
+
+def resolve(value: Any) -> Any:
+    """Geef de echte inhoud van een veld dat mogelijk een blob referentie is."""
+    if is_blob_ref(value):
+        return load_blob(value)
+    return value
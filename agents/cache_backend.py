@@ -0,0 +1,407 @@
+"""
+Gedeelde cache voor meerdere processen op een host.
+
+Met meerdere Streamlit of worker processen heeft elk proces anders zijn eigen
+(koude) cache. Zet AGENTS_SHARED_CACHE op een pad, bijvoorbeeld
+output/shared_cache.db, en alle processen delen een SQLite database in WAL
+mode: lezers blokkeren schrijvers niet, leesacties gaan via memory-mapped I/O
+en elke schrijfactie is een enkele atomaire transactie.
+
+Waarden worden compact opgeslagen (pickle, boven COMPRESS_THRESHOLD bytes met
+zlib). De cache is alleen voor vertrouwde lokale data; laad nooit een database
+van een ander.
+
+Voor single-flight over processen heen geeft lock() een lease per sleutel: een
+proces dat dezelfde zoekopdracht of pagina al ophaalt wordt afgewacht in plaats
+van dubbel uitgevoerd. Een lease verloopt na AGENTS_SHARED_CACHE_LEASE seconden, zodat een gecrasht
+proces de rest niet blokkeert; wachten duurt nooit langer dan de deadline van
+de run. alock() doet de SQLite aanroepen in een thread, buiten de event loop.
+
+Gebruikt door de zoek en pagina cache (web_tools), de LLM cache
+(install_llm_cache) en de research cache. Zonder AGENTS_SHARED_CACHE is
+get_shared_cache() None en blijft alles per proces.
+"""
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from agents import metrics
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Waarden groter dan dit aantal bytes worden gecomprimeerd
+COMPRESS_THRESHOLD = 1024
+# Om de hoeveel schrijfacties verlopen entries opgeruimd worden
+PRUNE_EVERY = 200
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _shared_cache_path() -> str:
+    """Pad van de gedeelde database (AGENTS_SHARED_CACHE); leeg is uit."""
+    return getenv("AGENTS_SHARED_CACHE", "")
+
+def _mmap_size() -> int:
+    """Grootte van de memory map voor leesacties."""
+    return int(getenv("AGENTS_SHARED_CACHE_MMAP", str(256 * 1024 * 1024)))
+
+def _lease_seconds() -> float:
+    """Seconden dat een single-flight lease geldig is."""
+    return float(getenv("AGENTS_SHARED_CACHE_LEASE", "60"))
+
+def _wait_seconds(seconds: float) -> float:
+    """Wachttijd voor een lease, begrensd door de deadline van de run."""
+    # Pas bij gebruik laden; agents.deadline haalt LangChain binnen
+    from agents import deadline
+
+    return deadline.remaining(seconds)
+
+def _llm_cache_ttl() -> float:
+    """Seconden dat LLM antwoorden in de gedeelde cache blijven; 0 is geen LLM cache."""
+    return float(getenv("LLM_CACHE_TTL", "0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+"""
+
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+def dumps(value: Any) -> bytes:
+    """Serialiseer een waarde compact: pickle, gecomprimeerd als dat loont."""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _RAW + data
+
+def loads(blob: bytes) -> Any:
+    """Tegenhanger van dumps."""
+    flag, data = blob[:1], blob[1:]
+    if flag == _ZLIB:
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+def hash_key(*parts: str) -> str:
+    """Korte sleutel voor lange invoer, zoals een prompt."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class SharedCache:
+    """
+    Key-value cache in SQLite (WAL), gedeeld door alle processen op een host.
+
+    Elke thread krijgt een eigen verbinding. Sleutels zijn strings binnen een
+    namespace ("search", "page", "llm", "report", ...).
+    """
+
+    def __init__(self, path: str, mmap_size: Optional[int] = None, lease_seconds: Optional[float] = None):
+        self.path = path
+        self.mmap_size = _mmap_size() if mmap_size is None else mmap_size
+        self.lease_seconds = _lease_seconds() if lease_seconds is None else lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; schrijfacties openen zelf een transactie
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """De waarde onder key, of None als hij er niet (meer) is."""
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+            value = loads(row[0]) if row else None
+        except (sqlite3.Error, pickle.UnpicklingError, zlib.error) as e:
+            logger.warning(f"Gedeelde cache niet leesbaar ({namespace}): {str(e)}")
+            value = None
+        metrics.increment(f"cache.{namespace}.{'hits' if value is not None else 'misses'}")
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Sla een waarde op; ttl in seconden, None is zonder verloopdatum."""
+        now = time.time()
+        try:
+            blob = dumps(value)
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, blob, now, now + ttl if ttl else None)
+                )
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            logger.warning(f"Gedeelde cache niet beschrijfbaar ({namespace}): {str(e)}")
+            return
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Verwijderen uit gedeelde cache mislukt ({namespace}): {str(e)}")
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        """Alle geldige entries in een namespace, oudste eerst."""
+        try:
+            rows = self._conn().execute(
+                "SELECT key, value FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at",
+                (namespace, time.time())
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Gedeelde cache niet leesbaar ({namespace}): {str(e)}")
+            return []
+        items = []
+        for key, value in rows:
+            # Een onleesbare entry slaan we over in plaats van de hele lijst te verliezen
+            try:
+                items.append((key, loads(value)))
+            except (pickle.UnpicklingError, zlib.error) as e:
+                logger.warning(f"Entry {key} in gedeelde cache niet leesbaar ({namespace}): {str(e)}")
+        return items
+
+    def trim(self, namespace: str, max_entries: int) -> List[str]:
+        """Houd alleen de nieuwste max_entries entries; geeft de verwijderde sleutels."""
+        try:
+            with self._transaction() as conn:
+                rows = conn.execute(
+                    "SELECT key FROM entries WHERE namespace = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+                    (namespace, max_entries)
+                ).fetchall()
+                conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", [(namespace, key) for key, in rows])
+        except sqlite3.Error as e:
+            logger.warning(f"Inkorten gedeelde cache mislukt ({namespace}): {str(e)}")
+            return []
+        return [key for key, in rows]
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Leeg een namespace, of zonder namespace de hele cache."""
+        try:
+            with self._transaction() as conn:
+                if namespace is None:
+                    conn.execute("DELETE FROM entries")
+                else:
+                    conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error as e:
+            logger.warning(f"Legen gedeelde cache mislukt ({namespace or 'alles'}): {str(e)}")
+
+    def prune(self) -> None:
+        """Verwijder verlopen entries en leases."""
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"Opruimen gedeelde cache mislukt: {str(e)}")
+
+    def _try_acquire(self, namespace: str, key: str, owner: str) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (namespace, key, now)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, owner, now + self.lease_seconds)
+            )
+            return cursor.rowcount == 1
+
+    def _release(self, namespace: str, key: str, owner: str) -> None:
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?",
+                    (namespace, key, owner)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Lease op {namespace}/{key} niet vrijgegeven: {str(e)}")
+
+    @contextmanager
+    def lock(self, namespace: str, key: str, timeout: Optional[float] = None) -> Iterator[bool]:
+        """
+        Single-flight lease op een sleutel, over processen en threads heen.
+
+        Wacht tot de lease vrij is (hoogstens timeout seconden, standaard
+        de lease duur, en niet langer dan de deadline van de run). Controleer
+        binnen het blok eerst opnieuw de cache: een ander proces kan het werk
+        net gedaan hebben.
+
+        Yields:
+            True met de lease, False als het wachten te lang duurde
+        """
+        owner = f"{self.owner}-{threading.get_ident()}"
+        waited_until = time.monotonic() + _wait_seconds(self.lease_seconds if timeout is None else timeout)
+        delay = 0.01
+        acquired = False
+        try:
+            while True:
+                try:
+                    acquired = self._try_acquire(namespace, key, owner)
+                except sqlite3.Error as e:
+                    logger.warning(f"Lease op {namespace}/{key} mislukt: {str(e)}")
+                    break
+                if acquired or time.monotonic() >= waited_until:
+                    break
+                metrics.increment(f"cache.{namespace}.waits")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.25)
+            yield acquired
+        finally:
+            if acquired:
+                self._release(namespace, key, owner)
+
+    @asynccontextmanager
+    async def alock(self, namespace: str, key: str, timeout: Optional[float] = None) -> AsyncIterator[bool]:
+        """Async variant van lock(); SQLite in een thread, wachten met asyncio.sleep."""
+        owner = f"{self.owner}-{uuid.uuid4().hex[:8]}"
+        waited_until = time.monotonic() + _wait_seconds(self.lease_seconds if timeout is None else timeout)
+        delay = 0.01
+        acquired = False
+        try:
+            while True:
+                try:
+                    acquired = await asyncio.to_thread(self._try_acquire, namespace, key, owner)
+                except sqlite3.Error as e:
+                    logger.warning(f"Lease op {namespace}/{key} mislukt: {str(e)}")
+                    break
+                if acquired or time.monotonic() >= waited_until:
+                    break
+                metrics.increment(f"cache.{namespace}.waits")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.25)
+            yield acquired
+        finally:
+            if acquired:
+                await asyncio.to_thread(self._release, namespace, key, owner)
+
+_shared: Optional[SharedCache] = None
+_shared_lock = threading.Lock()
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """De gedeelde cache van dit proces, of None als AGENTS_SHARED_CACHE niet gezet is."""
+    global _shared
+    path = _shared_cache_path()
+    if not path:
+        return None
+    with _shared_lock:
+        if _shared is None or _shared.path != path:
+            try:
+                _shared = SharedCache(path)
+                logger.info(f"Gedeelde cache: {path}")
+            except sqlite3.Error as e:
+                logger.error(f"Gedeelde cache niet beschikbaar, alleen cache per proces: {str(e)}")
+                return None
+        return _shared
+
+@contextmanager
+def single_flight(namespace: str, key: str) -> Iterator[None]:
+    """Lease via de gedeelde cache; zonder gedeelde cache een no-op."""
+    shared = get_shared_cache()
+    if shared is None:
+        yield
+        return
+    with shared.lock(namespace, key):
+        yield
+
+@asynccontextmanager
+async def asingle_flight(namespace: str, key: str) -> AsyncIterator[None]:
+    """Async variant van single_flight."""
+    shared = get_shared_cache()
+    if shared is None:
+        yield
+        return
+    async with shared.alock(namespace, key):
+        yield
+
+_llm_cache_installed = False
+
+def install_llm_cache() -> bool:
+    """
+    Zet de gedeelde cache als globale LangChain LLM cache (set_llm_cache).
+
+    Alleen met AGENTS_SHARED_CACHE en een LLM_CACHE_TTL boven 0; identieke
+    prompts met hetzelfde model en dezelfde tools worden dan niet opnieuw
+    aangeroepen. Geeft True als de cache actief is.
+    """
+    global _llm_cache_installed
+    if _llm_cache_installed:
+        return True
+    shared = get_shared_cache()
+    ttl = _llm_cache_ttl()
+    if shared is None or ttl <= 0:
+        return False
+
+    from langchain_core.caches import BaseCache
+    from langchain_core.globals import set_llm_cache
+
+    class SharedLLMCache(BaseCache):
+        """LangChain LLM cache op de gedeelde SQLite cache."""
+
+        def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+            return shared.get("llm", hash_key(llm_string, prompt))
+
+        def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+            shared.set("llm", hash_key(llm_string, prompt), list(return_val), ttl=ttl)
+
+        def clear(self, **kwargs: Any) -> None:
+            shared.clear("llm")
+
+    set_llm_cache(SharedLLMCache())
+    _llm_cache_installed = True
+    logger.info(f"Gedeelde LLM cache actief (ttl {ttl:g}s)")
+    return True
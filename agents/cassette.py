@@ -0,0 +1,247 @@
+"""
+Opnemen en afspelen van LLM, zoek en HTTP verkeer.
+
+Met AGENTS_CASSETTE=<pad> en AGENTS_CASSETTE_MODE=record wordt elke
+ChatAnthropic aanroep, elke set zoekresultaten en elke opgehaalde pagina van
+een echte run in een cassette bestand gezet (JSON lines, gzip als het pad op
+.gz eindigt). Met AGENTS_CASSETTE_MODE=replay worden ze uit dat bestand
+teruggegeven, zonder netwerk, met de opgenomen latency vermenigvuldigd met
+AGENTS_CASSETTE_LATENCY (standaard 1.0, 0 = zo snel mogelijk).
+
+Aanroepen worden herkend aan een hash van het verzoek. Hetzelfde verzoek
+meerdere keren krijgt de antwoorden in opgenomen volgorde; daarna steeds het
+laatste. Een verzoek dat niet op de cassette staat geeft een CassetteMissError.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CassetteMissError(LookupError):
+    """Een verzoek staat niet op de cassette."""
+
+def request_key(kind: str, request: Any) -> str:
+    """Stabiele sleutel voor een verzoek."""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{kind}\n{payload}".encode("utf-8")).hexdigest()[:32]
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class Cassette:
+    """
+    Een cassette bestand in record of replay mode.
+
+    Args:
+        path: Pad van het cassette bestand
+        mode: "record" of "replay"
+        latency_scale: Factor op de opgenomen latency bij afspelen
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Onbekende cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, Deque[Tuple[Any, float]]] = {}
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            self._load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Een nieuwe opname begint met een leeg bestand
+            with _open(path, "w"):
+                pass
+            logger.info(f"Cassette opname naar {path}")
+
+    def _load(self) -> None:
+        count = 0
+        with _open(self.path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._entries.setdefault(entry["key"], deque()).append((entry["response"], entry["latency"]))
+                count += 1
+        logger.info(f"Cassette {self.path} geladen: {count} opnames")
+
+    def _record(self, kind: str, key: str, response: Any, latency: float) -> None:
+        line = json.dumps(
+            {"kind": kind, "key": key, "latency": round(latency, 4), "response": response},
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        with self._lock:
+            # Per opname wegschrijven, zodat een afgebroken run bruikbaar blijft
+            with _open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def _replay(self, kind: str, key: str) -> Tuple[Any, float]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError(f"Geen {kind} opname op cassette {self.path} voor verzoek {key}")
+            # Het laatste antwoord blijft staan voor eventuele herhalingen
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def call(self, kind: str, request: Any, func: Callable[[], Any]) -> Any:
+        """Speel een verzoek af, of voer het uit en neem het op. Het antwoord moet JSON zijn."""
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            response, latency = self._replay(kind, key)
+            if latency and self.latency_scale:
+                time.sleep(latency * self.latency_scale)
+            return response
+
+        started = time.monotonic()
+        response = func()
+        self._record(kind, key, response, time.monotonic() - started)
+        return response
+
+    async def acall(self, kind: str, request: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant van call."""
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            response, latency = self._replay(kind, key)
+            if latency and self.latency_scale:
+                await asyncio.sleep(latency * self.latency_scale)
+            return response
+
+        started = time.monotonic()
+        response = await func()
+        await asyncio.to_thread(self._record, kind, key, response, time.monotonic() - started)
+        return response
+
+_cassette: Optional[Cassette] = None
+_configured = False
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Optional[Cassette]:
+    """De actieve cassette uit AGENTS_CASSETTE*, of None als er niets opgenomen of afgespeeld wordt."""
+    global _cassette, _configured
+    with _cassette_lock:
+        if not _configured:
+            path = getenv("AGENTS_CASSETTE", "")
+            mode = getenv("AGENTS_CASSETTE_MODE", "replay" if path else "off").lower()
+            if path and mode != "off":
+                _cassette = Cassette(path, mode, float(getenv("AGENTS_CASSETTE_LATENCY", "1.0")))
+            _configured = True
+        return _cassette
+
+def use_cassette(path: Optional[str], mode: str = "replay", latency_scale: float = 1.0) -> Optional[Cassette]:
+    """
+    Zet de actieve cassette vanuit code, bijvoorbeeld in een benchmark.
+
+    Moet aangeroepen worden voordat het eerste model gemaakt wordt; None of
+    mode "off" zet opnemen en afspelen uit.
+    """
+    global _cassette, _configured
+    with _cassette_lock:
+        _cassette = Cassette(path, mode, latency_scale) if path and mode != "off" else None
+        _configured = True
+        return _cassette
+
+def replaying() -> bool:
+    """Of er een cassette afgespeeld wordt (en er dus geen netwerk nodig is)."""
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == "replay"
+
+def record_call(kind: str, request: Any, func: Callable[[], Any]) -> Any:
+    """Voer func uit via de actieve cassette, of direct als er geen is."""
+    cassette = get_cassette()
+    if cassette is None:
+        return func()
+    return cassette.call(kind, request, func)
+
+async def arecord_call(kind: str, request: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+    """Async variant van record_call."""
+    cassette = get_cassette()
+    if cassette is None:
+        return await func()
+    return await cassette.acall(kind, request, func)
+
+_chat_model_class = None
+
+def chat_model_class():
+    """
+    De ChatAnthropic klasse om modellen mee te maken.
+
+    Zonder actieve cassette is dat ChatAnthropic zelf; anders een subklasse die
+    elke aanroep opneemt of afspeelt. Callbacks (verbruik, budget, latency)
+    werken in beide gevallen gewoon, omdat alleen _generate vervangen wordt.
+    """
+    global _chat_model_class
+    from langchain_anthropic import ChatAnthropic
+
+    if get_cassette() is None:
+        return ChatAnthropic
+    if _chat_model_class is not None:
+        return _chat_model_class
+
+    from langchain_core.messages import messages_from_dict, message_to_dict
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    def _request(llm, messages, stop, kwargs) -> Dict[str, Any]:
+        payload_builder = getattr(llm, "_get_request_payload", None)
+        if payload_builder is not None:
+            payload = payload_builder(messages, stop=stop, **kwargs)
+        else:
+            payload = {"model": llm.model, "messages": [message_to_dict(m) for m in messages], "stop": stop, **kwargs}
+        # Niet deterministisch of geheim; hoort niet in de sleutel
+        payload.pop("metadata", None)
+        payload.pop("timeout", None)
+        return payload
+
+    def _encode(result) -> Dict[str, Any]:
+        return {
+            "generations": [message_to_dict(g.message) for g in result.generations],
+            "llm_output": result.llm_output,
+        }
+
+    def _decode(data: Dict[str, Any]):
+        return ChatResult(
+            generations=[ChatGeneration(message=m) for m in messages_from_dict(data["generations"])],
+            llm_output=data.get("llm_output"),
+        )
+
+    class CassetteChatAnthropic(ChatAnthropic):
+        """ChatAnthropic die zijn verzoeken opneemt of afspeelt via de actieve cassette."""
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            request = _request(self, messages, stop, kwargs)
+            generate = super()._generate
+            return _decode(record_call(
+                "llm",
+                request,
+                lambda: _encode(generate(messages, stop=stop, run_manager=run_manager, **kwargs))
+            ))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            request = _request(self, messages, stop, kwargs)
+            agenerate = super()._agenerate
+
+            async def generate():
+                return _encode(await agenerate(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+            return _decode(await arecord_call("llm", request, generate))
+
+    _chat_model_class = CassetteChatAnthropic
+    return _chat_model_class
@@ -0,0 +1,173 @@
+"""
+Deadlines per run.
+
+Een entry point zet een deadline (absolute tijd) voor de hele run: in de
+config onder `configurable.deadline`, zodat hij met een checkpoint meegaat, en
+in een contextvar, zodat ook code buiten LangChain (zoekbackends, tool threads)
+hem ziet. Elke stap vraagt met remaining() hoeveel tijd er nog is en gebruikt
+dat als timeout; een DeadlineCallbackHandler weigert nieuwe nodes, model en
+tool aanroepen zodra de deadline voorbij is. De entry points vangen de
+DeadlineExceededError af en geven het beste gedeeltelijke rapport terug.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import logging
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents.accounting import BudgetExceededError
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _default_deadline() -> str:
+    """Standaard deadline per run in seconden; 0 of none is onbeperkt. Gelezen bij gebruik."""
+    return getenv("RUN_DEADLINE_SECONDS", "300")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("run_deadline", default=None)
+
+class DeadlineExceededError(BudgetExceededError):
+    """De tijd voor een run is op. Een tijdsbudget, dus ook een BudgetExceededError."""
+
+    def __init__(self, message: str, partial_state: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.partial_state = partial_state
+        # Berichten van de onderbroken node die nog niet in de state stonden,
+        # zoals de tool resultaten van een lopende tool loop
+        self.messages: List[Any] = []
+
+def resolve_seconds(seconds: Optional[float]) -> Optional[float]:
+    """Het aantal seconden voor een run: het argument, anders RUN_DEADLINE_SECONDS."""
+    if seconds is None:
+        default = _default_deadline()
+        if default.lower() in ("", "0", "none", "off"):
+            return None
+        seconds = float(default)
+    return seconds if seconds and seconds > 0 else None
+
+def set_deadline(config: Dict[str, Any], seconds: Optional[float]) -> Optional[float]:
+    """
+    Zet de deadline van een run in de config.
+
+    Args:
+        config: De run config; de deadline komt onder configurable.deadline
+        seconds: Beschikbare tijd, None voor RUN_DEADLINE_SECONDS
+
+    Returns:
+        De deadline als epoch tijd, of None zonder deadline
+    """
+    seconds = resolve_seconds(seconds)
+    if seconds is None:
+        return None
+    deadline = time.time() + seconds
+    config.setdefault("configurable", {})["deadline"] = deadline
+    config.setdefault("callbacks", []).append(DeadlineCallbackHandler())
+    return deadline
+
+@contextmanager
+def deadline_scope(config: Dict[str, Any]) -> Iterator[Optional[float]]:
+    """Maak de deadline uit de config zichtbaar voor alle code in dit blok."""
+    deadline = (config.get("configurable") or {}).get("deadline")
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def get_deadline() -> Optional[float]:
+    """De deadline van de huidige run, of None."""
+    deadline = _deadline.get()
+    if deadline is not None:
+        return deadline
+    from langchain_core.runnables.config import ensure_config
+
+    return (ensure_config().get("configurable") or {}).get("deadline")
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """
+    Resterende tijd in seconden, begrensd door default.
+
+    Zonder deadline is dat default (bijvoorbeeld de gewone timeout van een
+    stap); na de deadline 0.
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return default
+    left = max(0.0, deadline - time.time())
+    return left if default is None else min(default, left)
+
+def check(stage: str = "") -> None:
+    """Gooi een DeadlineExceededError als de deadline voorbij is."""
+    deadline = get_deadline()
+    if deadline is not None and time.time() >= deadline:
+        message = f"Deadline verstreken{f' voor {stage}' if stage else ''}"
+        logger.warning(message)
+        raise DeadlineExceededError(message)
+
+class DeadlineCallbackHandler(BaseCallbackHandler):
+    """Weigert nieuwe nodes, model aanroepen en tool aanroepen na de deadline."""
+
+    raise_error = True
+    run_inline = True
+
+    def _check(self, stage: str, metadata: Optional[Dict[str, Any]]) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        check(f"{stage} in {node}" if node else stage)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._check("stap", metadata)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._check("model aanroep", metadata)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._check("tool aanroep", metadata)
+
+def stream_until_deadline(app, initial_state: Any, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Voer een graph uit en geef de eindstatus terug.
+
+    Bij een DeadlineExceededError wordt de laatst bekende state als
+    partial_state aan de fout meegegeven, zodat de aanroeper er een
+    gedeeltelijk rapport van kan maken.
+    """
+    last_state: Dict[str, Any] = initial_state if isinstance(initial_state, dict) else {}
+    with deadline_scope(config):
+        try:
+            for values in app.stream(initial_state, config=config, stream_mode="values"):
+                # Een interrupt (review) komt als los bericht, niet als state
+                if isinstance(values, dict) and "__interrupt__" not in values:
+                    last_state = values
+        except DeadlineExceededError as e:
+            e.partial_state = last_state
+            raise
+    return last_state
+
+def partial_report(query: str, reason: str, findings: List[str], sources: List[Dict[str, str]]) -> str:
+    """
+    Maak een rapport (JSON string) van wat er binnen de tijd gevonden is.
+
+    Args:
+        query: De oorspronkelijke vraag
+        reason: Waarom het onderzoek gestopt is
+        findings: Ruwe resultaten (zoekresultaten of pagina tekst)
+        sources: Bronnen als dicts met url en titel
+    """
+    report = {
+        "title": f"Gedeeltelijk rapport: {query}",
+        "sections": {
+            "Samenvatting": (
+                f"{reason}. Het onderzoek is niet afgerond; hieronder staan de "
+                "resultaten die tot dat moment gevonden waren, zonder analyse."
+            ),
+            "Belangrijkste Resultaten": "\n\n".join(findings) or "Er waren nog geen resultaten gevonden.",
+            "Context en Details": "Stel de vraag opnieuw of geef de run meer tijd voor een volledig rapport.",
+            "Bronnen": sources,
+        },
+    }
+    return json.dumps(report, ensure_ascii=False)
@@ -0,0 +1,97 @@
+from typing import Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import logging
+import threading
+import time
+
+from agents.env import getenv
+from agents.tools.pdf_tools import render_pdf_bytes, store_pdf
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Drafts worden in het geheugen gerenderd en pas bij goedkeuring opgeslagen
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="draft-pdf")
+# Per run: (content hash, future, starttijd)
+_drafts: Dict[str, Tuple[str, Future, float]] = {}
+_lock = threading.Lock()
+
+def _draft_ttl() -> float:
+    """Seconden dat een draft bewaard wordt; een review die langer duurt bouwt de PDF opnieuw."""
+    return float(getenv("PDF_DRAFT_TTL", "3600"))
+
+def _max_drafts() -> int:
+    """Maximaal aantal drafts in het geheugen; de oudste vervalt eerst."""
+    return int(getenv("PDF_DRAFT_MAX", "20"))
+
+def _prune_drafts() -> None:
+    # Aanroepen met _lock; geparkeerde runs die nooit hervat worden blijven zo niet hangen
+    cutoff = time.monotonic() - _draft_ttl()
+    expired = [key for key, (_, _, started) in _drafts.items() if started < cutoff]
+    by_age = sorted(_drafts, key=lambda key: _drafts[key][2])
+    expired += by_age[:max(0, len(_drafts) - _max_drafts())]
+    for key in set(expired):
+        _drafts.pop(key)[1].cancel()
+
+def content_hash(content: str) -> str:
+    """Hash van de rapport content waarop een draft gekoppeld wordt."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def start_draft(key: str, content: str) -> None:
+    """
+    Start op de achtergrond een draft PDF voor deze content.
+
+    Args:
+        key: Identificatie van de run (bijvoorbeeld de thread_id)
+        content: JSON string met title en sections
+    """
+    digest = content_hash(content)
+    with _lock:
+        existing = _drafts.get(key)
+        if existing and existing[0] == digest:
+            return
+        if existing:
+            existing[1].cancel()
+        _drafts[key] = (digest, _executor.submit(render_pdf_bytes, content), time.monotonic())
+        _prune_drafts()
+    logger.info(f"Draft PDF gestart voor {key}")
+
+def take_draft(key: str, content: str) -> Optional[str]:
+    """
+    Geef het pad van een klaarstaande draft als de content niet veranderd is.
+
+    Een draft die nog bezig is wordt afgewacht, want die is altijd eerder
+    klaar dan een nieuwe build. Bij gewijzigde content wordt de draft verworpen.
+
+    Returns:
+        Pad naar de definitieve PDF (direct beschikbaar via get_pdf_bytes), of None
+    """
+    with _lock:
+        entry = _drafts.pop(key, None)
+    if entry is None:
+        return None
+
+    digest, future, _ = entry
+    if digest != content_hash(content):
+        logger.info(f"Content gewijzigd sinds draft voor {key}, draft verworpen")
+        future.cancel()
+        return None
+
+    try:
+        data = future.result()
+    except Exception as e:
+        logger.warning(f"Draft PDF voor {key} mislukt: {str(e)}")
+        return None
+
+    output_path = store_pdf(data)
+    logger.info(f"Draft PDF hergebruikt: {output_path}")
+    return output_path
+
+def discard_draft(key: str) -> None:
+    """Verwerp een eventuele draft, bijvoorbeeld als een run afgebroken wordt."""
+    with _lock:
+        entry = _drafts.pop(key, None)
+    if entry:
+        entry[1].cancel()
@@ -0,0 +1,18 @@
+from functools import lru_cache
+import os
+
+@lru_cache(maxsize=1)
+def load_env() -> None:
+    """Laad de .env file een keer, pas als er echt een API key nodig is."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+def getenv(name: str, default: str) -> str:
+    """
+    Lees een setting bij gebruik in plaats van bij het importeren.
+
+    Zo telt ook een setting die alleen in .env staat mee, en blijft het
+    importeren van een module snel.
+    """
+    load_env()
+    return os.getenv(name, default)
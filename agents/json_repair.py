@@ -0,0 +1,266 @@
+from typing import Any, Dict, Iterator, List, Optional, Union
+from langchain_core.messages import HumanMessage
+import json
+import logging
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Secties die elk rapport moet bevatten
+REPORT_SECTIONS = ["Samenvatting", "Belangrijkste Resultaten", "Context en Details", "Bronnen"]
+
+SMART_QUOTES = {
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+}
+
+def content_to_text(content: Union[str, List[Any], Dict[str, Any]]) -> str:
+    """
+    Haal de tekst uit een LLM response content.
+
+    Anthropic geeft soms een lijst van blokken terug (text en tool_use);
+    tool_use input wordt als JSON meegenomen.
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return json.dumps(content)
+    parts = []
+    for item in content or []:
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, dict):
+            if item.get("type") == "tool_use":
+                tool_input = item.get("input", {})
+                # De PDF tool krijgt de JSON als string in 'content'
+                if isinstance(tool_input.get("content"), str):
+                    parts.append(tool_input["content"])
+                else:
+                    parts.append(json.dumps(tool_input))
+            elif "text" in item:
+                parts.append(item["text"])
+    return "\n".join(parts)
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Vind het eerste gebalanceerde JSON object in een tekst.
+
+    Code fences en tekst rondom het object worden genegeerd. Als het object
+    afgekapt is, wordt alles vanaf de eerste accolade teruggegeven.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return text[start:]
+
+def _remove_trailing_commas(text: str) -> str:
+    """Verwijder komma's direct voor } of ], zonder strings aan te raken."""
+    result = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            result.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "}]":
+            # Haal de laatste komma (en witruimte) weg
+            j = len(result) - 1
+            while j >= 0 and result[j].isspace():
+                j -= 1
+            if j >= 0 and result[j] == ",":
+                del result[j]
+        result.append(ch)
+    return "".join(result)
+
+def _close_truncated(text: str) -> Iterator[str]:
+    """
+    Maak kandidaten voor een afgekapt JSON object.
+
+    Eerst wordt alles behouden en netjes afgesloten; daarna wordt steeds
+    teruggevallen op de laatste komma buiten een string.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    cuts = []
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            cuts.append((i, list(stack)))
+
+    def closers(open_brackets: List[str]) -> str:
+        return "".join("}" if c == "{" else "]" for c in reversed(open_brackets))
+
+    candidate = text + ('"' if in_string else "")
+    candidate = candidate.rstrip().rstrip(",")
+    if candidate.endswith(":"):
+        candidate += " null"
+    yield candidate + closers(stack)
+
+    for pos, open_brackets in reversed(cuts):
+        yield text[:pos] + closers(open_brackets)
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return None
+
+def repair_json(text: str) -> Dict[str, Any]:
+    """
+    Parse een JSON object uit LLM output en herstel veelvoorkomende fouten.
+
+    Herstelt code fences, tekst rondom het object, trailing commas, smart
+    quotes en afgekapte output.
+
+    Raises:
+        ValueError: als er geen JSON object te herstellen is
+    """
+    snippet = extract_json_object(text)
+    if snippet is None:
+        raise ValueError("Geen JSON object gevonden in de response")
+
+    candidates = [snippet, _remove_trailing_commas(snippet)]
+    # Smart quotes alleen vervangen als het zonder niet lukt
+    unquoted = snippet
+    for smart, plain in SMART_QUOTES.items():
+        unquoted = unquoted.replace(smart, plain)
+    if unquoted != snippet:
+        candidates.append(_remove_trailing_commas(unquoted))
+
+    for candidate in candidates:
+        parsed = _loads(candidate)
+        if isinstance(parsed, dict):
+            return parsed
+
+    for candidate in _close_truncated(candidates[-1]):
+        parsed = _loads(_remove_trailing_commas(candidate))
+        if isinstance(parsed, dict):
+            logger.warning("Afgekapte JSON hersteld, mogelijk ontbreken er velden")
+            return parsed
+
+    raise ValueError("JSON kon niet hersteld worden")
+
+def validate_report(report: Dict[str, Any]) -> List[str]:
+    """Geef de namen van ontbrekende of lege rapportonderdelen terug."""
+    missing = []
+    if not report.get("title"):
+        missing.append("title")
+    sections = report.get("sections")
+    if not isinstance(sections, dict):
+        return missing + list(REPORT_SECTIONS)
+    for section in REPORT_SECTIONS:
+        if not sections.get(section):
+            missing.append(section)
+    return missing
+
+def complete_report(llm, report: Dict[str, Any], missing: List[str], context: str = "") -> Dict[str, Any]:
+    """
+    Vraag het model alleen om de ontbrekende secties en voeg ze samen.
+
+    Args:
+        llm: Een chat model
+        report: Het (deels) geldige rapport
+        missing: Ontbrekende onderdelen volgens validate_report
+        context: Extra context zoals de vraag of zoekresultaten
+    """
+    missing_sections = [m for m in missing if m != "title"]
+    completed = dict(report)
+    sections = report.get("sections")
+    completed["sections"] = dict(sections) if isinstance(sections, dict) else {}
+
+    if missing_sections:
+        message = HumanMessage(content=f"""
+        Dit onderzoeksrapport mist de volgende secties: {", ".join(missing_sections)}.
+
+        {context}
+
+        BESTAAND RAPPORT:
+        {json.dumps(completed, ensure_ascii=False)}
+
+        Geef ALLEEN een JSON object met de ontbrekende secties als keys, bijvoorbeeld:
+        {{"{missing_sections[0]}": "..."}}
+        """)
+        response = llm.invoke([message])
+        try:
+            extra = repair_json(content_to_text(response.content))
+            for section in missing_sections:
+                if extra.get(section):
+                    completed["sections"][section] = extra[section]
+        except ValueError as e:
+            logger.error(f"Aanvulling van secties mislukt: {str(e)}")
+
+    return completed
+
+def parse_report(
+    content: Union[str, List[Any]],
+    llm=None,
+    context: str = ""
+) -> Dict[str, Any]:
+    """
+    Parse en valideer een rapport uit LLM output.
+
+    Als er secties ontbreken en er een llm is meegegeven, worden alleen die
+    secties opnieuw opgevraagd in plaats van het hele rapport.
+
+    Raises:
+        ValueError: als er geen bruikbaar rapport uit de output te halen is
+    """
+    report = repair_json(content_to_text(content))
+    if not report.get("title"):
+        report["title"] = "Onderzoeksrapport"
+    missing = validate_report(report)
+    if missing:
+        logger.warning(f"Rapport mist onderdelen: {missing}")
+        if llm is not None:
+            report = complete_report(llm, report, missing, context)
+            missing = validate_report(report)
+        if missing:
+            raise ValueError(f"Rapport mist verplichte secties: {', '.join(missing)}")
+    return report
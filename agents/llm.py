@@ -0,0 +1,190 @@
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import logging
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents.env import load_env
+from agents.rate_limits import get_rate_limiter
+from agents import metrics
+from agents.cassette import chat_model_class, replaying
+from agents import deadline
+from agents.cache_backend import install_llm_cache
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "claude-3-sonnet-20240229"
+
+# Model per tier, overschrijfbaar met LLM_TIER_<TIER>_MODEL
+MODEL_TIERS = {
+    "small": "claude-3-haiku-20240307",
+    "large": DEFAULT_MODEL,
+}
+
+# Timeout per tier in seconden, overschrijfbaar met LLM_TIER_<TIER>_TIMEOUT
+TIER_TIMEOUTS = {
+    "small": 20.0,
+    "large": 60.0,
+}
+
+# Tier waarnaar uitgeweken wordt bij een timeout of overbelasting
+FALLBACK_TIERS = {
+    "small": "large",
+    "large": "small",
+}
+
+# Tier per stap in de pipeline, overschrijfbaar met bijvoorbeeld
+# LLM_STEP_TIERS="interpret=large,analysis=large"
+STEP_TIERS = {
+    "interpret": "small",     # Vraag interpreteren en zoektermen bedenken
+    "tool_calls": "small",    # Een zoekopdracht als tool call formuleren
+    "format": "small",        # Resultaten in het rapport formaat zetten
+    "map_comments": "small",  # Reviewcommentaar aan secties koppelen
+    "research": "large",      # Onderzoek met tools
+    "analysis": "large",      # Zoekresultaten analyseren en het rapport schrijven
+    "revise": "large",        # Secties herschrijven na review
+}
+
+def model_for_tier(tier: str) -> str:
+    return os.getenv(f"LLM_TIER_{tier.upper()}_MODEL", MODEL_TIERS.get(tier, DEFAULT_MODEL))
+
+def tier_for_step(step: str) -> str:
+    """Geef de tier voor een stap, rekening houdend met LLM_STEP_TIERS."""
+    overrides = {}
+    for item in os.getenv("LLM_STEP_TIERS", "").split(","):
+        if "=" in item:
+            name, tier = item.split("=", 1)
+            overrides[name.strip()] = tier.strip()
+    return overrides.get(step) or STEP_TIERS.get(step, "large")
+
+class TierLatencyHandler(BaseCallbackHandler):
+    """Legt de latency van elke model aanroep vast onder llm.<tier> in agents.metrics."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        with self._lock:
+            self._started[run_id] = ((metadata or {}).get("llm_tier", "default"), time.monotonic())
+
+    def _finish(self, run_id: UUID, ok: bool) -> None:
+        with self._lock:
+            entry = self._started.pop(run_id, None)
+        if entry:
+            tier, started = entry
+            metrics.record_latency(f"llm.{tier}", time.monotonic() - started, ok=ok)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, ok=True)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, ok=False)
+
+_latency_handler = TierLatencyHandler()
+
+def _fallback_exceptions():
+    """Fouten waarbij een andere tier het proberen waard is: timeouts en overbelasting."""
+    import anthropic
+
+    exceptions = [anthropic.APITimeoutError, anthropic.APIConnectionError, anthropic.InternalServerError]
+    overloaded = getattr(anthropic, "OverloadedError", None)
+    if overloaded is not None:
+        exceptions.append(overloaded)
+    return tuple(exceptions)
+
+def _api_key() -> Optional[str]:
+    # Bij het afspelen van een cassette is er geen echte key nodig
+    return os.getenv("ANTHROPIC_API_KEY") or ("cassette-replay" if replaying() else None)
+
+_model_classes: Dict[type, type] = {}
+
+def _with_deadline(llm, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Begrens de request timeout tot de resterende tijd van de run."""
+    deadline.check("model aanroep")
+    timeout = deadline.remaining(llm.default_request_timeout)
+    if timeout is None:
+        return kwargs
+    return {**kwargs, "timeout": timeout}
+
+def _model_class():
+    """ChatAnthropic (of de cassette variant) die de deadline van de run respecteert."""
+    base = chat_model_class()
+    if base not in _model_classes:
+        class DeadlineChatAnthropic(base):
+            def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+                return super()._generate(messages, stop=stop, run_manager=run_manager, **_with_deadline(self, kwargs))
+
+            async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+                return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **_with_deadline(self, kwargs))
+
+        _model_classes[base] = DeadlineChatAnthropic
+    return _model_classes[base]
+
+def _tier_model(tier: str, tools: Optional[List], max_retries: int = 2):
+    llm = _model_class()(
+        model=model_for_tier(tier),
+        temperature=0,
+        anthropic_api_key=_api_key(),
+        rate_limiter=get_rate_limiter("llm"),
+        default_request_timeout=float(os.getenv(f"LLM_TIER_{tier.upper()}_TIMEOUT", TIER_TIMEOUTS.get(tier, 60.0))),
+        max_retries=max_retries,
+        callbacks=[_latency_handler],
+        metadata={"llm_tier": tier}
+    )
+    if tools:
+        return llm.bind_tools(tools)
+    return llm
+
+def create_chat_model(tools: Optional[List] = None, model: str = DEFAULT_MODEL, step: Optional[str] = None):
+    """
+    Maak een ChatAnthropic model dat de gedeelde LLM rate limit respecteert.
+
+    Args:
+        tools: Optionele tools om aan het model te binden
+        model: Naam van het Anthropic model, als er geen step is opgegeven
+        step: Stap in de pipeline (zie STEP_TIERS); kiest het model via de tier
+            en wijkt bij een timeout of overbelasting uit naar de fallback tier
+    """
+    # Pas bij het eerste model de Anthropic client en .env laden
+    load_env()
+    # Met AGENTS_SHARED_CACHE en LLM_CACHE_TTL delen alle processen hun antwoorden
+    install_llm_cache()
+
+    if step is not None:
+        tier = tier_for_step(step)
+        fallback = FALLBACK_TIERS.get(tier)
+        # Weinig retries op de primaire tier, zodat de fallback snel aan de beurt is
+        primary = _tier_model(tier, tools, max_retries=0 if fallback else 2)
+        if not fallback or model_for_tier(fallback) == model_for_tier(tier):
+            return primary
+        logger.info(f"Stap '{step}': tier {tier} ({model_for_tier(tier)}), fallback {fallback}")
+        return primary.with_fallbacks(
+            [_tier_model(fallback, tools)],
+            exceptions_to_handle=_fallback_exceptions()
+        )
+
+    llm = _model_class()(
+        model=model,
+        temperature=0,
+        anthropic_api_key=_api_key(),
+        rate_limiter=get_rate_limiter("llm")
+    )
+    if tools:
+        return llm.bind_tools(tools)
+    return llm
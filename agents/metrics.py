@@ -0,0 +1,75 @@
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+import logging
+import threading
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Aantal recente metingen per naam waarover percentielen berekend worden
+WINDOW = 200
+
+class LatencyStats:
+    """Latencies en uitkomsten van recente aanroepen."""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        self.samples.append((seconds, ok))
+        self.count += 1
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        latencies = sorted(seconds for seconds, _ in self.samples)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50": round(self.percentile(0.5), 3),
+            "p90": round(self.percentile(0.9), 3),
+        }
+
+_latencies: Dict[str, LatencyStats] = {}
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+def record_latency(name: str, seconds: float, ok: bool = True) -> None:
+    """Leg de duur van een aanroep vast, bijvoorbeeld "llm.small"."""
+    with _lock:
+        _latencies.setdefault(name, LatencyStats()).record(seconds, ok)
+
+def increment(name: str, amount: int = 1) -> None:
+    """Verhoog een teller."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def set_gauge(name: str, value: Any) -> None:
+    """Zet de huidige waarde van een meetpunt."""
+    with _lock:
+        _gauges[name] = value
+
+def snapshot() -> Dict[str, Any]:
+    """Alle metrics van dit proces, voor logs of een status pagina."""
+    with _lock:
+        return {
+            "latency": {name: stats.as_dict() for name, stats in _latencies.items()},
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+        }
+
+def reset() -> None:
+    """Wis alle metrics."""
+    with _lock:
+        _latencies.clear()
+        _counters.clear()
+        _gauges.clear()
@@ -3,11 +3,13 @@ from langchain_core.messages import AIMessage
 import os
 import json
 import logging
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import tempfile
+import io
+
+from agents.json_repair import parse_report
+from agents.blob_store import resolve
+from agents.tools.pdf_tools import store_pdf
+from agents.report_model import build_document
+from agents.tools.pdf_sections import block_flowables, inline_markup, source_flowables
 
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
@@ -15,32 +17,17 @@ logger = logging.getLogger(__name__)
 
 def format_pdf(state: Dict[str, Any]) -> Dict[str, Any]:
     """PDF formatting functie."""
-    messages = state["messages"]
-    research_results = state.get("research_results", "")
+    research_results = resolve(state.get("research_results", ""))
     
     if not research_results:
         return {
-            "messages": messages + [AIMessage(content="Geen onderzoeksresultaten om te formatteren")]
+            "messages": [AIMessage(content="Geen onderzoeksresultaten om te formatteren")]
         }
     
     try:
-        # Parse de research results
-        if isinstance(research_results, str):
-            content = research_results
-        else:
-            content = json.dumps(research_results)
-            
-        # Valideer dat alle secties aanwezig zijn
-        parsed = json.loads(content)
-        required_sections = ["title", "sections"]
-        for section in required_sections:
-            if section not in parsed:
-                raise ValueError(f"Content mist verplichte sectie: {section}")
-                
-        required_subsections = ["Samenvatting", "Belangrijkste Resultaten", "Context en Details", "Bronnen"]
-        for subsection in required_subsections:
-            if subsection not in parsed["sections"]:
-                raise ValueError(f"Content mist verplichte subsectie: {subsection}")
+        # Parse, herstel en valideer de research results
+        parsed = parse_report(research_results)
+        content = json.dumps(parsed, ensure_ascii=False)
         
         # Check dat bronnen een array is met de juiste structuur
         bronnen = parsed["sections"]["Bronnen"]
@@ -57,7 +44,7 @@ def format_pdf(state: Dict[str, Any]) -> Dict[str, Any]:
         pdf_path = generate_pdf(content)
         
         return {
-            "messages": messages + [AIMessage(content=f"PDF succesvol gegenereerd: {pdf_path}")],
+            "messages": [AIMessage(content=f"PDF succesvol gegenereerd: {pdf_path}")],
             "pdf_path": pdf_path
         }
         
@@ -65,13 +52,13 @@ def format_pdf(state: Dict[str, Any]) -> Dict[str, Any]:
         error_msg = f"Error bij JSON parsen: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
     except Exception as e:
         error_msg = f"Error bij PDF generatie: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
 
 def generate_pdf(content: str) -> str:
@@ -82,18 +69,23 @@ def generate_pdf(content: str) -> str:
         content: JSON string met de PDF inhoud
         
     Returns:
-        Path naar het gegenereerde PDF bestand
+        Path naar het gegenereerde PDF bestand (direct beschikbaar via get_pdf_bytes)
     """
-    # Parse de JSON content
-    data = json.loads(content)
+    # ReportLab pas laden als er echt een PDF gemaakt wordt
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     
-    # Maak een tijdelijk bestand voor de PDF
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-        pdf_path = temp_pdf.name
+    # Parse de JSON content naar het document model
+    document = build_document(content)
+    
+    # Render in het geheugen; het bestand wordt op de achtergrond weggeschreven
+    buffer = io.BytesIO()
     
     # Maak het PDF document
     doc = SimpleDocTemplate(
-        pdf_path,
+        buffer,
         pagesize=letter,
         rightMargin=72,
         leftMargin=72,
@@ -138,32 +130,30 @@ def generate_pdf(content: str) -> str:
     story = []
     
     # Titel
-    story.append(Paragraph(data['title'], title_style))
+    story.append(Paragraph(inline_markup(document.title), title_style))
     story.append(Spacer(1, 12))
     
     # Secties
-    sections = data['sections']
     for section_title in ["Samenvatting", "Belangrijkste Resultaten", "Context en Details"]:
-        if section_title in sections:
+        section = document.section(section_title)
+        if section:
             story.append(Paragraph(section_title, heading_style))
-            story.append(Paragraph(sections[section_title], body_style))
+            story.extend(block_flowables(section.blocks, body_style, doc.width))
             story.append(Spacer(1, 12))
     
     # Bronnen sectie
-    if "Bronnen" in sections:
+    bronnen = document.section("Bronnen")
+    if bronnen:
         story.append(Paragraph("Bronnen", heading_style))
-        bronnen = sections["Bronnen"]
         
         # Maak een lijst van bronnen met links
-        for bron in bronnen:
-            bron_text = f'<link href="{bron["url"]}">{bron["titel"]}</link>'
-            if bron.get("relevantie"):
-                bron_text += f' - {bron["relevantie"]}'
-            story.append(Paragraph(bron_text, source_style))
+        for flowable in source_flowables(bronnen.sources, source_style):
+            story.append(flowable)
             story.append(Spacer(1, 6))
     
     # Genereer de PDF
     doc.build(story)
+    pdf_path = store_pdf(buffer.getvalue())
     logger.info(f"PDF gegenereerd: {pdf_path}")
     
     return pdf_path
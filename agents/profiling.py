@@ -0,0 +1,232 @@
+"""
+Profiling op aanvraag, per run.
+
+Zet profiling aan met AGENTS_PROFILE=1 of per run met het `profile` argument
+van de process_query* functies. De run krijgt dan een eigen directory onder
+AGENTS_PROFILE_DIR (standaard output/profiles), in de config onder
+`configurable.profile_dir`. Elke node en tool aanroep schrijft daar:
+
+- <sectie>.<nr>.pstats: deterministisch profiel (cProfile), te openen met
+  pstats of snakeviz. cProfile kan maar een profiel tegelijk meten; parallelle
+  of geneste secties krijgen alleen de sampling profiler.
+- <sectie>.<nr>.folded: collapsed stacks van de sampling profiler, voor
+  flamegraph.pl of speedscope.
+- <sectie>.<nr>.alloc.txt: voor de fetch en PDF stappen de top allocaties
+  (tracemalloc) tijdens de sectie.
+
+Zonder profiling kost een sectie alleen het opzoeken van de config. Roep na
+de run finish_profiling aan, zodat de tellers van de run vrijkomen.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+import inspect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Aantal regels in een allocatie snapshot
+TOP_ALLOCATIONS = 25
+
+_cprofile_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+# Of tracemalloc door profiling gestart is; anders laten we hem aan
+_tracemalloc_owned = False
+_sequence: Dict[str, int] = {}
+_sequence_lock = threading.Lock()
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _profile_root() -> str:
+    return getenv("AGENTS_PROFILE_DIR", os.path.join("output", "profiles"))
+
+def _sample_interval() -> float:
+    """Interval van de sampling profiler in seconden."""
+    return float(getenv("AGENTS_PROFILE_INTERVAL", "0.005"))
+
+def profiling_requested(enabled: Optional[bool] = None) -> bool:
+    """Of een run geprofiled moet worden: het argument, anders AGENTS_PROFILE."""
+    if enabled is not None:
+        return enabled
+    return getenv("AGENTS_PROFILE", "").lower() in ("1", "true", "ja", "on")
+
+def enable_profiling(config: Dict[str, Any], run_name: str, enabled: Optional[bool] = None) -> Optional[str]:
+    """
+    Zet profiling aan voor een run.
+
+    Args:
+        config: De run config; de directory komt onder configurable.profile_dir
+        run_name: Naam voor de directory, bijvoorbeeld de thread_id
+        enabled: True of False, None voor AGENTS_PROFILE
+
+    Returns:
+        De directory van de run, of None als er niet geprofiled wordt
+    """
+    if not profiling_requested(enabled):
+        return None
+    safe_name = re.sub(r"[^\w.-]+", "_", run_name)[:60]
+    run_dir = os.path.join(_profile_root(), f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}")
+    os.makedirs(run_dir, exist_ok=True)
+    config.setdefault("configurable", {})["profile_dir"] = run_dir
+    logger.info(f"Profiling aan, resultaten in {run_dir}")
+    return run_dir
+
+def finish_profiling(config: Dict[str, Any]) -> None:
+    """Vergeet de volgnummers van een afgelopen run."""
+    run_dir = (config.get("configurable") or {}).get("profile_dir")
+    if not run_dir:
+        return
+    prefix = os.path.join(run_dir, "")
+    with _sequence_lock:
+        for key in [key for key in _sequence if key.startswith(prefix)]:
+            del _sequence[key]
+
+def _profile_dir() -> Optional[str]:
+    from langchain_core.runnables.config import ensure_config
+
+    return (ensure_config().get("configurable") or {}).get("profile_dir")
+
+def _next_path(run_dir: str, name: str) -> str:
+    key = os.path.join(run_dir, name)
+    with _sequence_lock:
+        _sequence[key] = _sequence.get(key, 0) + 1
+        return f"{key}.{_sequence[key]:03d}"
+
+class StackSampler:
+    """Sampling profiler voor een enkele thread; verzamelt collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: Optional[float] = None):
+        self.thread_id = thread_id
+        self.interval = _sample_interval() if interval is None else interval
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+def _start_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+def _stop_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+def _write_allocations(path: str, before, after, seconds: float) -> None:
+    stats = after.compare_to(before, "lineno")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Duur: {seconds:.3f} s\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocaties (nieuw tijdens de sectie):\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+@contextmanager
+def profile_section(name: str, allocations: bool = False) -> Iterator[None]:
+    """
+    Profileer een stuk code als profiling voor de huidige run aan staat.
+
+    Args:
+        name: Naam van de sectie, bijvoorbeeld "node.web_research" of "fetch"
+        allocations: Ook een tracemalloc snapshot van de sectie maken
+    """
+    run_dir = _profile_dir()
+    if not run_dir:
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+
+    base = _next_path(run_dir, name)
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile() if _cprofile_lock.acquire(blocking=False) else None
+    snapshot = None
+    if allocations:
+        _start_tracemalloc()
+        snapshot = tracemalloc.take_snapshot()
+
+    started = time.perf_counter()
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        try:
+            if profiler is not None:
+                profiler.dump_stats(f"{base}.pstats")
+            sampler.write(f"{base}.folded")
+            if snapshot is not None:
+                _write_allocations(f"{base}.alloc.txt", snapshot, tracemalloc.take_snapshot(), elapsed)
+        except OSError as e:
+            logger.warning(f"Profiel van {name} niet weggeschreven: {str(e)}")
+        finally:
+            if snapshot is not None:
+                _stop_tracemalloc()
+
+def node_runner(func: Any) -> Callable[[Any, Optional[Dict[str, Any]]], Any]:
+    """Maak van een node (Runnable, functie met of zonder config) een aanroep met (state, config)."""
+    if hasattr(func, "invoke"):
+        return lambda state, config: func.invoke(state, config)
+    if "config" in inspect.signature(func).parameters:
+        return func
+    return lambda state, config: func(state)
+
+def profile_node(name: str, func: Any) -> Callable[..., Any]:
+    """Wikkel een graph node (functie of Runnable) zodat hij per bezoek geprofiled wordt."""
+    run = node_runner(func)
+
+    def profiled(state: Any, config: Optional[Dict[str, Any]] = None) -> Any:
+        with profile_section(f"node.{name}"):
+            return run(state, config)
+
+    profiled.__name__ = name
+    return profiled
@@ -0,0 +1,40 @@
+from typing import Dict
+from langchain_core.rate_limiters import InMemoryRateLimiter
+import logging
+import threading
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Standaard limieten in requests per seconde, per soort resource.
+# Overschrijfbaar met RATE_LIMIT_<NAAM>_RPS, bijvoorbeeld RATE_LIMIT_LLM_RPS=2
+DEFAULT_RATES = {
+    "llm": 1.0,
+    "search": 1.0,
+    "fetch": 5.0,
+}
+
+_limiters: Dict[str, InMemoryRateLimiter] = {}
+_lock = threading.Lock()
+
+def get_rate_limiter(name: str) -> InMemoryRateLimiter:
+    """
+    Geef de gedeelde rate limiter voor een resource.
+
+    Alle threads in het proces (ook parallelle batch runs) delen dezelfde
+    limiter, zodat de totale belasting binnen de limiet blijft.
+    """
+    with _lock:
+        if name not in _limiters:
+            rate = float(getenv(f"RATE_LIMIT_{name.upper()}_RPS", str(DEFAULT_RATES.get(name, 1.0))))
+            burst = int(getenv(f"RATE_LIMIT_{name.upper()}_BURST", "3"))
+            _limiters[name] = InMemoryRateLimiter(
+                requests_per_second=rate,
+                check_every_n_seconds=0.05,
+                max_bucket_size=burst
+            )
+            logger.info(f"Rate limiter '{name}': {rate} requests per seconde")
+        return _limiters[name]
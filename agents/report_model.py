@@ -0,0 +1,340 @@
+"""
+Tussenliggend document model voor rapporten.
+
+Het rapport JSON (title + sections) wordt een keer geparsed naar een
+ReportDocument met blokken (koppen, alinea's, lijsten, tabellen) en bronnen.
+Daaruit worden goedkoop HTML en Markdown gemaakt; de PDF emitter in
+agents.tools.pdf_tools gebruikt dezelfde blokken.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import html
+import json
+import logging
+import re
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximale lengte van een enkele Paragraph; langere alinea's worden op zinsgrenzen gesplitst
+MAX_PARAGRAPH_CHARS = 1500
+
+SOURCES_SECTION = "Bronnen"
+
+# Een blok is (soort, payload):
+#   ("heading", (niveau, tekst)), ("paragraph", tekst),
+#   ("list", (genummerd, [items])), ("table", [[cel, ...], ...])
+Block = Tuple[str, Any]
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s*[-*+•]\s+(.*)$")
+_ORDERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_SEP = re.compile(r"^\s*\|?(\s*:?-{2,}:?\s*\|)+\s*(:?-{2,}:?\s*)?\|?\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_CODE = re.compile(r"`([^`]+)`")
+_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)")
+_BOLD = re.compile(r"\*\*(?!\s)(.+?)(?<!\s)\*\*|__(?!\s)(.+?)(?<!\s)__")
+_ITALIC = re.compile(r"(?<![*\w])\*(?![\s*])(.+?)(?<![\s*])\*(?![*\w])|(?<!\w)_(?![\s_])(.+?)(?<![\s_])_(?!\w)")
+
+@dataclass
+class Source:
+    """Een bron uit de Bronnen sectie."""
+    url: str
+    titel: str
+    relevantie: str = ""
+
+@dataclass
+class ReportSection:
+    """Een sectie; sources is alleen gevuld voor de Bronnen sectie."""
+    title: str
+    blocks: List[Block] = field(default_factory=list)
+    sources: Optional[List[Source]] = None
+
+@dataclass
+class ReportDocument:
+    """Het geparsede rapport, gedeeld door alle emitters."""
+    title: str
+    sections: List[ReportSection] = field(default_factory=list)
+
+    def section(self, title: str) -> Optional[ReportSection]:
+        """Zoek een sectie op titel."""
+        for section in self.sections:
+            if section.title == title:
+                return section
+        return None
+
+    def to_markdown(self) -> str:
+        """Emit het rapport als Markdown."""
+        lines = [f"# {self.title}", ""]
+        for section in self.sections:
+            lines += [f"## {section.title}", ""]
+            if section.sources is not None:
+                for source in section.sources:
+                    line = f"- [{source.titel}]({source.url})" if source.url else f"- {source.titel}"
+                    lines.append(f"{line} - {source.relevantie}" if source.relevantie else line)
+                lines.append("")
+                continue
+            for kind, payload in section.blocks:
+                if kind == "heading":
+                    level, text = payload
+                    lines.append(f"{'#' * min(level + 2, 6)} {text}")
+                elif kind == "paragraph":
+                    lines.append(payload)
+                elif kind == "list":
+                    ordered, items = payload
+                    lines += [f"{i}. {item}" if ordered else f"- {item}" for i, item in enumerate(items, 1)]
+                elif kind == "table":
+                    lines.append("| " + " | ".join(payload[0]) + " |")
+                    lines.append("|" + "---|" * len(payload[0]))
+                    lines += ["| " + " | ".join(row) + " |" for row in payload[1:]]
+                lines.append("")
+        return "\n".join(lines)
+
+    def to_html(self) -> str:
+        """Emit het rapport als HTML fragment, veilig ge-escaped."""
+        parts = ['<article class="report">', f"<h1>{html.escape(self.title)}</h1>"]
+        for section in self.sections:
+            parts.append(f"<h2>{html.escape(section.title)}</h2>")
+            if section.sources is not None:
+                parts.append("<ul>")
+                for source in section.sources:
+                    text = html.escape(source.titel)
+                    if source.url:
+                        text = f'<a href="{html.escape(source.url)}" target="_blank">{text}</a>'
+                    if source.relevantie:
+                        text += f" - {inline_html(source.relevantie)}"
+                    parts.append(f"<li>{text}</li>")
+                parts.append("</ul>")
+                continue
+            for kind, payload in section.blocks:
+                if kind == "heading":
+                    level, text = payload
+                    tag = f"h{min(level + 2, 6)}"
+                    parts.append(f"<{tag}>{inline_html(text)}</{tag}>")
+                elif kind == "paragraph":
+                    parts.append(f"<p>{inline_html(payload)}</p>")
+                elif kind == "list":
+                    ordered, items = payload
+                    tag = "ol" if ordered else "ul"
+                    parts.append(f"<{tag}>" + "".join(f"<li>{inline_html(item)}</li>" for item in items) + f"</{tag}>")
+                elif kind == "table":
+                    header = "".join(f"<th>{inline_html(cell)}</th>" for cell in payload[0])
+                    body = "".join(
+                        "<tr>" + "".join(f"<td>{inline_html(cell)}</td>" for cell in row) + "</tr>"
+                        for row in payload[1:]
+                    )
+                    parts.append(f"<table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>")
+        parts.append("</article>")
+        return "\n".join(parts)
+
+    def to_pdf_bytes(self) -> bytes:
+        """Emit het rapport als PDF (de dure emitter, pas aanroepen als het nodig is)."""
+        from agents.tools.pdf_tools import render_document_pdf
+        return render_document_pdf(self)
+
+def parse_blocks(text: str) -> Iterator[Block]:
+    """
+    Parse markdown-achtige tekst regel voor regel naar blokken.
+
+    Ondersteunt koppen (#), opsommingen (-, *, +), genummerde lijsten,
+    pipe tabellen en gewone alinea's. Geneste lijsten worden plat gemaakt.
+    """
+    paragraph: List[str] = []
+    list_items: List[str] = []
+    list_ordered = False
+    table_rows: List[List[str]] = []
+
+    def flush():
+        nonlocal paragraph, list_items, table_rows
+        if paragraph:
+            yield ("paragraph", " ".join(paragraph))
+            paragraph = []
+        if list_items:
+            yield ("list", (list_ordered, list_items))
+            list_items = []
+        if table_rows:
+            yield ("table", table_rows)
+            table_rows = []
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+
+        if not line:
+            yield from flush()
+            continue
+
+        if _TABLE_ROW.match(line):
+            if paragraph or list_items:
+                yield from flush()
+            if not _TABLE_SEP.match(line):
+                table_rows.append([cell.strip() for cell in line.strip("|").split("|")])
+            continue
+        if table_rows:
+            yield from flush()
+
+        heading = _HEADING.match(line)
+        if heading:
+            yield from flush()
+            yield ("heading", (len(heading.group(1)), heading.group(2)))
+            continue
+
+        bullet = _BULLET.match(line)
+        ordered = _ORDERED.match(line)
+        if bullet or ordered:
+            is_ordered = bool(ordered) and not bullet
+            if paragraph or (list_items and list_ordered != is_ordered):
+                yield from flush()
+            list_ordered = is_ordered
+            list_items.append((ordered or bullet).group(1))
+            continue
+
+        if list_items and raw_line[:1].isspace():
+            # Ingesprongen vervolgregel hoort bij het vorige lijst item
+            list_items[-1] += " " + line
+            continue
+
+        if list_items:
+            yield from flush()
+        paragraph.append(line)
+
+    yield from flush()
+
+def split_long_text(text: str, max_chars: int = MAX_PARAGRAPH_CHARS) -> List[str]:
+    """Splits tekst op zinsgrenzen in stukken van hooguit max_chars (waar mogelijk)."""
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        # Een enkele zin zonder leestekens kan zelf al te lang zijn
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def render_inline(
+    text: str,
+    escape: Callable[[str], str],
+    code: str,
+    bold: str,
+    italic: str,
+    link: str
+) -> str:
+    """
+    Escape tekst en zet inline markdown om met de gegeven templates.
+
+    `code`, **vet**, *cursief* en [tekst](url) worden ondersteund; al het
+    andere wordt letterlijk weergegeven. De link template krijgt url en text.
+    """
+    def emphasis(part: str) -> str:
+        part = _BOLD.sub(lambda m: bold.format(m.group(1) or m.group(2)), part)
+        return _ITALIC.sub(lambda m: italic.format(m.group(1) or m.group(2)), part)
+
+    def render_link(m: "re.Match[str]") -> str:
+        return link.format(url=m.group(2).replace('"', "&quot;"), text=emphasis(m.group(1)))
+
+    parts = []
+    for i, part in enumerate(_CODE.split(text)):
+        if i % 2:
+            parts.append(code.format(escape(part)))
+            continue
+        # Links na de nadruk invullen, zodat de regexen nooit gemaakte markup
+        # (zoals target="_blank" of een url met _) zien
+        links: List[str] = []
+
+        def placeholder(m: "re.Match[str]") -> str:
+            links.append(render_link(m))
+            return f"\x00{len(links) - 1}\x00"
+
+        part = _LINK.sub(placeholder, escape(part).replace("\x00", ""))
+        part = emphasis(part)
+        part = re.sub(r"\x00(\d+)\x00", lambda m: links[int(m.group(1))], part)
+        parts.append(part)
+    return "".join(parts)
+
+def inline_html(text: str) -> str:
+    """Inline markdown naar HTML."""
+    return render_inline(
+        text,
+        escape=lambda s: html.escape(s, quote=False),
+        code="<code>{}</code>",
+        bold="<strong>{}</strong>",
+        italic="<em>{}</em>",
+        link='<a href="{url}" target="_blank">{text}</a>'
+    )
+
+def _parse_sources(content: Any) -> List[Source]:
+    if isinstance(content, str):
+        content = [line.strip().lstrip("-*•").strip() for line in content.splitlines()]
+    sources = []
+    for item in content or []:
+        if isinstance(item, dict):
+            url = str(item.get("url") or "")
+            sources.append(Source(
+                url=url,
+                titel=str(item.get("titel") or item.get("title") or url),
+                relevantie=str(item.get("relevantie") or "")
+            ))
+        elif item:
+            sources.append(Source(url="", titel=str(item)))
+    return sources
+
+def _parse_section(title: str, content: Any) -> ReportSection:
+    if title == SOURCES_SECTION:
+        return ReportSection(title=title, sources=_parse_sources(content))
+    if isinstance(content, list):
+        blocks = [("list", (False, [str(item) for item in content]))]
+    elif isinstance(content, dict):
+        blocks = [("paragraph", f"**{key}:** {value}") for key, value in content.items()]
+    else:
+        blocks = list(parse_blocks(str(content)))
+    return ReportSection(title=title, blocks=blocks)
+
+def pdf_requested(config: Optional[Dict[str, Any]]) -> bool:
+    """
+    Of de workflow zelf een PDF moet maken.
+
+    Met `render_pdf: False` in config["configurable"] slaan de format_pdf nodes
+    de PDF over; de frontend maakt hem dan pas bij een download.
+    """
+    return bool((config or {}).get("configurable", {}).get("render_pdf", True))
+
+def build_document(content: Union[str, Dict[str, Any]]) -> ReportDocument:
+    """
+    Bouw het document model van een rapport.
+
+    Args:
+        content: JSON string of dict met title en sections
+
+    Raises:
+        json.JSONDecodeError: als content geen geldige JSON is
+    """
+    if isinstance(content, str):
+        return _build_cached(content)
+    return ReportDocument(
+        title=str(content.get("title") or "Onderzoeksrapport"),
+        sections=[_parse_section(str(title), body) for title, body in (content.get("sections") or {}).items()]
+    )
+
+@lru_cache(maxsize=32)
+def _build_cached(content: str) -> ReportDocument:
+    # Dezelfde content (bijvoorbeeld bij een Streamlit rerun) wordt maar een keer geparsed
+    return build_document(json.loads(content))
@@ -1,61 +1,224 @@
-from typing import Annotated, TypedDict, Dict, Any
+from typing import Annotated, TypedDict, Dict, Any, List, Optional
+from dataclasses import asdict
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
+from langgraph.types import Send
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain_anthropic import ChatAnthropic
+from langchain_core.runnables import RunnableConfig
+from agents.llm import create_chat_model
 import os
-from dotenv import load_dotenv
 import json
 import logging
+import operator
+import re
+import time
 
-from agents.tools.web_tools import search_web, fetch_webpage_content
+from agents.tools.web_tools import (
+    search_web, fetch_webpage_content, search_web_structured, render_search_results, is_fetch_error
+)
+from agents.tools.search_backends import SearchResult
 from agents.tools.pdf_tools import generate_pdf
+from agents.research_cache import lookup_report, find_offer, store_report, describe_reuse
+from agents.json_repair import parse_report, content_to_text, repair_json
+from agents.blob_store import offload, resolve
+from agents.report_model import pdf_requested
+from agents.accounting import BudgetExceededError, RunBudget, finish_usage, record_tool_call, track_usage
+from agents.state_compaction import bounded_add_messages
+from agents.deadline import DeadlineExceededError, partial_report, set_deadline, stream_until_deadline
+from agents import deadline as run_deadline
+from agents.profiling import enable_profiling, finish_profiling, profile_node
 
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Laad environment variables
-load_dotenv()
-
 # Definieer de state structuur
 class State(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
+    messages: Annotated[list[BaseMessage], bounded_add_messages]
     research_results: str
     pdf_path: str
+    # Vergelijkbaar eerder rapport dat de gebruiker kan openen (research_cache.find_offer)
+    reuse_offer: Optional[Dict[str, Any]]
+    # Taken van de planner; elke taak wordt een parallelle branch
+    research_plan: List[Dict[str, str]]
+    # Uitkomsten van de branches, samengevoegd door de reducer
+    search_results: Annotated[List[Dict[str, Any]], operator.add]
+
+class ResearchTask(TypedDict):
+    """Input van een research_worker branch, verstuurd met Send."""
+    kind: str    # 'search' of 'fetch'
+    target: str  # Zoekterm of URL
+
+# Maximaal aantal parallelle branches per vraag
+MAX_BRANCHES = 5
+RESULTS_PER_TERM = 5
+MAX_PAGE_CHARS = 3000
+
+# Pogingen per branch bij tijdelijke fouten, met oplopende wachttijd
+BRANCH_ATTEMPTS = 3
+BRANCH_BACKOFF = 1.0
+
+_URL_PATTERN = re.compile(r"https?://[^\s)\]>\"']+")
 
 # Initialiseer de agents
-web_research_agent = ChatAnthropic(
-    model="claude-3-sonnet-20240229",
-    temperature=0,
-    anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
-).bind_tools([search_web, fetch_webpage_content])  # Alleen web search tools
+@lru_cache(maxsize=1)
+def get_web_research_agent():
+    """Web research agent, aangemaakt bij het eerste gebruik."""
+    return create_chat_model([search_web, fetch_webpage_content], step="analysis")  # Alleen web search tools
+
+@lru_cache(maxsize=1)
+def get_pdf_formatting_agent():
+    """PDF formatting agent, aangemaakt bij het eerste gebruik."""
+    return create_chat_model([generate_pdf], step="format")  # Alleen PDF tool, klein model volstaat
 
-pdf_formatting_agent = ChatAnthropic(
-    model="claude-3-sonnet-20240229",
-    temperature=0,
-    anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
-).bind_tools([generate_pdf])  # Alleen PDF tool
+@lru_cache(maxsize=1)
+def get_planning_model():
+    """Klein model dat de vraag in zoektermen opsplitst."""
+    return create_chat_model(step="interpret")
 
 # Agent functies
-def web_research(state: State) -> Dict[str, Any]:
-    """Web research agent functie."""
+def plan_research(state: State) -> Dict[str, Any]:
+    """Planner: bepaal de zoektermen en URL's die parallel onderzocht worden."""
     messages = state["messages"]
     last_message = messages[-1]
     
     if not isinstance(last_message, HumanMessage):
-        return {"messages": [AIMessage(content="Ik kan alleen reageren op gebruikersvragen.")]}
+        return {
+            "messages": [AIMessage(content="Ik kan alleen reageren op gebruikersvragen.")],
+            "research_plan": []
+        }
+    
+    question = last_message.content
+    
+    # Hergebruik een recent rapport voor een (bijna) identieke vraag
+    cached = lookup_report(question)
+    if cached:
+        return {
+            "messages": [AIMessage(content=describe_reuse(cached))],
+            "research_results": offload(cached.research_results),
+            "research_plan": []
+        }
+    
+    # De vraag zelf wordt altijd gezocht; extra zoektermen komen van een klein model
+    terms = [question]
+    try:
+        plan_message = HumanMessage(content=f"""
+        Je bent een onderzoeksassistent. Bedenk 2-3 gerichte zoektermen voor deze vraag:
+
+        VRAAG: {question}
+
+        Geef ALLEEN JSON terug: {{"zoektermen": ["term1", "term2"]}}
+        """)
+        response = get_planning_model().invoke([plan_message])
+        terms += [str(t) for t in repair_json(content_to_text(response.content)).get("zoektermen", []) if t]
+    except BudgetExceededError:
+        raise
+    except Exception as e:
+        logger.warning(f"Zoektermen bepalen mislukt, alleen de vraag wordt gezocht: {str(e)}")
+    
+    plan = [{"kind": "fetch", "target": url} for url in dict.fromkeys(_URL_PATTERN.findall(question))]
+    seen = set()
+    for term in terms:
+        key = " ".join(term.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            plan.append({"kind": "search", "target": term})
+    plan = plan[:MAX_BRANCHES]
+    logger.info(f"Research plan: {plan}")
+    
+    # Een vergelijkbaar rapport wordt alleen aangeboden; het onderzoek gaat door
+    return {"research_plan": plan, "reuse_offer": find_offer(question)}
+
+def dispatch_research(state: State):
+    """Stuur elke taak uit het plan naar een eigen research_worker branch."""
+    if state.get("research_results"):
+        return "format_pdf"
+    plan = state.get("research_plan") or []
+    if not plan:
+        return END
+    return [Send("research_worker", task) for task in plan]
+
+def _run_task(task: ResearchTask, entry: Dict[str, Any]) -> None:
+    if task["kind"] == "fetch":
+        # Via de tool, zodat de aanroep in de callbacks (en het verbruik) zichtbaar is
+        page = fetch_webpage_content.invoke(task["target"])
+        if is_fetch_error(page):
+            # Geen pagina tekst; opnieuw proberen heeft geen zin, de fetch guard
+            # onthoudt de mislukte URL en de circuit breaker de host
+            entry["error"] = page
+        else:
+            entry["content"] = page[:MAX_PAGE_CHARS]
+    else:
+        record_tool_call("search_web")
+        results = search_web_structured(task["target"], max_results=RESULTS_PER_TERM)
+        entry["results"] = [asdict(r) for r in results]
+        logger.info(f"Aantal zoekresultaten voor '{task['target']}': {len(results)}")
+
+def research_worker(task: ResearchTask) -> Dict[str, Any]:
+    """
+    Voer een enkele zoekopdracht of fetch uit.
+    
+    Tijdelijke fouten (timeouts, verbindingsfouten) worden binnen deze branch
+    tot BRANCH_ATTEMPTS keer opnieuw geprobeerd. Een branch die dan nog faalt,
+    of een andere fout geeft, komt terug met error gezet, zodat de rest van het
+    onderzoek gewoon doorgaat.
+    """
+    entry: Dict[str, Any] = {"kind": task["kind"], "target": task["target"], "results": [], "content": "", "error": None}
+    for attempt in range(1, BRANCH_ATTEMPTS + 1):
+        try:
+            _run_task(task, entry)
+            break
+        except BudgetExceededError:
+            # Budget of deadline op; de hele run moet stoppen
+            raise
+        except (TimeoutError, ConnectionError) as e:
+            if attempt == BRANCH_ATTEMPTS:
+                logger.error(f"Research branch '{task['target']}' faalde na {attempt} pogingen: {str(e)}")
+                entry["error"] = str(e) or type(e).__name__
+                break
+            backoff = BRANCH_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(f"Research branch '{task['target']}' poging {attempt} mislukt, opnieuw over {backoff:g}s: {str(e)}")
+            time.sleep(run_deadline.remaining(backoff))
+            run_deadline.check(f"research branch {task['target']}")
+        except Exception as e:
+            logger.error(f"Error in research branch '{task['target']}': {str(e)}")
+            entry["error"] = str(e)
+            break
+    return {"search_results": [entry]}
+
+def _render_branch_results(branches: List[Dict[str, Any]]) -> str:
+    """Voeg de uitkomsten van alle branches samen, ontdubbeld op URL."""
+    parts = []
+    seen_urls = set()
+    for branch in branches:
+        if branch["kind"] == "fetch":
+            if branch.get("content"):
+                parts.append(f"PAGINA {branch['target']}:\n{branch['content']}")
+            continue
+        results = []
+        for r in branch.get("results", []):
+            if r["url"] not in seen_urls:
+                seen_urls.add(r["url"])
+                results.append(SearchResult(**r))
+        if results:
+            parts.append(f"ZOEKTERM {branch['target']}:\n{render_search_results(results)}")
+    return "\n\n".join(parts) or render_search_results([])
+
+def web_research(state: State) -> Dict[str, Any]:
+    """Reducer: analyseer de samengevoegde uitkomsten van alle branches tot een rapport."""
+    question = next(
+        (m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)),
+        ""
+    )
     
     try:
-        # Direct zoeken met de vraag
-        results = search_web(last_message.content)
-        logger.info(f"Zoekresultaten: {results}")
+        results = _render_branch_results(state.get("search_results") or [])
         
         # Laat de agent de resultaten analyseren
         analyze_message = HumanMessage(content=f"""
         Je bent een onderzoeksassistent. Analyseer deze zoekresultaten en maak een gestructureerd rapport.
         
-        VRAAG: {last_message.content}
+        VRAAG: {question}
         
         RESULTATEN:
         {results}
@@ -74,63 +237,59 @@ def web_research(state: State) -> Dict[str, Any]:
         Geef ALLEEN de JSON terug, geen andere tekst.
         """)
         
-        analysis_response = web_research_agent.invoke([analyze_message])
+        analysis_response = get_web_research_agent().invoke([analyze_message])
         logger.info(f"Analyse resultaat: {analysis_response}")
         
-        # Probeer de JSON te parsen uit de response
+        # Parse en herstel de JSON; ontbrekende secties worden los opgevraagd
         try:
-            content = analysis_response.content
-            # Verwijder eventuele markdown code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-                
-            # Valideer de JSON
-            parsed = json.loads(content)
-            if not isinstance(parsed, dict):
-                raise ValueError("Response moet een dictionary zijn")
-                
-            if "title" not in parsed or "sections" not in parsed:
-                raise ValueError("Response mist verplichte velden 'title' of 'sections'")
-                
-            required_sections = ["Samenvatting", "Belangrijkste Resultaten", "Context en Details", "Bronnen"]
-            for section in required_sections:
-                if section not in parsed["sections"]:
-                    raise ValueError(f"Response mist verplichte sectie: {section}")
+            parsed = parse_report(
+                analysis_response.content,
+                llm=get_web_research_agent(),
+                context=f"VRAAG: {question}\n\nRESULTATEN:\n{results}"
+            )
+            content = json.dumps(parsed, ensure_ascii=False)
             
             # Geef de research results door aan de volgende agent
             logger.info("Research resultaten succesvol gegenereerd")
+            store_report(question, content)
             return {
-                "messages": messages + [AIMessage(content="Onderzoek voltooid, nu maken we er een PDF van.")],
-                "research_results": content  # De JSON string voor de PDF agent
+                "messages": [AIMessage(content="Onderzoek voltooid, nu maken we er een PDF van.")],
+                "research_results": offload(content)  # De JSON string (of blob referentie) voor de PDF agent
             }
             
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             logger.error(f"JSON parse error: {str(e)}")
-            logger.error(f"Content was: {content}")
+            logger.error(f"Content was: {analysis_response.content}")
             return {
-                "messages": messages + [AIMessage(content=f"Error bij verwerken van onderzoeksresultaten: {str(e)}")]
+                "messages": [AIMessage(content=f"Error bij verwerken van onderzoeksresultaten: {str(e)}")]
             }
             
+    except BudgetExceededError:
+        # Niet als gewone fout afhandelen; de run moet stoppen
+        raise
     except Exception as e:
         error_msg = f"Error bij web research: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
 
-def format_pdf(state: State) -> Dict[str, Any]:
+def format_pdf(state: State, config: RunnableConfig) -> Dict[str, Any]:
     """PDF formatting agent functie."""
-    messages = state["messages"]
-    research_results = state.get("research_results", "")
+    research_results = resolve(state.get("research_results", ""))
     
-    logger.info(f"Ontvangen research resultaten voor PDF: {research_results}")
+    logger.info(f"Ontvangen research resultaten voor PDF: {len(research_results or '')} karakters")
     
     # Controleer of we geldige research results hebben
     if not research_results:
         return {
-            "messages": messages + [AIMessage(content="Geen onderzoeksresultaten om te verwerken")]
+            "messages": [AIMessage(content="Geen onderzoeksresultaten om te verwerken")]
+        }
+    
+    # De aanroeper maakt de PDF zelf pas als hij nodig is
+    if not pdf_requested(config):
+        return {
+            "messages": [AIMessage(content="PDF wordt op aanvraag gemaakt")]
         }
     
     try:
@@ -139,7 +298,7 @@ def format_pdf(state: State) -> Dict[str, Any]:
         logger.info(f"PDF gegenereerd op pad: {pdf_path}")
             
         return {
-            "messages": messages + [AIMessage(content=f"PDF succesvol gegenereerd: {pdf_path}")],
+            "messages": [AIMessage(content=f"PDF succesvol gegenereerd: {pdf_path}")],
             "pdf_path": pdf_path
         }
         
@@ -147,7 +306,7 @@ def format_pdf(state: State) -> Dict[str, Any]:
         error_msg = f"Error bij PDF generatie: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
 
 def process_query(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -169,7 +328,7 @@ def process_query(state: Dict[str, Any]) -> Dict[str, Any]:
     4. Als je iets niet kunt vinden, zeg dat dan eerlijk
     """)
     
-    ai_message = web_research_agent.invoke([research_message])
+    ai_message = get_web_research_agent().invoke([research_message])
     logger.info(f"Web research resultaten: {ai_message.content}")
     
     # Stap 2: PDF formatting
@@ -194,33 +353,27 @@ def process_query(state: Dict[str, Any]) -> Dict[str, Any]:
     3. Als informatie ontbreekt, zeg dat dan expliciet
     """)
     
-    pdf_message = pdf_formatting_agent.invoke([format_message])
+    pdf_message = get_pdf_formatting_agent().invoke([format_message])
     logger.info(f"PDF formatting resultaat: {pdf_message.content}")
     
     # Parse de JSON en genereer PDF
     try:
-        content = ""
-        if isinstance(pdf_message.content, list):
-            for item in pdf_message.content:
-                if isinstance(item, dict) and item.get('type') == 'tool_use':
-                    content = item.get('input', {}).get('content', '')
-                    logger.info("Content gevonden in tool gebruik")
-                    break
-        else:
-            content = pdf_message.content
-            
-        logger.info(f"Content voor PDF generatie: {content}")
+        raw_content = content_to_text(pdf_message.content)
+        logger.info(f"Content voor PDF generatie: {raw_content}")
         
         # Valideer dat er geen placeholders zijn
-        if '[' in content or ']' in content:
+        if '[' in raw_content or ']' in raw_content:
             raise ValueError("PDF content bevat nog placeholders")
-            
+        
+        content = json.dumps(parse_report(raw_content, llm=get_pdf_formatting_agent()), ensure_ascii=False)
         pdf_path = generate_pdf(content)
         return {
             "messages": messages + [AIMessage(content=f"PDF rapport is gegenereerd: {pdf_path}")],
             "pdf_path": pdf_path
         }
         
+    except BudgetExceededError:
+        raise
     except Exception as e:
         error_msg = f"Error bij PDF generatie: {str(e)}"
         logger.error(error_msg)
@@ -228,43 +381,112 @@ def process_query(state: Dict[str, Any]) -> Dict[str, Any]:
             "messages": messages + [AIMessage(content=error_msg)]
         }
 
-# Bouw de workflow graph
+# Bouw de workflow graph: planner -> parallelle branches -> reducer -> PDF
 workflow = StateGraph(State)
 
-# Voeg nodes toe
-workflow.add_node("web_research", web_research)
-workflow.add_node("format_pdf", format_pdf)
+# Voeg nodes toe; elke branch probeert tijdelijke fouten zelf opnieuw (research_worker)
+workflow.add_node("plan_research", profile_node("plan_research", plan_research))
+workflow.add_node("research_worker", profile_node("research_worker", research_worker))
+workflow.add_node("web_research", profile_node("web_research", web_research))
+workflow.add_node("format_pdf", profile_node("format_pdf", format_pdf))
 
 # Definieer edges
-workflow.add_edge(START, "web_research")
+workflow.add_edge(START, "plan_research")
+workflow.add_conditional_edges("plan_research", dispatch_research, ["research_worker", "format_pdf", END])
+workflow.add_edge("research_worker", "web_research")
 workflow.add_edge("web_research", "format_pdf")
 workflow.add_edge("format_pdf", END)
 
-# Compileer de graph
-agent_workflow = workflow.compile()
+@lru_cache(maxsize=1)
+def get_agent_workflow():
+    """Compileer de graph een keer, bij het eerste gebruik."""
+    return workflow.compile()
+
+def __getattr__(name: str):
+    # Oude module attributen blijven beschikbaar, maar worden lui aangemaakt
+    lazy = {
+        "agent_workflow": get_agent_workflow,
+        "web_research_agent": get_web_research_agent,
+        "pdf_formatting_agent": get_pdf_formatting_agent,
+    }
+    if name in lazy:
+        return lazy[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def process_query_external(query: str, thread_id: str = "default") -> Dict[str, Any]:
+def _partial_state(query: str, state: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    """Maak van de state op het moment van de deadline een gedeeltelijk resultaat."""
+    partial = {**state, "error_message": reason, "partial": True}
+    if state.get("research_results"):
+        # De analyse was al klaar; alleen de PDF ontbreekt
+        return partial
+    
+    branches = state.get("search_results") or []
+    findings = [_render_branch_results(branches)] if branches else []
+    sources = []
+    seen_urls = set()
+    for branch in branches:
+        for r in branch.get("results", []):
+            if r["url"] not in seen_urls:
+                seen_urls.add(r["url"])
+                sources.append({"url": r["url"], "titel": r["title"]})
+    partial["research_results"] = offload(partial_report(query, reason, findings, sources))
+    return partial
+
+def process_query_external(
+    query: str,
+    thread_id: str = "default",
+    render_pdf: bool = True,
+    budget: Optional[RunBudget] = None,
+    deadline: Optional[float] = None,
+    profile: Optional[bool] = None
+) -> Dict[str, Any]:
     """
     Verwerk een zoekopdracht door de multi-agent workflow.
     
     Args:
         query: De zoekopdracht
         thread_id: Unieke identifier voor het gesprek
+        render_pdf: False om de PDF over te slaan (bijvoorbeeld als hij pas bij download gemaakt wordt)
+        budget: Limieten voor deze run, standaard uit RUN_BUDGET_* environment variables
+        deadline: Maximale duur van de run in seconden, standaard RUN_DEADLINE_SECONDS
+        profile: Profiel per node wegschrijven, standaard AGENTS_PROFILE
     
     Returns:
-        Dictionary met de eindstatus van de workflow
+        Dictionary met de eindstatus van de workflow, inclusief het verbruik onder "usage".
+        Na de deadline staat er een gedeeltelijk rapport in research_results en is "partial" True.
+        Met profiling staat de directory met profielen onder "profile_dir".
     """
     # Initialiseer de state
     initial_state = {
         "messages": [HumanMessage(content=query)],
         "research_results": "",
-        "pdf_path": ""
+        "pdf_path": "",
+        "reuse_offer": None,
+        "research_plan": [],
+        "search_results": []
     }
     
+    config = {"configurable": {"thread_id": thread_id, "render_pdf": render_pdf}}
+    usage = track_usage(config, budget)
+    set_deadline(config, deadline)
+    profile_dir = enable_profiling(config, thread_id, profile)
+    
     # Voer de workflow uit
-    final_state = agent_workflow.invoke(
-        initial_state,
-        config={"configurable": {"thread_id": thread_id}}
-    )
+    try:
+        final_state = stream_until_deadline(get_agent_workflow(), initial_state, config)
+    except DeadlineExceededError as e:
+        final_state = _partial_state(query, e.partial_state or initial_state, str(e))
+    except (BudgetExceededError, TimeoutError, ConnectionError) as e:
+        # Over budget, of een timeout buiten de research branches (die vangen hun eigen fouten af)
+        error_msg = str(e) if isinstance(e, BudgetExceededError) else f"Onderzoek afgebroken: {str(e)}"
+        final_state = {
+            **initial_state,
+            "messages": initial_state["messages"] + [AIMessage(content=error_msg)],
+            "error_message": error_msg
+        }
+    finally:
+        finish_profiling(config)
     
-    return final_state
+    if profile_dir:
+        final_state["profile_dir"] = profile_dir
+    return finish_usage(usage, final_state)
@@ -0,0 +1,320 @@
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from agents.cache_backend import get_shared_cache
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+# Configuratie via environment variables (of .env), gelezen bij gebruik
+def _cache_dir() -> str:
+    return getenv("RESEARCH_CACHE_DIR", os.path.join("output", "research_cache"))
+
+def _cache_enabled() -> bool:
+    return getenv("RESEARCH_CACHE_ENABLED", "1").lower() not in ("0", "false", "nee")
+
+def _similarity_threshold() -> float:
+    """Vanaf deze score wordt een eerder rapport zonder te vragen hergebruikt."""
+    return float(getenv("RESEARCH_CACHE_THRESHOLD", "0.9"))
+
+def _offer_threshold() -> float:
+    """Vanaf deze score (en onder de drempel voor hergebruik) wordt een rapport alleen aangeboden."""
+    return float(getenv("RESEARCH_CACHE_OFFER_THRESHOLD", "0.5"))
+
+def _max_age_hours() -> float:
+    return float(getenv("RESEARCH_CACHE_MAX_AGE_HOURS", "72"))
+
+def _max_entries() -> int:
+    return int(getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+
+# Veelvoorkomende woorden die niets zeggen over het onderwerp van de vraag
+STOPWORDS = {
+    "wat", "is", "een", "de", "het", "van", "en", "in", "op", "te", "voor", "met",
+    "hoe", "waar", "wie", "waarom", "welke", "zijn", "er", "over", "mij", "me", "je",
+    "ik", "kun", "kan", "vertel", "uitleg", "leg", "uit", "dat", "die", "dit", "om",
+    "what", "the", "a", "an", "of", "and", "to", "how", "who", "why", "about", "tell",
+}
+
+_lock = threading.Lock()
+
+@dataclass
+class CachedReport:
+    """Een eerder rapport dat lijkt op de huidige vraag."""
+    query: str
+    research_results: str
+    created_at: float
+    similarity: float
+
+    @property
+    def age_hours(self) -> float:
+        return (time.time() - self.created_at) / 3600
+
+def _normalize(text: str) -> str:
+    """Maak tekst lowercase en verwijder accenten."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def extract_terms(text: str) -> Dict[str, int]:
+    """
+    Maak een term-frequentie representatie van een vraag.
+
+    Naast hele woorden worden ook karakter-trigrammen meegenomen, zodat
+    varianten als "toller" en "tollers" op elkaar blijven lijken.
+    """
+    terms: Dict[str, int] = {}
+    for word in re.findall(r"\w+", _normalize(text)):
+        if word in STOPWORDS:
+            continue
+        terms[word] = terms.get(word, 0) + 1
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            gram = "c:" + padded[i:i + 3]
+            terms[gram] = terms.get(gram, 0) + 1
+    return terms
+
+def _tfidf(terms: Dict[str, int], idf: Dict[str, float]) -> Dict[str, float]:
+    """Weeg term-frequenties met idf en normaliseer naar lengte 1."""
+    vector = {t: (1 + math.log(c)) * idf.get(t, 1.0) for t, c in terms.items()}
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    if not norm:
+        return {}
+    return {t: v / norm for t, v in vector.items()}
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(t, 0.0) for t, v in a.items())
+
+def _similarity(query: str, entries: List[Dict[str, Any]]) -> List[float]:
+    """Cosine similarity van de vraag met elke entry, met idf over de vraag en de entries."""
+    query_terms = extract_terms(query)
+    doc_count = len(entries) + 1
+    df: Dict[str, int] = {}
+    for terms in [query_terms] + [e["terms"] for e in entries]:
+        for t in terms:
+            df[t] = df.get(t, 0) + 1
+    idf = {t: math.log((1 + doc_count) / (1 + n)) + 1 for t, n in df.items()}
+
+    query_vector = _tfidf(query_terms, idf)
+    return [_cosine(query_vector, _tfidf(e["terms"], idf)) for e in entries]
+
+def _index_path() -> str:
+    return os.path.join(_cache_dir(), INDEX_FILE)
+
+def _load_index() -> List[Dict[str, Any]]:
+    shared = get_shared_cache()
+    if shared is not None:
+        # Met een gedeelde cache staat de index per rapport in de database
+        return [entry for _, entry in shared.items("report_index")]
+    path = _index_path()
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Research cache index onleesbaar, begin opnieuw: {str(e)}")
+        return []
+
+def _read_report(entry: Dict[str, Any]) -> Optional[str]:
+    shared = get_shared_cache()
+    if shared is not None:
+        return shared.get("report", entry["id"])
+    with open(os.path.join(_cache_dir(), entry["file"]), "r", encoding="utf-8") as f:
+        return f.read()
+
+def _store_shared(shared, report_id: str, query: str, research_results: str) -> None:
+    """Sla een rapport op in de gedeelde cache; elke entry is een eigen atomaire write."""
+    ttl = _max_age_hours() * 3600
+    shared.set("report", report_id, research_results, ttl=ttl)
+    shared.set("report_index", report_id, {
+        "id": report_id,
+        "query": query,
+        "created_at": time.time(),
+        "terms": extract_terms(query),
+        "file": None
+    }, ttl=ttl)
+    for old_id in shared.trim("report_index", _max_entries()):
+        shared.delete("report", old_id)
+
+def _write_atomic(path: str, data: str) -> None:
+    """Schrijf een bestand atomair zodat lezers nooit een half bestand zien."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _best_match(query: str, max_age_hours: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+    """De index entry die het meest op de vraag lijkt, met zijn score."""
+    max_age_hours = _max_age_hours() if max_age_hours is None else max_age_hours
+    now = time.time()
+    fresh = [e for e in _load_index() if now - e["created_at"] <= max_age_hours * 3600]
+    if not fresh:
+        return None, 0.0
+    score, entry = max(zip(_similarity(query, fresh), fresh), key=lambda pair: pair[0])
+    return entry, score
+
+def lookup_report(
+    query: str,
+    threshold: Optional[float] = None,
+    max_age_hours: Optional[float] = None
+) -> Optional[CachedReport]:
+    """
+    Zoek een recent rapport voor een vraag die vrijwel gelijk is aan deze vraag.
+
+    Args:
+        query: De vraag van de gebruiker
+        threshold: Minimale cosine similarity (standaard RESEARCH_CACHE_THRESHOLD)
+        max_age_hours: Maximale leeftijd van het rapport in uren
+
+    Returns:
+        Het best passende CachedReport, of None als er geen geschikt rapport is
+    """
+    if not _cache_enabled():
+        return None
+
+    threshold = _similarity_threshold() if threshold is None else threshold
+
+    try:
+        best, best_score = _best_match(query, max_age_hours)
+        if best is None or best_score < threshold:
+            logger.info(f"Geen vergelijkbaar rapport gevonden (beste score: {best_score:.2f})")
+            return None
+
+        research_results = _read_report(best)
+        if research_results is None:
+            return None
+
+        logger.info(f"Eerder rapport hergebruikt voor '{best['query']}' (score: {best_score:.2f})")
+        return CachedReport(
+            query=best["query"],
+            research_results=research_results,
+            created_at=best["created_at"],
+            similarity=best_score
+        )
+    except Exception as e:
+        logger.error(f"Error bij research cache lookup: {str(e)}")
+        return None
+
+def find_offer(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Zoek een eerder rapport dat op de vraag lijkt, maar niet genoeg om het te hergebruiken.
+
+    Het onderzoek gaat gewoon door; de gebruiker kan het aangeboden rapport
+    met load_report openen.
+
+    Returns:
+        Dict met report_id, query, created_at en similarity, of None
+    """
+    if not _cache_enabled():
+        return None
+    try:
+        best, best_score = _best_match(query)
+    except Exception as e:
+        logger.error(f"Error bij research cache lookup: {str(e)}")
+        return None
+    if best is None or not _offer_threshold() <= best_score < _similarity_threshold():
+        return None
+    logger.info(f"Eerder rapport aangeboden voor '{best['query']}' (score: {best_score:.2f})")
+    return {
+        "report_id": best["id"],
+        "query": best["query"],
+        "created_at": best["created_at"],
+        "similarity": best_score
+    }
+
+def load_report(report_id: str) -> Optional[str]:
+    """De research resultaten van een rapport uit de cache, bijvoorbeeld een aanbod van find_offer."""
+    try:
+        entry = next((e for e in _load_index() if e["id"] == report_id), None)
+        return _read_report(entry) if entry else None
+    except OSError as e:
+        logger.warning(f"Rapport {report_id} niet leesbaar: {str(e)}")
+        return None
+
+def store_report(query: str, research_results: str) -> None:
+    """
+    Sla een afgerond rapport op zodat vergelijkbare vragen het kunnen hergebruiken.
+
+    Args:
+        query: De vraag waarvoor het rapport gemaakt is
+        research_results: De JSON string met title en sections
+    """
+    if not _cache_enabled() or not isinstance(research_results, str):
+        return
+
+    # Alleen volledige rapporten zijn geschikt om later te hergebruiken
+    try:
+        parsed = json.loads(research_results)
+    except json.JSONDecodeError:
+        logger.info("Research resultaten zijn geen geldige JSON, niet gecached")
+        return
+    if not isinstance(parsed, dict) or "sections" not in parsed:
+        return
+
+    try:
+        report_id = hashlib.sha256(f"{query}\n{research_results}".encode("utf-8")).hexdigest()[:16]
+        shared = get_shared_cache()
+        if shared is not None:
+            _store_shared(shared, report_id, query, research_results)
+            logger.info(f"Rapport opgeslagen in gedeelde research cache: {report_id}")
+            return
+
+        cache_dir = _cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        filename = f"{report_id}.json"
+        _write_atomic(os.path.join(cache_dir, filename), research_results)
+
+        with _lock:
+            entries = [e for e in _load_index() if e["id"] != report_id]
+            entries.append({
+                "id": report_id,
+                "query": query,
+                "created_at": time.time(),
+                "terms": extract_terms(query),
+                "file": filename
+            })
+            # Houd alleen de nieuwste rapporten bij
+            entries.sort(key=lambda e: e["created_at"])
+            max_entries = _max_entries()
+            for old in entries[:-max_entries]:
+                try:
+                    os.remove(os.path.join(cache_dir, old["file"]))
+                except OSError:
+                    pass
+            entries = entries[-max_entries:]
+            _write_atomic(_index_path(), json.dumps(entries))
+
+        logger.info(f"Rapport opgeslagen in research cache: {report_id}")
+    except Exception as e:
+        logger.error(f"Error bij opslaan in research cache: {str(e)}")
+
+def describe_reuse(cached: CachedReport) -> str:
+    """Maak een korte melding voor de gebruiker over een hergebruikt rapport."""
+    created = datetime.fromtimestamp(cached.created_at).strftime("%d-%m-%Y %H:%M")
+    return (
+        f"Eerder onderzoek hergebruikt van {created} voor de vraag "
+        f"'{cached.query}' (overeenkomst {cached.similarity:.0%})."
+    )
+
+def describe_offer(offer: Dict[str, Any]) -> str:
+    """Maak een korte melding over een aangeboden, vergelijkbaar rapport."""
+    created = datetime.fromtimestamp(offer["created_at"]).strftime("%d-%m-%Y %H:%M")
+    return (
+        f"Er is eerder onderzoek van {created} voor de vraag '{offer['query']}' "
+        f"(overeenkomst {offer['similarity']:.0%}); dit onderzoek is nieuw uitgevoerd."
+    )
@@ -0,0 +1,113 @@
+from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+import logging
+import os
+import sqlite3
+import time
+
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _inbox_path() -> str:
+    """Locatie van de inbox database; gelezen bij gebruik, zodat hij ook uit .env kan komen."""
+    return getenv("REVIEW_INBOX_PATH", os.path.join("output", "review_inbox.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    thread_id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    review_type TEXT NOT NULL,
+    content TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    comments TEXT,
+    created_at REAL NOT NULL,
+    decided_at REAL,
+    render_pdf INTEGER NOT NULL DEFAULT 1
+)
+"""
+
+@contextmanager
+def _connect():
+    """Open een korte verbinding; er blijft niets open terwijl een run wacht."""
+    path = _inbox_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute(SCHEMA)
+        # Inboxen van voor render_pdf krijgen de kolom erbij
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(reviews)")}
+        if "render_pdf" not in columns:
+            conn.execute("ALTER TABLE reviews ADD COLUMN render_pdf INTEGER NOT NULL DEFAULT 1")
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def park_review(
+    thread_id: str,
+    query: str,
+    content: str,
+    review_type: str = "research",
+    render_pdf: bool = True
+) -> None:
+    """
+    Zet een onderbroken run in de inbox.
+
+    De state zelf staat in de checkpointer onder thread_id; de inbox bewaart
+    alleen wat een reviewer nodig heeft om te beslissen, plus de run opties
+    (render_pdf) die de checkpointer niet bewaart.
+    """
+    with _connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO reviews (thread_id, query, review_type, content, status, created_at, render_pdf)
+            VALUES (?, ?, ?, ?, 'pending', ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                content = excluded.content,
+                status = 'pending',
+                comments = NULL,
+                decided_at = NULL,
+                render_pdf = excluded.render_pdf
+            """,
+            (thread_id, query, review_type, content, time.time(), int(render_pdf))
+        )
+    logger.info(f"Run {thread_id} wacht op review")
+
+def list_pending(limit: int = 100) -> List[Dict[str, Any]]:
+    """Geef de openstaande reviews, oudste eerst."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM reviews WHERE status = 'pending' ORDER BY created_at LIMIT ?",
+            (limit,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def get_review(thread_id: str) -> Optional[Dict[str, Any]]:
+    """Haal een enkele review op."""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM reviews WHERE thread_id = ?", (thread_id,)).fetchone()
+    return dict(row) if row else None
+
+def record_decision(thread_id: str, approved: bool, comments: str = "") -> bool:
+    """
+    Leg een beslissing vast.
+
+    Returns:
+        False als de review niet (meer) openstaat, zodat een run niet
+        twee keer hervat wordt
+    """
+    with _connect() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE reviews SET status = ?, comments = ?, decided_at = ?
+            WHERE thread_id = ? AND status = 'pending'
+            """,
+            ("approved" if approved else "rejected", comments, time.time(), thread_id)
+        )
+    return cursor.rowcount == 1
@@ -0,0 +1,113 @@
+from typing import Any, Dict, List
+from langchain_core.messages import HumanMessage
+import json
+import logging
+
+from agents.json_repair import repair_json, content_to_text
+from agents.tools.web_tools import search_web_structured, render_search_results
+from agents.accounting import BudgetExceededError, record_tool_call
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Woorden in reviewcommentaar die naar een sectie verwijzen
+SECTION_ALIASES = {
+    "Samenvatting": ["samenvatting", "overzicht", "summary", "inleiding"],
+    "Belangrijkste Resultaten": ["resultaten", "feiten", "cijfers", "data", "bevindingen"],
+    "Context en Details": ["context", "details", "achtergrond", "uitleg"],
+    "Bronnen": ["bronnen", "bron", "links", "url", "referenties"],
+}
+
+def map_comments_to_sections(comments: str, report: Dict[str, Any], llm=None) -> List[str]:
+    """
+    Bepaal op welke secties het reviewcommentaar betrekking heeft.
+
+    Eerst wordt gezocht naar sectienamen en synoniemen in het commentaar;
+    alleen als dat niets oplevert wordt het model gevraagd.
+    """
+    sections = list((report.get("sections") or {}).keys())
+    lowered = comments.lower()
+
+    targets = []
+    for section in sections:
+        aliases = [section.lower()] + SECTION_ALIASES.get(section, [])
+        if any(alias in lowered for alias in aliases):
+            targets.append(section)
+    if targets or llm is None:
+        return targets
+
+    message = HumanMessage(content=f"""
+    Een reviewer heeft dit commentaar gegeven op een onderzoeksrapport:
+    "{comments}"
+
+    Het rapport heeft deze secties: {json.dumps(sections, ensure_ascii=False)}
+
+    Op welke secties slaat het commentaar? Geef ALLEEN JSON terug:
+    {{"secties": ["sectie1"]}}
+    """)
+    try:
+        response = llm.invoke([message])
+        chosen = repair_json(content_to_text(response.content)).get("secties", [])
+        return [s for s in sections if s in chosen]
+    except BudgetExceededError:
+        raise
+    except Exception as e:
+        logger.error(f"Error bij bepalen van secties uit commentaar: {str(e)}")
+        return []
+
+def revise_sections(
+    llm,
+    report: Dict[str, Any],
+    targets: List[str],
+    comments: str,
+    query: str
+) -> Dict[str, Any]:
+    """
+    Onderzoek en herschrijf alleen de opgegeven secties.
+
+    Secties die niet in targets staan worden ongewijzigd overgenomen, in de
+    oorspronkelijke volgorde.
+
+    Returns:
+        Het samengevoegde rapport
+    """
+    search_query = f"{query} {comments}"[:300]
+    try:
+        record_tool_call("search_web")
+        results = render_search_results(search_web_structured(search_query, max_results=5))
+    except BudgetExceededError:
+        raise
+    except Exception as e:
+        logger.warning(f"Extra zoekopdracht voor revisie mislukt: {str(e)}")
+        results = "Geen extra zoekresultaten beschikbaar."
+
+    current = {name: report["sections"][name] for name in targets}
+    message = HumanMessage(content=f"""
+    Een reviewer heeft een onderzoeksrapport afgekeurd met dit commentaar:
+    "{comments}"
+
+    VRAAG: {query}
+
+    Herschrijf ALLEEN deze secties en verwerk het commentaar:
+    {json.dumps(current, ensure_ascii=False, indent=2)}
+
+    NIEUWE ZOEKRESULTATEN:
+    {results}
+
+    Geef ALLEEN een JSON object terug met precies deze keys: {json.dumps(targets, ensure_ascii=False)}
+    {"De sectie Bronnen is een lijst van bronnen met URLs." if "Bronnen" in targets else ""}
+    """)
+    response = llm.invoke([message])
+    revised = repair_json(content_to_text(response.content))
+
+    merged_sections = {}
+    for name, value in report["sections"].items():
+        if name in targets and revised.get(name):
+            merged_sections[name] = revised[name]
+        else:
+            merged_sections[name] = value
+
+    merged = dict(report)
+    merged["sections"] = merged_sections
+    return merged
@@ -0,0 +1,29 @@
+from typing import List
+from langchain_core.messages import BaseMessage, ToolMessage
+from langgraph.graph.message import add_messages
+
+from agents.env import getenv
+
+def max_messages() -> int:
+    """Maximum aantal berichten dat in de state bewaard blijft (STATE_MAX_MESSAGES)."""
+    return int(getenv("STATE_MAX_MESSAGES", "12"))
+
+def bounded_add_messages(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    add_messages reducer met een begrensd venster.
+
+    Het eerste bericht (de oorspronkelijke vraag) blijft altijd bewaard,
+    daarna alleen de laatste max_messages() - 1 berichten. Nodes geven daarom
+    alleen nieuwe berichten terug, nooit de hele geschiedenis.
+
+    Het venster begint nooit met een ToolMessage: een tool resultaat zonder de
+    bijbehorende tool call wordt door de API geweigerd.
+    """
+    merged = add_messages(left, right)
+    limit = max_messages()
+    if len(merged) <= limit:
+        return merged
+    window = merged[-(limit - 1):]
+    while window and isinstance(window[0], ToolMessage):
+        window = window[1:]
+    return [merged[0]] + window
@@ -0,0 +1,162 @@
+"""
+Stapbudget en lusdetectie voor de workflows.
+
+De conditionele routing kan een run door dure nodes laten rondgaan tot de
+recursion limit van LangGraph. Een StepGuard telt per run hoe vaak elke node
+bezocht wordt (in de state, zodat het ook over een hervatte review heen
+telt), stopt bij een te hoog aantal stappen of bezoeken per node, en herkent
+een lus: een node die opnieuw bezocht wordt met precies dezelfde state.
+
+Een gestopte run krijgt een terminal_reason (en error_message) en de router
+stuurt hem naar END. Bezoeken die de state niet veranderen tellen als
+verspild; die staan in agents.metrics onder workflow.wasted_visits.
+"""
+from typing import Any, Callable, Dict, List, Optional, Union
+import hashlib
+import json
+import logging
+
+from langgraph.graph import END
+
+from agents import metrics
+from agents.env import getenv
+from agents.profiling import node_runner
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _max_steps() -> int:
+    """Maximaal aantal node bezoeken per run."""
+    return int(getenv("WORKFLOW_MAX_STEPS", "40"))
+
+def _max_node_visits() -> int:
+    """Standaard maximum aantal bezoeken per node."""
+    return int(getenv("WORKFLOW_MAX_NODE_VISITS", "10"))
+
+def _max_repeats() -> int:
+    """Aantal keer dat een node met dezelfde state bezocht mag worden."""
+    return int(getenv("WORKFLOW_MAX_REPEATS", "1"))
+
+# Aantal recente stappen dat voor lusdetectie bewaard wordt
+TRACE_SIZE = 50
+
+# Velden die niet meetellen voor de vergelijking van states
+IGNORED_FIELDS = {"messages", "research_messages", "node_visits", "step_trace", "terminal_reason"}
+
+def state_fingerprint(state: Dict[str, Any]) -> str:
+    """Korte hash van de state, zonder berichten en de velden van de guard zelf."""
+    relevant = {k: v for k, v in state.items() if k not in IGNORED_FIELDS}
+    payload = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+class StepGuard:
+    """
+    Bewaakt de stappen van een workflow.
+
+    Args:
+        name: Naam van de workflow, voor logs en metrics
+        max_steps: Maximaal aantal node bezoeken per run, standaard WORKFLOW_MAX_STEPS
+        max_visits: Maximum per node, of een functie die dat bij gebruik geeft; nodes
+            die er niet in staan krijgen default_max_visits
+        default_max_visits: Maximum voor overige nodes, standaard WORKFLOW_MAX_NODE_VISITS
+        max_repeats: Aantal keer dat een node met dezelfde state bezocht mag worden,
+            standaard WORKFLOW_MAX_REPEATS
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_steps: Optional[int] = None,
+        max_visits: Union[Dict[str, int], Callable[[], Dict[str, int]], None] = None,
+        default_max_visits: Optional[int] = None,
+        max_repeats: Optional[int] = None
+    ):
+        # De guards worden bij het importeren gemaakt; de settings pas bij gebruik gelezen
+        self.name = name
+        self._max_steps = max_steps
+        self._max_visits = max_visits or {}
+        self._default_max_visits = default_max_visits
+        self._max_repeats = max_repeats
+
+    @property
+    def max_steps(self) -> int:
+        return _max_steps() if self._max_steps is None else self._max_steps
+
+    @property
+    def max_visits(self) -> Dict[str, int]:
+        return self._max_visits() if callable(self._max_visits) else self._max_visits
+
+    @property
+    def default_max_visits(self) -> int:
+        return _max_node_visits() if self._default_max_visits is None else self._default_max_visits
+
+    @property
+    def max_repeats(self) -> int:
+        return _max_repeats() if self._max_repeats is None else self._max_repeats
+
+    @property
+    def recursion_limit(self) -> int:
+        """Recursion limit voor LangGraph, ruim boven het eigen stapbudget."""
+        return self.max_steps + 10
+
+    def _stop_reason(self, node: str, visits: Dict[str, int], trace: List[str], fingerprint: str) -> Optional[str]:
+        steps = sum(visits.values())
+        max_steps = self.max_steps
+        if steps >= max_steps:
+            return f"Stapbudget op: {steps} stappen (maximaal {max_steps})"
+        limit = self.max_visits.get(node, self.default_max_visits)
+        if visits.get(node, 0) >= limit:
+            return f"Node {node} al {visits[node]} keer bezocht (maximaal {limit})"
+        repeats = trace.count(f"{node}:{fingerprint}")
+        if repeats > self.max_repeats:
+            return f"Lus gedetecteerd: {node} opnieuw bezocht zonder voortgang"
+        return None
+
+    def node(self, name: str, func: Any) -> Callable[..., Dict[str, Any]]:
+        """Wikkel een node (functie of Runnable, zoals een tool) in de guard."""
+        run = node_runner(func)
+        guard = self
+
+        def guarded(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+            visits = dict(state.get("node_visits") or {})
+            trace = list(state.get("step_trace") or [])
+            before = state_fingerprint(state)
+            trace.append(f"{name}:{before}")
+
+            reason = guard._stop_reason(name, visits, trace, before)
+            if reason:
+                logger.warning(f"Workflow {guard.name} gestopt bij {name}: {reason}")
+                metrics.increment(f"workflow.{guard.name}.stopped")
+                metrics.increment("workflow.wasted_visits")
+                metrics.increment(f"workflow.wasted_visits.{name}")
+                return {
+                    "terminal_reason": reason,
+                    "error_message": state.get("error_message") or reason,
+                }
+
+            visits[name] = visits.get(name, 0) + 1
+            metrics.increment(f"workflow.{guard.name}.steps")
+            result = run(state, config)
+
+            if isinstance(result, dict):
+                if state_fingerprint({**state, **result}) == before:
+                    # De node heeft niets veranderd; dit bezoek was verspild
+                    metrics.increment("workflow.wasted_visits")
+                    metrics.increment(f"workflow.wasted_visits.{name}")
+                return {**result, "node_visits": visits, "step_trace": trace[-TRACE_SIZE:]}
+            return result
+
+        guarded.__name__ = name
+        return guarded
+
+    def route(self, router: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+        """Wikkel een router: een gestopte run gaat altijd naar END."""
+        def guarded_router(state: Dict[str, Any]) -> Any:
+            if state.get("terminal_reason"):
+                return END
+            return router(state)
+
+        guarded_router.__name__ = router.__name__
+        return guarded_router
@@ -0,0 +1,177 @@
+"""
+Tool calls van een model uitvoeren en de resultaten teruggeven.
+
+Een model met gebonden tools geeft alleen aan welke tools het wil aanroepen;
+hier worden die aanroepen echt uitgevoerd. Alle tool calls uit een enkele
+model beurt lopen parallel, elk met een eigen timeout, en komen terug als
+ToolMessages zodat het model in de volgende beurt met de echte resultaten
+verder kan. Het aantal rondes is begrensd.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Sequence
+import contextvars
+import logging
+import threading
+import time
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from agents.accounting import BudgetExceededError
+from agents import deadline
+from agents.deadline import DeadlineExceededError
+from agents.profiling import profile_section
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _tool_call_timeout() -> float:
+    """Maximale duur van een enkele tool call in seconden."""
+    return float(getenv("TOOL_CALL_TIMEOUT", "30"))
+
+def max_tool_iterations() -> int:
+    """Maximaal aantal rondes van model beurt plus tool uitvoering."""
+    return int(getenv("MAX_TOOL_ITERATIONS", "4"))
+
+def _tool_call_workers() -> int:
+    """Aantal tool calls dat tegelijk kan lopen, over alle runs heen."""
+    return int(getenv("TOOL_CALL_WORKERS", "8"))
+
+# Extra instructie als het maximum aantal rondes bereikt is
+FINAL_ANSWER_PROMPT = (
+    "Het maximum aantal tool aanroepen is bereikt. Roep geen tools meer aan "
+    "en geef nu je eindantwoord op basis van de resultaten hierboven."
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_tool_call_workers(), thread_name_prefix="tool-call")
+    return _executor
+
+def _tool_message(call: Dict[str, Any], content: str) -> ToolMessage:
+    return ToolMessage(content=content, tool_call_id=call["id"], name=call["name"])
+
+def _invoke_tool(tool, call: Dict[str, Any], started: Dict[str, Any]) -> str:
+    # Starttijd van de call zelf; wachten in de wachtrij van de pool telt niet mee
+    started["at"] = time.monotonic()
+    started["event"].set()
+    with profile_section(f"tool.{call['name']}"):
+        result = tool.invoke(call["args"])
+    return result if isinstance(result, str) else str(result)
+
+def execute_tool_calls(
+    message: AIMessage,
+    tools: Sequence[Any],
+    timeout: Optional[float] = None
+) -> List[ToolMessage]:
+    """
+    Voer alle tool calls uit een model beurt parallel uit.
+
+    Args:
+        message: Het AIMessage met tool_calls
+        tools: De tools die aan het model gebonden zijn
+        timeout: Maximale duur per tool call, standaard TOOL_CALL_TIMEOUT of de
+            resterende tijd van de run als die korter is
+
+    Returns:
+        Een ToolMessage per tool call, in dezelfde volgorde; fouten en timeouts
+        komen als tekst terug zodat het model er rekening mee kan houden
+    """
+    timeout = deadline.remaining(_tool_call_timeout() if timeout is None else timeout)
+    tools_by_name = {tool.name: tool for tool in tools}
+    calls = list(getattr(message, "tool_calls", None) or [])
+
+    futures = {}
+    for call in calls:
+        tool = tools_by_name.get(call["name"])
+        if tool is None:
+            continue
+        # Elke call krijgt een eigen kopie van de context, zodat callbacks
+        # (verbruik, budget) en de run config ook in de thread gelden
+        context = contextvars.copy_context()
+        started = {"event": threading.Event(), "at": None}
+        futures[call["id"]] = (_get_executor().submit(context.run, _invoke_tool, tool, call, started), started)
+
+    results = []
+    for call in calls:
+        if call["id"] not in futures:
+            logger.warning(f"Onbekende tool aangeroepen: {call['name']}")
+            results.append(_tool_message(call, f"Fout: onbekende tool '{call['name']}'"))
+            continue
+
+        future, started = futures[call["id"]]
+        try:
+            # Wacht tot de call echt loopt, hoogstens tot de deadline van de run
+            if not started["event"].wait(deadline.remaining()):
+                raise FutureTimeoutError()
+            remaining = max(0.0, started["at"] + timeout - time.monotonic())
+            results.append(_tool_message(call, future.result(timeout=remaining)))
+        except DeadlineExceededError as e:
+            # Deadline binnen de tool; de resultaten tot nu toe gaan mee
+            e.messages = results + e.messages
+            raise
+        except BudgetExceededError:
+            # Niet aan het model teruggeven; de run moet stoppen
+            raise
+        except FutureTimeoutError:
+            future.cancel()
+            # Na de deadline geen resultaten meer verzamelen; wat er al is gaat mee
+            try:
+                deadline.check(f"tool {call['name']}")
+            except DeadlineExceededError as e:
+                e.messages = results + e.messages
+                raise
+            logger.warning(f"Tool {call['name']} duurde langer dan {timeout:g}s")
+            results.append(_tool_message(call, f"Fout: timeout na {timeout:g} seconden"))
+        except Exception as e:
+            logger.warning(f"Tool {call['name']} faalde: {str(e)}")
+            results.append(_tool_message(call, f"Fout: {str(e)}"))
+
+    return results
+
+def run_tool_loop(
+    model,
+    messages: List[BaseMessage],
+    tools: Sequence[Any],
+    max_iterations: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> List[BaseMessage]:
+    """
+    Laat een model met tools werken tot het een eindantwoord geeft.
+
+    Na max_iterations rondes met tool calls krijgt het model de opdracht om
+    zonder tools te antwoorden.
+
+    Returns:
+        De nieuwe berichten (AIMessages en ToolMessages); het laatste bericht
+        is het eindantwoord van het model
+    """
+    max_iterations = max_tool_iterations() if max_iterations is None else max_iterations
+    history = list(messages)
+    new_messages: List[BaseMessage] = []
+
+    try:
+        for iteration in range(max_iterations + 1):
+            if iteration == max_iterations:
+                history.append(HumanMessage(content=FINAL_ANSWER_PROMPT))
+            response = model.invoke(history)
+            history.append(response)
+            new_messages.append(response)
+            if not getattr(response, "tool_calls", None) or iteration == max_iterations:
+                break
+
+            logger.info(f"Ronde {iteration + 1}: {len(response.tool_calls)} tool call(s) uitvoeren")
+            tool_messages = execute_tool_calls(response, tools, timeout)
+            history.extend(tool_messages)
+            new_messages.extend(tool_messages)
+    except DeadlineExceededError as e:
+        # De resultaten tot nu toe gaan mee voor een gedeeltelijk rapport
+        e.messages = new_messages + e.messages
+        raise
+
+    return new_messages
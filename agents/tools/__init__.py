@@ -1,4 +1,20 @@
-from .web_tools import search_web, fetch_webpage_content
-from .pdf_tools import generate_pdf
+__all__ = [
+    'search_web', 'fetch_webpage_content', 'generate_pdf',
+    'search_web_structured', 'render_search_results', 'SearchResult'
+]
 
-__all__ = ['search_web', 'fetch_webpage_content', 'generate_pdf']
+# Tools worden pas geimporteerd als ze gebruikt worden
+_LAZY_IMPORTS = {
+    'search_web': '.web_tools',
+    'fetch_webpage_content': '.web_tools',
+    'search_web_structured': '.web_tools',
+    'render_search_results': '.web_tools',
+    'SearchResult': '.search_backends',
+    'generate_pdf': '.pdf_tools',
+}
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        from importlib import import_module
+        return getattr(import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,259 @@
+"""
+Circuit breakers per host en een negatieve cache voor het ophalen van pagina's.
+
+Een site die down is of ons blokkeert kost anders bij elke run de volledige
+fetch timeout. Per host houdt een CircuitBreaker de recente uitkomsten bij:
+boven een foutpercentage gaat hij open en worden fetches naar die host direct
+geweigerd. Na een wachttijd laat hij (half-open) een enkele proef fetch door;
+slaagt die, dan gaat hij weer dicht.
+
+Daarnaast onthoudt een negatieve cache mislukte URLs en onbereikbare hosts
+voor korte tijd, zodat een bekende slechte bron meteen een foutmelding geeft.
+De toestand van de breakers staat in agents.metrics onder fetch.breaker.<host>.
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+import logging
+import threading
+import time
+
+from agents import metrics
+from agents.env import getenv
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_WINDOW = 10
+NEGATIVE_CACHE_SIZE = 1024
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _breaker_failure_rate() -> float:
+    """Foutpercentage (over de laatste BREAKER_WINDOW fetches) waarboven een host open gaat."""
+    return float(getenv("FETCH_BREAKER_FAILURE_RATE", "0.5"))
+
+def _breaker_min_calls() -> int:
+    return int(getenv("FETCH_BREAKER_MIN_CALLS", "3"))
+
+def _breaker_open_seconds() -> float:
+    """Seconden dat een open breaker fetches weigert voordat hij een proef doorlaat."""
+    return float(getenv("FETCH_BREAKER_OPEN_SECONDS", "60"))
+
+def _negative_ttl() -> float:
+    """Seconden dat een mislukte URL onthouden wordt."""
+    return float(getenv("FETCH_NEGATIVE_TTL", "300"))
+
+def _negative_host_ttl() -> float:
+    """Seconden dat een host met een open breaker onthouden wordt."""
+    return float(getenv("FETCH_NEGATIVE_HOST_TTL", "60"))
+
+# HTTP statussen die zeggen dat de hele host (tijdelijk) niet wil of kan
+HOST_FAILURE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+    """Circuit breaker voor een enkele host: closed, open of half-open."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        window: int = BREAKER_WINDOW,
+        open_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.failure_rate = _breaker_failure_rate() if failure_rate is None else failure_rate
+        self.min_calls = _breaker_min_calls() if min_calls is None else min_calls
+        self.open_seconds = _breaker_open_seconds() if open_seconds is None else open_seconds
+        self.state = CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.info(f"Circuit breaker {self.name}: {self.state} -> {state}")
+            self.state = state
+            metrics.set_gauge(f"fetch.breaker.{self.name}", state)
+
+    def allow(self) -> bool:
+        """Of er nu een fetch naar deze host mag."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+                self._probe_started = None
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN:
+                # Een proef tegelijk; een proef zonder uitkomst telt na open_seconds niet meer
+                if self._probe_started is None or now - self._probe_started >= self.open_seconds:
+                    self._probe_started = now
+                    return True
+            return False
+
+    def record(self, success: bool) -> bool:
+        """Leg de uitkomst van een fetch vast; True als de breaker daardoor open gaat."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_started = None
+                if success:
+                    self.outcomes.clear()
+                    self._set_state(CLOSED)
+                    return False
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+                return True
+
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if (
+                self.state == CLOSED
+                and len(self.outcomes) >= self.min_calls
+                and failures / len(self.outcomes) >= self.failure_rate
+            ):
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+                return True
+            return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "failures": self.outcomes.count(False),
+            }
+
+class NegativeCache:
+    """Onthoudt mislukte sleutels (URLs of hosts) met hun foutmelding, voor korte tijd."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_size: int = NEGATIVE_CACHE_SIZE,
+        ttl_setting: Callable[[], float] = _negative_ttl
+    ):
+        # Zonder ttl geldt de setting, gelezen bij gebruik
+        self._ttl = ttl
+        self._ttl_setting = ttl_setting
+        self.max_size = max_size
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, error = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            return error
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl_setting() if self._ttl is None else self._ttl
+
+    def add(self, key: str, error: str) -> None:
+        ttl = self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # Verlopen entries eerst, anders de oudste
+                now = time.monotonic()
+                expired = [k for k, (expires, _) in self._entries.items() if expires <= now]
+                for old_key in expired or [next(iter(self._entries))]:
+                    del self._entries[old_key]
+            self._entries[key] = (time.monotonic() + ttl, error)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_failed_urls = NegativeCache()
+_failed_hosts = NegativeCache(ttl_setting=_negative_host_ttl)
+
+def _host(url: str) -> str:
+    try:
+        return (urlparse(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """De gedeelde circuit breaker voor een host."""
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+def check(url: str) -> Optional[str]:
+    """
+    Controleer of een fetch zin heeft, voordat er een request gedaan wordt.
+
+    Returns:
+        Een foutmelding als de URL of host bekend slecht is of de breaker open
+        staat, anders None
+    """
+    error = _failed_urls.get(url)
+    host = _host(url)
+    if error is None and host:
+        error = _failed_hosts.get(host)
+    if error is not None:
+        metrics.increment("fetch.negative_cache_hits")
+        return f"Eerder mislukt: {error}"
+
+    if host and not get_breaker(host).allow():
+        metrics.increment("fetch.short_circuits")
+        return f"Circuit breaker open voor {host}"
+    return None
+
+def record(url: str, page: Dict[str, Any]) -> None:
+    """
+    Leg de uitkomst van een fetch vast (het resultaat van _http_get).
+
+    Een fout op een enkele pagina (zoals 404) komt alleen voor die URL in de
+    negatieve cache; timeouts, verbindingsfouten en statussen uit
+    HOST_FAILURE_STATUSES tellen als fout van de host. De host zelf wordt pas
+    overgeslagen als zijn breaker open gaat, niet na een enkele fout.
+    """
+    host = _host(url)
+    error = page.get("error")
+    host_failure = bool(error) and (page.get("status") is None or page.get("status") in HOST_FAILURE_STATUSES)
+
+    if error:
+        _failed_urls.add(url, error)
+    if host and get_breaker(host).record(not host_failure):
+        # Te veel fouten: alle URLs van deze host overslaan
+        _failed_hosts.add(host, error)
+    _update_gauges()
+
+def _update_gauges() -> None:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    metrics.set_gauge("fetch.breakers_open", sum(1 for b in breakers if b.state != CLOSED))
+
+def breaker_report() -> Dict[str, Dict[str, Any]]:
+    """Huidige toestand van alle breakers per host."""
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {host: breaker.as_dict() for host, breaker in breakers}
+
+def reset() -> None:
+    """Vergeet alle breakers en mislukte URLs en hosts."""
+    with _breakers_lock:
+        _breakers.clear()
+    _failed_urls.clear()
+    _failed_hosts.clear()
+    _update_gauges()
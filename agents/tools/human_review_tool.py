@@ -2,14 +2,19 @@ from typing import Dict, Any, Optional
 from langchain_core.tools import tool
 from langgraph.types import Command, interrupt
 
-@tool
-def human_review(content: str, review_type: str) -> Dict[str, Any]:
+def request_review(content: str, review_type: str) -> Dict[str, Any]:
     """
-    Vraag een mens om review van content.
-    
+    Onderbreek de run en wacht op een menselijke beslissing.
+
+    Moet binnen een graph node aangeroepen worden; de run wordt hervat met
+    Command(resume={"approved": "ja"/"nee", "comments": "..."}).
+
     Args:
         content: De content die gereviewd moet worden
         review_type: Type review ('research' of 'pdf')
+
+    Returns:
+        Dictionary met human_approved, review_comments en review_status
     """
     # Toon informatie aan de reviewer
     human_response = interrupt({
@@ -18,16 +23,25 @@ def human_review(content: str, review_type: str) -> Dict[str, Any]:
         "message": "Wilt u deze content reviewen? (ja/nee)",
         "instructions": "Geef eventueel commentaar mee in het 'comments' veld"
     })
-    
+
     # Verwerk de response
     is_approved = human_response.get("approved", "").lower().startswith("j")
     comments = human_response.get("comments", "")
-    
-    # Update de state via een Command
-    state_update = {
+
+    return {
         "human_approved": is_approved,
         "review_comments": comments,
         "review_status": "approved" if is_approved else "rejected"
     }
-    
-    return Command(update=state_update)
+
+@tool
+def human_review(content: str, review_type: str) -> Dict[str, Any]:
+    """
+    Vraag een mens om review van content.
+
+    Args:
+        content: De content die gereviewd moet worden
+        review_type: Type review ('research' of 'pdf')
+    """
+    # Update de state via een Command
+    return Command(update=request_review(content, review_type))
@@ -0,0 +1,114 @@
+"""
+Omzetten van rapport blokken naar ReportLab flowables.
+
+LLM output is vaak lange markdown tekst. Een enkele Paragraph per sectie is
+traag bij het afbreken van regels en faalt op losse `<` of `&` tekens. De
+blokken uit agents.report_model worden hier veilig ge-escaped en in alinea's
+van begrensde lengte omgezet.
+"""
+from typing import Any, Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+from agents.report_model import Block, Source, render_inline, split_long_text
+
+def inline_markup(text: str) -> str:
+    """Escape tekst voor ReportLab en zet inline markdown om naar Paragraph markup."""
+    return render_inline(
+        text,
+        escape=escape,
+        code='<font face="Courier">{}</font>',
+        bold="<b>{}</b>",
+        italic="<i>{}</i>",
+        link='<link href="{url}" color="blue">{text}</link>'
+    )
+
+def _derived_styles(body_style):
+    from reportlab.lib.styles import ParagraphStyle
+
+    subheading = ParagraphStyle(
+        f"{body_style.name}Subheading",
+        parent=body_style,
+        fontName="Helvetica-Bold",
+        fontSize=body_style.fontSize + 1,
+        leading=body_style.leading + 2,
+        spaceBefore=8,
+        spaceAfter=4
+    )
+    cell = ParagraphStyle(
+        f"{body_style.name}Cell",
+        parent=body_style,
+        fontSize=max(body_style.fontSize - 2, 7),
+        leading=max(body_style.leading - 2, 9),
+        spaceBefore=0,
+        spaceAfter=0
+    )
+    item = ParagraphStyle(
+        f"{body_style.name}Item",
+        parent=body_style,
+        spaceBefore=0,
+        spaceAfter=2
+    )
+    return subheading, cell, item
+
+def _table_flowable(rows: List[List[str]], cell_style, available_width: float):
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    columns = max(len(row) for row in rows)
+    data = [
+        [Paragraph(inline_markup(cell), cell_style) for cell in row] + [""] * (columns - len(row))
+        for row in rows
+    ]
+    table = Table(data, colWidths=[available_width / columns] * columns, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#bdc3c7")),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#ecf0f1")),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("TOPPADDING", (0, 0), (-1, -1), 3),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
+    ]))
+    return table
+
+def block_flowables(blocks: Iterable[Block], body_style, available_width: float) -> Iterator[Any]:
+    """
+    Zet de blokken van een sectie om naar flowables.
+
+    Args:
+        blocks: Blokken uit ReportSection.blocks
+        body_style: ParagraphStyle voor gewone tekst; andere stijlen worden ervan afgeleid
+        available_width: Beschikbare breedte in punten, voor tabellen
+    """
+    from reportlab.platypus import ListFlowable, ListItem, Paragraph, Spacer
+
+    subheading_style, cell_style, item_style = _derived_styles(body_style)
+
+    for kind, payload in blocks:
+        if kind == "heading":
+            _, heading_text = payload
+            yield Paragraph(inline_markup(heading_text), subheading_style)
+        elif kind == "paragraph":
+            for chunk in split_long_text(payload):
+                yield Paragraph(inline_markup(chunk), body_style)
+        elif kind == "list":
+            ordered, items = payload
+            yield ListFlowable(
+                [ListItem(Paragraph(inline_markup(item), item_style)) for item in items],
+                bulletType="1" if ordered else "bullet",
+                leftIndent=18
+            )
+            yield Spacer(1, 6)
+        elif kind == "table":
+            yield _table_flowable(payload, cell_style, available_width)
+            yield Spacer(1, 8)
+
+def source_flowables(sources: List[Source], source_style) -> Iterator[Any]:
+    """Zet de bronnen om naar een flowable per bron, met een link als er een url is."""
+    from reportlab.platypus import Paragraph
+
+    for source in sources:
+        text = inline_markup(source.titel)
+        if source.url:
+            text = f'<link href="{escape(source.url, {chr(34): "&quot;"})}" color="blue">{text}</link>'
+        if source.relevantie:
+            text += f" - {inline_markup(source.relevantie)}"
+        yield Paragraph(f"• {text}", source_style)
@@ -1,16 +1,20 @@
 from langchain_core.tools import tool
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import json
 import logging
 import os
 from datetime import datetime
 import traceback
+import io
+import mmap
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Union
+
+from agents.profiling import profile_section
+from agents.report_model import ReportDocument, build_document
+from agents.tools.pdf_sections import block_flowables, inline_markup, source_flowables
 
 # Configureer logging met meer details
 logging.basicConfig(
@@ -19,44 +23,65 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Maak output directory als die niet bestaat
+# Output directory, aangemaakt bij het eerste rapport
 OUTPUT_DIR = "output"
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-    logger.info(f"Output directory aangemaakt: {OUTPUT_DIR}")
 
-@tool
-def _generate_pdf(content: str) -> str:
-    """Maak een PDF met mooie opmaak. Verwacht een JSON string met title en sections."""
-    try:
-        logger.info("Start PDF generatie")
-        logger.info(f"Ontvangen content type: {type(content)}")
-        logger.info(f"Ontvangen content: {content}")
-        
+def ensure_output_dir() -> None:
+    """Maak de output directory als die niet bestaat."""
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        logger.info(f"Output directory aangemaakt: {OUTPUT_DIR}")
+
+def render_pdf_bytes(content: str) -> bytes:
+    """
+    Render een PDF volledig in het geheugen.
+    
+    Args:
+        content: JSON string met title en sections
+    
+    Returns:
+        De PDF als bytes
+    """
+    logger.info(f"Start PDF generatie, ontvangen content: {len(content)} karakters")
+    
+    with profile_section("pdf", allocations=True):
         # Parse JSON
         try:
-            data = json.loads(content)
-            logger.info(f"JSON succesvol geparsed: {data}")
+            document = build_document(content)
+            logger.info("JSON succesvol geparsed")
         except json.JSONDecodeError as e:
             logger.error(f"JSON parse error: {str(e)}")
-            logger.error(f"Problematische content: {content}")
-            raise
+            raise ValueError(f"Error bij genereren van PDF: {str(e)}")
         
-        title = data.get("title", "Onderzoeksrapport")
-        sections = data.get("sections", {})
+        return render_document_pdf(document)
+
+def render_document_pdf(document: ReportDocument) -> bytes:
+    """
+    De PDF emitter van het report model: render een ReportDocument in het geheugen.
+    
+    Returns:
+        De PDF als bytes
+    """
+    # ReportLab pas laden als er echt een PDF gemaakt wordt
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    
+    try:
+        title = document.title
         
         logger.info(f"Titel: {title}")
-        logger.info(f"Aantal secties: {len(sections)}")
-        logger.info(f"Sectie namen: {list(sections.keys())}")
+        logger.info(f"Aantal secties: {len(document.sections)}")
+        logger.info(f"Sectie namen: {[section.title for section in document.sections]}")
         
-        # Maak unieke bestandsnaam met timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = os.path.join(OUTPUT_DIR, f"rapport_{timestamp}.pdf")
-        logger.info(f"Output pad: {output_path}")
+        # Render naar een buffer in plaats van naar disk
+        buffer = io.BytesIO()
         
         # Maak het PDF document
         doc = SimpleDocTemplate(
-            output_path,
+            buffer,
             pagesize=A4,
             rightMargin=2*cm,
             leftMargin=2*cm,
@@ -112,35 +137,22 @@ def _generate_pdf(content: str) -> str:
         try:
             # Titel
             logger.info(f"Toevoegen titel: {title}")
-            elements.append(Paragraph(title, title_style))
+            elements.append(Paragraph(inline_markup(title), title_style))
             elements.append(Spacer(1, 30))
             
-            # Content secties
-            for section_title, section_content in sections.items():
-                logger.info(f"Verwerken sectie: {section_title}")
-                logger.info(f"Sectie content type: {type(section_content)}")
+            # Content secties; lange tekst en markdown worden in kleine flowables opgesplitst
+            for section in document.sections:
+                logger.info(f"Verwerken sectie: {section.title} ({len(section.blocks)} blokken)")
                 
                 # Sectie titel
-                elements.append(Paragraph(section_title, heading_style))
+                elements.append(Paragraph(inline_markup(section.title), heading_style))
                 elements.append(Spacer(1, 6))
                 
                 # Speciale behandeling voor bronnen sectie
-                if section_title == "Bronnen":
-                    if isinstance(section_content, str):
-                        # Split bronnen op newlines als het een string is
-                        sources = section_content.split('\n')
-                        for source in sources:
-                            if source.strip():
-                                elements.append(Paragraph(f"• {source.strip()}", source_style))
-                    elif isinstance(section_content, list):
-                        # Als het een lijst is, voeg elke bron toe
-                        for source in section_content:
-                            elements.append(Paragraph(f"• {source}", source_style))
+                if section.sources is not None:
+                    elements.extend(source_flowables(section.sources, source_style))
                 else:
-                    # Normale sectie content
-                    if not isinstance(section_content, str):
-                        section_content = str(section_content)
-                    elements.append(Paragraph(section_content, body_style))
+                    elements.extend(block_flowables(section.blocks, body_style, doc.width))
                 
                 elements.append(Spacer(1, 12))
             
@@ -171,12 +183,110 @@ def _generate_pdf(content: str) -> str:
             logger.error(traceback.format_exc())
             raise
         
-        return output_path
+        return buffer.getvalue()
         
     except Exception as e:
         error_msg = f"Error bij genereren van PDF: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
         raise ValueError(error_msg)
 
+def new_output_path() -> str:
+    """
+    Maak een uniek pad voor een nieuw rapport in OUTPUT_DIR.
+    
+    Parallelle runs (bijvoorbeeld in een batch) kunnen in dezelfde seconde
+    klaar zijn; het willekeurige achtervoegsel voorkomt dat ze elkaars PDF
+    overschrijven.
+    """
+    ensure_output_dir()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(OUTPUT_DIR, f"rapport_{timestamp}_{uuid.uuid4().hex[:8]}.pdf")
+
+# Recent gerenderde PDF's blijven in het geheugen, zodat de frontend ze direct
+# kan serveren terwijl ze op de achtergrond naar disk geschreven worden
+MAX_IN_MEMORY_PDFS = 16
+
+_artifacts: "OrderedDict[str, bytes]" = OrderedDict()
+_pending_writes: Dict[str, Future] = {}
+_artifacts_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-writer")
+
+def _write_file(path: str, data: bytes) -> str:
+    """Schrijf atomair, zodat lezers nooit een half bestand zien."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with _artifacts_lock:
+        _pending_writes.pop(path, None)
+    logger.info(f"PDF weggeschreven: {path}")
+    return path
+
+def store_pdf(data: bytes, output_path: Optional[str] = None) -> str:
+    """
+    Registreer gerenderde PDF bytes en schrijf ze asynchroon naar disk.
+    
+    Returns:
+        Het pad waaronder de PDF beschikbaar is (direct via get_pdf_bytes)
+    """
+    if output_path is None:
+        output_path = new_output_path()
+    with _artifacts_lock:
+        _artifacts[output_path] = data
+        _artifacts.move_to_end(output_path)
+        while len(_artifacts) > MAX_IN_MEMORY_PDFS:
+            oldest = next(iter(_artifacts))
+            # Alleen vergeten als hij al op disk staat
+            if oldest in _pending_writes:
+                break
+            _artifacts.popitem(last=False)
+        _pending_writes[output_path] = _writer.submit(_write_file, output_path, data)
+    return output_path
+
+def get_pdf_bytes(path: str) -> Optional[Union[bytes, memoryview]]:
+    """
+    Geef de inhoud van een PDF, zonder disk als hij nog in het geheugen staat.
+    
+    Anders komt er een memoryview op een mmap van het bestand terug: er wordt
+    niets gekopieerd, de pagina's worden pas gelezen als ze gebruikt worden.
+    De map blijft open zolang de view bestaat. Wie echte bytes nodig heeft
+    (bijvoorbeeld om te cachen) roept bytes() aan. None als het niet bestaat.
+    """
+    with _artifacts_lock:
+        data = _artifacts.get(path)
+    if data is not None:
+        return data
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        # De mmap houdt zijn eigen verwijzing naar het bestand; f mag dicht
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def flush_pdf_writes(timeout: Optional[float] = None, path: Optional[str] = None) -> None:
+    """
+    Wacht tot de PDF's op disk staan, bijvoorbeeld voordat een batch record ernaar verwijst.
+    
+    Args:
+        timeout: Maximale wachttijd per PDF in seconden
+        path: Alleen op deze PDF wachten; standaard op alle openstaande writes
+    """
+    with _artifacts_lock:
+        if path is None:
+            pending = list(_pending_writes.values())
+        else:
+            pending = [_pending_writes[path]] if path in _pending_writes else []
+    for future in pending:
+        future.result(timeout=timeout)
+
+@tool
+def _generate_pdf(content: str) -> str:
+    """Maak een PDF met mooie opmaak. Verwacht een JSON string met title en sections."""
+    return store_pdf(render_pdf_bytes(content))
+
 # Exporteer het tool object
 generate_pdf = _generate_pdf
@@ -0,0 +1,370 @@
+from typing import Any, Callable, Dict, List, Optional, Union
+from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from agents.env import load_env
+from agents.rate_limits import get_rate_limiter
+from agents.cassette import arecord_call, record_call
+from agents import deadline as run_deadline
+
+# Configureer logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SearchResult:
+    """Een enkel zoekresultaat, los van hoe het later aan een LLM getoond wordt."""
+    __slots__ = ("title", "url", "snippet", "source")
+
+    title: str
+    url: str
+    snippet: str
+    source: str
+
+    def render(self, max_snippet: int = 300) -> str:
+        """Compacte tekstweergave voor gebruik in een prompt."""
+        snippet = self.snippet
+        if len(snippet) > max_snippet:
+            snippet = snippet[:max_snippet].rsplit(" ", 1)[0] + "..."
+        return f"- {self.title} ({self.url})\n  {snippet}"
+
+class SearchBackend:
+    """Basis voor een zoekmachine die SearchResult objecten teruggeeft."""
+    name = "base"
+
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str, max_results: int) -> List[SearchResult]:
+        """Async zoeken; standaard de sync implementatie in een worker thread."""
+        return await asyncio.to_thread(self.search, query, max_results)
+
+class DDGSBackend(SearchBackend):
+    """Zoeken via DuckDuckGo."""
+    name = "duckduckgo"
+
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        def raw_search():
+            from duckduckgo_search import DDGS
+
+            with DDGS() as ddgs:
+                return list(ddgs.text(query, max_results=max_results))
+
+        request = {"backend": self.name, "query": query, "max_results": max_results}
+        return self._convert(record_call("search", request, raw_search))
+
+    async def asearch(self, query: str, max_results: int) -> List[SearchResult]:
+        try:
+            # Alleen oudere duckduckgo_search versies hebben een async interface
+            from duckduckgo_search import AsyncDDGS
+        except ImportError:
+            return await super().asearch(query, max_results)
+
+        async def raw_search():
+            async with AsyncDDGS() as ddgs:
+                return await ddgs.atext(query, max_results=max_results) or []
+
+        request = {"backend": self.name, "query": query, "max_results": max_results}
+        return self._convert(await arecord_call("search", request, raw_search))
+
+    def _convert(self, raw_results: List[Dict[str, Any]]) -> List[SearchResult]:
+        results = []
+        for r in raw_results:
+            # DDGS geeft de URL terug als 'href', oudere versies als 'link'
+            results.append(SearchResult(
+                title=r.get('title') or 'Geen titel',
+                url=r.get('href') or r.get('link') or 'Geen link',
+                snippet=r.get('body') or 'Geen samenvatting',
+                source=self.name
+            ))
+        return results
+
+class TavilyBackend(SearchBackend):
+    """Zoeken via de Tavily API (vereist TAVILY_API_KEY)."""
+    name = "tavily"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self._client = None
+
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        def raw_search():
+            if self._client is None:
+                from tavily import TavilyClient
+                self._client = TavilyClient(api_key=self.api_key)
+            return self._client.search(query, max_results=max_results)
+
+        request = {"backend": self.name, "query": query, "max_results": max_results}
+        response = record_call("search", request, raw_search)
+        return [
+            SearchResult(
+                title=r.get('title') or 'Geen titel',
+                url=r.get('url') or 'Geen link',
+                snippet=r.get('content') or 'Geen samenvatting',
+                source=self.name
+            )
+            for r in response.get('results', [])
+        ]
+
+class StaticBackend(SearchBackend):
+    """
+    Lokale stub backend voor offline tests.
+
+    Args:
+        name: Naam van de backend
+        results: Vaste resultaten, of een functie (query, max_results) -> resultaten
+        delay: Kunstmatige vertraging in seconden
+        error: Exception die bij elke zoekopdracht gegooid wordt
+    """
+
+    def __init__(
+        self,
+        name: str,
+        results: Union[List[SearchResult], Callable[[str, int], List[SearchResult]], None] = None,
+        delay: float = 0.0,
+        error: Optional[Exception] = None
+    ):
+        self.name = name
+        self.results = results or []
+        self.delay = delay
+        self.error = error
+
+    def search(self, query: str, max_results: int) -> List[SearchResult]:
+        if self.delay:
+            time.sleep(self.delay)
+        return self._results(query, max_results)
+
+    async def asearch(self, query: str, max_results: int) -> List[SearchResult]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._results(query, max_results)
+
+    def _results(self, query: str, max_results: int) -> List[SearchResult]:
+        if self.error is not None:
+            raise self.error
+        results = self.results(query, max_results) if callable(self.results) else self.results
+        return list(results)[:max_results]
+
+class BackendHealth:
+    """Houdt latency en succes van een backend bij voor hedging en volgorde."""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.latencies.append(latency)
+            self.outcomes.append(1 if success else 0)
+
+    def p90(self) -> Optional[float]:
+        """90e percentiel van succesvolle latencies, None zonder metingen."""
+        with self._lock:
+            if len(self.latencies) < 5:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    @property
+    def score(self) -> float:
+        """Score tussen 0 en 1: succesratio, licht afgestraft voor trage backends."""
+        with self._lock:
+            if not self.outcomes:
+                return 1.0
+            success_rate = sum(self.outcomes) / len(self.outcomes)
+            latencies = list(self.latencies)
+        if not latencies:
+            return success_rate
+        median = sorted(latencies)[len(latencies) // 2]
+        return success_rate / (1.0 + median / 10.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"score": round(self.score, 3), "p90": self.p90(), "samples": len(self.outcomes)}
+
+class HedgedSearch:
+    """
+    Zoek via meerdere backends met hedged requests.
+
+    De gezondste backend wordt eerst gevraagd. Als die niet binnen zijn eigen
+    p90 latency antwoordt, wordt de volgende backend parallel gestart; het
+    eerste goede (niet-lege) antwoord wint.
+    """
+
+    def __init__(
+        self,
+        backends: List[SearchBackend],
+        default_hedge_delay: float = 1.5,
+        min_hedge_delay: float = 0.2,
+        timeout: float = 20.0
+    ):
+        if not backends:
+            raise ValueError("HedgedSearch heeft minstens een backend nodig")
+        self.backends = backends
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.timeout = timeout
+        self.health = {b.name: BackendHealth() for b in backends}
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(backends), thread_name_prefix="search")
+
+    def _ranked_backends(self) -> List[SearchBackend]:
+        return sorted(self.backends, key=lambda b: self.health[b.name].score, reverse=True)
+
+    def _hedge_delay(self, backend: SearchBackend) -> float:
+        p90 = self.health[backend.name].p90()
+        if p90 is None:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, p90)
+
+    def _run(self, backend: SearchBackend, query: str, max_results: int) -> List[SearchResult]:
+        start = time.monotonic()
+        try:
+            results = backend.search(query, max_results)
+        except Exception:
+            self.health[backend.name].record(time.monotonic() - start, False)
+            raise
+        self.health[backend.name].record(time.monotonic() - start, bool(results))
+        return results
+
+    def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        """Voer een hedged zoekopdracht uit en geef het eerste goede antwoord terug."""
+        run_deadline.check("zoeken")
+        get_rate_limiter("search").acquire()
+        timeout = run_deadline.remaining(self.timeout)
+        deadline = time.monotonic() + timeout
+        remaining = self._ranked_backends()
+        pending = {}
+        empty_result: Optional[List[SearchResult]] = None
+        last_error: Optional[Exception] = None
+
+        while remaining or pending:
+            # Start de volgende backend als er niets loopt of de hedge delay verstreken is
+            if remaining:
+                backend = remaining.pop(0)
+                logger.info(f"Zoeken via backend: {backend.name}")
+                pending[self._executor.submit(self._run, backend, query, max_results)] = backend
+                wait_time = self._hedge_delay(backend) if remaining else None
+            else:
+                wait_time = None
+
+            time_left = deadline - time.monotonic()
+            if time_left <= 0:
+                break
+            wait_time = time_left if wait_time is None else min(wait_time, time_left)
+
+            done, _ = wait(list(pending), timeout=wait_time, return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logger.warning(f"Backend {backend.name} faalde: {str(e)}")
+                    last_error = e
+                    continue
+                if results:
+                    logger.info(f"Antwoord van {backend.name}: {len(results)} resultaten")
+                    return results
+                empty_result = results
+
+        if empty_result is not None:
+            return empty_result
+        if last_error is not None:
+            raise last_error
+        raise TimeoutError(f"Geen zoekbackend antwoordde binnen {timeout:g} seconden")
+
+    async def _arun(self, backend: SearchBackend, query: str, max_results: int) -> List[SearchResult]:
+        start = time.monotonic()
+        try:
+            results = await backend.asearch(query, max_results)
+        except asyncio.CancelledError:
+            # Verloren hedge race, telt niet als fout
+            raise
+        except Exception:
+            self.health[backend.name].record(time.monotonic() - start, False)
+            raise
+        self.health[backend.name].record(time.monotonic() - start, bool(results))
+        return results
+
+    async def asearch(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        """Async variant van search; verliezende requests worden geannuleerd."""
+        run_deadline.check("zoeken")
+        await get_rate_limiter("search").aacquire()
+        loop = asyncio.get_running_loop()
+        timeout = run_deadline.remaining(self.timeout)
+        deadline = loop.time() + timeout
+        remaining = self._ranked_backends()
+        pending = {}
+        empty_result: Optional[List[SearchResult]] = None
+        last_error: Optional[Exception] = None
+
+        try:
+            while remaining or pending:
+                wait_time = None
+                if remaining:
+                    backend = remaining.pop(0)
+                    logger.info(f"Zoeken via backend: {backend.name}")
+                    pending[asyncio.ensure_future(self._arun(backend, query, max_results))] = backend
+                    if remaining:
+                        wait_time = self._hedge_delay(backend)
+
+                time_left = deadline - loop.time()
+                if time_left <= 0:
+                    break
+                wait_time = time_left if wait_time is None else min(wait_time, time_left)
+
+                done, _ = await asyncio.wait(list(pending), timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        logger.warning(f"Backend {backend.name} faalde: {str(e)}")
+                        last_error = e
+                        continue
+                    if results:
+                        logger.info(f"Antwoord van {backend.name}: {len(results)} resultaten")
+                        return results
+                    empty_result = results
+        finally:
+            # Ook bij annulering van de aanroeper geen losse requests achterlaten
+            for task in pending:
+                task.cancel()
+
+        if empty_result is not None:
+            return empty_result
+        if last_error is not None:
+            raise last_error
+        raise TimeoutError(f"Geen zoekbackend antwoordde binnen {timeout:g} seconden")
+
+    def health_report(self) -> Dict[str, Dict[str, Any]]:
+        """Huidige health scores per backend."""
+        return {name: h.as_dict() for name, h in self.health.items()}
+
+_default_search: Optional[HedgedSearch] = None
+_default_lock = threading.Lock()
+
+def get_search() -> HedgedSearch:
+    """Geef de gedeelde HedgedSearch, met Tavily als TAVILY_API_KEY gezet is."""
+    global _default_search
+    with _default_lock:
+        if _default_search is None:
+            load_env()
+            backends: List[SearchBackend] = [DDGSBackend()]
+            if os.getenv("TAVILY_API_KEY"):
+                backends.append(TavilyBackend())
+            _default_search = HedgedSearch(backends)
+        return _default_search
+
+def set_search_backends(backends: List[SearchBackend], **kwargs) -> HedgedSearch:
+    """Vervang de gedeelde backends, bijvoorbeeld door StaticBackends in tests."""
+    global _default_search
+    with _default_lock:
+        _default_search = HedgedSearch(backends, **kwargs)
+        return _default_search
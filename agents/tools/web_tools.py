@@ -1,62 +1,277 @@
-from langchain_core.tools import tool
-from duckduckgo_search import DDGS
-from bs4 import BeautifulSoup
-import requests
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from langchain_core.tools import StructuredTool
+import asyncio
 import logging
 import json
+import threading
+import time
+import weakref
+
+from agents.tools.search_backends import SearchResult, get_search
+from agents.rate_limits import get_rate_limiter
+from agents.cassette import arecord_call, record_call
+from agents.tools import fetch_guard
+from agents import deadline
+from agents.profiling import profile_section
+from agents.cache_backend import asingle_flight, get_shared_cache, single_flight
+from agents.env import getenv
 
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@tool
+# Timeouts in seconden
+SEARCH_TIMEOUT = 20
+FETCH_TIMEOUT = 10
+
+SEARCH_CACHE_SIZE = 256
+
+# Settings worden bij gebruik gelezen, zodat ze ook uit .env kunnen komen
+def _search_cache_ttl() -> float:
+    """
+    Seconden dat zoekresultaten bewaard blijven, zodat dezelfde zoekterm uit een
+    andere branch, een retry of een volgende run niet opnieuw gezocht wordt.
+    """
+    return float(getenv("SEARCH_CACHE_TTL", "900"))
+
+def _page_cache_ttl() -> float:
+    """Seconden dat opgehaalde pagina's in de gedeelde cache staan (alleen met AGENTS_SHARED_CACHE)."""
+    return float(getenv("FETCH_CACHE_TTL", "3600"))
+
+def _page_error_ttl() -> float:
+    """
+    Seconden dat een mislukte fetch in de gedeelde cache staat, zodat andere
+    processen die op dezelfde lease wachtten niet meteen opnieuw proberen.
+    """
+    return float(getenv("FETCH_ERROR_CACHE_TTL", "60"))
+
+_search_cache: "OrderedDict[Tuple[str, int], Tuple[float, List[SearchResult]]]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def _search_key(query: str, max_results: int) -> Tuple[str, int]:
+    return " ".join(query.lower().split()), max_results
+
+def _shared_search_key(query: str, max_results: int) -> str:
+    normalized, max_results = _search_key(query, max_results)
+    return f"{max_results}:{normalized}"
+
+def _remember_search(key: Tuple[str, int], results: List[SearchResult], ttl: float) -> None:
+    with _search_cache_lock:
+        _search_cache[key] = (time.monotonic() + ttl, list(results))
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+def _cached_search(query: str, max_results: int) -> Optional[List[SearchResult]]:
+    key = _search_key(query, max_results)
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del _search_cache[key]
+            entry = None
+        if entry is not None:
+            _search_cache.move_to_end(key)
+    if entry is None:
+        # Misschien heeft een ander proces deze zoekterm al gezocht
+        shared = get_shared_cache()
+        results = shared.get("search", _shared_search_key(query, max_results)) if shared else None
+        if results is None:
+            return None
+        _remember_search(key, results, _search_cache_ttl())
+        entry = (0.0, results)
+    logger.info(f"Zoekresultaten uit cache voor: {query}")
+    return list(entry[1])
+
+def _store_search(query: str, max_results: int, results: List[SearchResult]) -> None:
+    # Lege resultaten niet bewaren; dat kan een tijdelijke storing zijn
+    ttl = _search_cache_ttl()
+    if ttl <= 0 or not results:
+        return
+    _remember_search(_search_key(query, max_results), results, ttl)
+    shared = get_shared_cache()
+    if shared:
+        shared.set("search", _shared_search_key(query, max_results), list(results), ttl=ttl)
+
+def _cached_page(url: str) -> Optional[str]:
+    shared = get_shared_cache()
+    if shared is None or _page_cache_ttl() <= 0:
+        return None
+    text = shared.get("page", url)
+    if is_fetch_error(text):
+        logger.info(f"Eerder mislukte fetch uit gedeelde cache: {url}")
+    elif text is not None:
+        logger.info(f"Webpage uit gedeelde cache: {url}")
+    return text
+
+def _store_page(url: str, text: str) -> None:
+    shared = get_shared_cache()
+    ttl = _page_cache_ttl()
+    if shared is not None and ttl > 0 and text:
+        shared.set("page", url, text, ttl=ttl)
+
+def _store_page_error(url: str, error_msg: str) -> None:
+    # Onder dezelfde sleutel als de pagina; is_fetch_error herkent de melding
+    shared = get_shared_cache()
+    ttl = _page_error_ttl()
+    if shared is not None and ttl > 0:
+        shared.set("page", url, error_msg, ttl=ttl)
+
+def search_web_structured(query: str, max_results: int = 10) -> List[SearchResult]:
+    """
+    Zoek op het web en geef getypeerde resultaten terug.
+    
+    Args:
+        query: De zoekterm om naar te zoeken
+        max_results: Maximum aantal resultaten
+    
+    Returns:
+        Lijst met SearchResult objecten, ontdubbeld op URL
+    """
+    cached = _cached_search(query, max_results)
+    if cached is not None:
+        return cached
+    
+    # Een proces tegelijk zoekt deze term; de rest krijgt het resultaat uit de cache
+    with single_flight("search", _shared_search_key(query, max_results)):
+        cached = _cached_search(query, max_results)
+        if cached is not None:
+            return cached
+        
+        logger.info(f"Start web search met query: {query}")
+        raw_results = get_search().search(query, max_results=max_results)
+        logger.info(f"Aantal resultaten gevonden: {len(raw_results)}")
+        
+        results = []
+        seen_urls = set()
+        for r in raw_results:
+            if r.url in seen_urls:
+                continue
+            seen_urls.add(r.url)
+            results.append(r)
+        _store_search(query, max_results, results)
+    return results
+
+async def asearch_web_structured(
+    query: str,
+    max_results: int = 10,
+    timeout: Optional[float] = None
+) -> List[SearchResult]:
+    """
+    Async variant van search_web_structured.
+    
+    Raises:
+        asyncio.TimeoutError: als er niet binnen timeout seconden een antwoord is
+    """
+    # De cache kan SQLite lezen; dat gebeurt in een thread, buiten de event loop
+    cached = await asyncio.to_thread(_cached_search, query, max_results)
+    if cached is not None:
+        return cached
+    
+    async with asingle_flight("search", _shared_search_key(query, max_results)):
+        cached = await asyncio.to_thread(_cached_search, query, max_results)
+        if cached is not None:
+            return cached
+        
+        logger.info(f"Start async web search met query: {query}")
+        raw_results = await asyncio.wait_for(
+            get_search().asearch(query, max_results=max_results),
+            timeout=timeout or SEARCH_TIMEOUT
+        )
+        
+        seen_urls = set()
+        results = []
+        for r in raw_results:
+            if r.url not in seen_urls:
+                seen_urls.add(r.url)
+                results.append(r)
+        await asyncio.to_thread(_store_search, query, max_results, results)
+    return results
+
+def render_search_results(results: List[SearchResult], max_snippet: int = 300) -> str:
+    """Zet zoekresultaten om naar compacte prompt tekst."""
+    if not results:
+        return "Geen resultaten gevonden voor deze zoekopdracht."
+    return "\n".join(r.render(max_snippet) for r in results)
+
 def _search_web(query: str) -> str:
-    """Zoek informatie op het web via DuckDuckGo.
+    """Zoek informatie op het web via DuckDuckGo of Tavily.
     
     Args:
         query: De zoekterm om naar te zoeken
     """
-    logger.info(f"Start web search met query: {query}")
     try:
-        with DDGS() as ddgs:
-            results = []
-            logger.info("DuckDuckGo search gestart...")
-            
-            # Gebruik ddgs.text() met max_results
-            search_results = list(ddgs.text(query, max_results=10))
-            logger.info(f"Aantal resultaten gevonden: {len(search_results)}")
-            
-            if not search_results:
-                logger.warning("Geen resultaten gevonden!")
-                return "Geen resultaten gevonden voor deze zoekopdracht."
-            
-            # Format de resultaten
-            for r in search_results:
-                try:
-                    result = {
-                        "title": r.get('title', 'Geen titel'),
-                        "link": r.get('link', 'Geen link'),
-                        "snippet": r.get('body', 'Geen samenvatting')
-                    }
-                    results.append(
-                        f"TITEL: {result['title']}\n"
-                        f"URL: {result['link']}\n"
-                        f"SAMENVATTING: {result['snippet']}\n"
-                        "---"
-                    )
-                    logger.info(f"Resultaat verwerkt: {result['title']}")
-                except Exception as e:
-                    logger.error(f"Error bij verwerken resultaat: {str(e)}")
-                    continue
-            
-            return "\n\n".join(results) if results else "Geen geldige resultaten gevonden."
+        results = search_web_structured(query)
+        if not results:
+            logger.warning("Geen resultaten gevonden!")
+        return render_search_results(results)
             
     except Exception as e:
         error_msg = f"Error bij web search: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return error_msg
 
-@tool
+async def _asearch_web(query: str) -> str:
+    """Async variant van _search_web; annulering wordt doorgegeven."""
+    try:
+        results = await asearch_web_structured(query)
+        if not results:
+            logger.warning("Geen resultaten gevonden!")
+        return render_search_results(results)
+    
+    except asyncio.TimeoutError:
+        error_msg = f"Timeout bij web search na {SEARCH_TIMEOUT} seconden"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error bij web search: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return error_msg
+
+def _html_to_text(html: str) -> str:
+    """Haal leesbare tekst uit HTML, zonder scripts, navigatie en lege regels."""
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Verwijder scripts, styles en andere niet-relevante elementen
+    for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
+        element.decompose()
+    
+    # Haal tekst op en verwijder lege regels
+    text = soup.get_text(separator='\n')
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return '\n'.join(lines)
+
+def _log_fetched(cleaned_text: str) -> None:
+    logger.info(f"Succesvol opgehaald, {len(cleaned_text)} karakters gevonden")
+    # Log een preview van de content
+    preview = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
+    logger.info(f"Content preview: {preview}")
+
+def _http_get(url: str) -> Dict[str, Any]:
+    """
+    Haal de ruwe HTML op.
+
+    Een HTTP fout komt terug onder "error", met de status onder "status"
+    (None bij een timeout of verbindingsfout); zo staat hij ook op een cassette.
+    """
+    # Zware dependencies pas laden bij de eerste fetch
+    import requests
+    try:
+        response = requests.get(url, timeout=deadline.remaining(FETCH_TIMEOUT))
+        response.raise_for_status()  # Raise exception voor niet-200 status codes
+        return {"text": response.text, "status": response.status_code}
+    except requests.RequestException as e:
+        response = getattr(e, "response", None)
+        return {"error": str(e), "status": getattr(response, "status_code", None)}
+
+# Een fetch geeft fouten als tekst terug (voor het model); zo herken je ze
+FETCH_ERROR_PREFIXES = ("HTTP error bij ophalen webpage:", "Onverwachte error bij ophalen webpage:")
+
+def is_fetch_error(text: str) -> bool:
+    """Of het resultaat van fetch_webpage_content een foutmelding is in plaats van pagina tekst."""
+    return isinstance(text, str) and text.startswith(FETCH_ERROR_PREFIXES)
+
 def _fetch_webpage_content(url: str) -> str:
     """Haal de inhoud van een webpage op.
     
@@ -64,39 +279,137 @@ def _fetch_webpage_content(url: str) -> str:
         url: De URL van de webpage om op te halen
     """
     logger.info(f"Start webpage fetch: {url}")
-    try:
-        logger.info("Maken HTTP request...")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise exception voor niet-200 status codes
-        
-        logger.info("Parsen van HTML...")
-        soup = BeautifulSoup(response.text, 'html.parser')
+    # Na de deadline niet meer aan een fetch beginnen; de run moet stoppen
+    deadline.check("fetch")
+    with profile_section("fetch", allocations=True):
+        try:
+            cached = _cached_page(url)
+            if cached is not None:
+                return cached
+            
+            # Bekende slechte bronnen meteen overslaan, zonder op een timeout te wachten
+            blocked = fetch_guard.check(url)
+            if blocked:
+                logger.warning(f"Fetch overgeslagen voor {url}: {blocked}")
+                return f"HTTP error bij ophalen webpage: {blocked}"
+            
+            # Haalt een ander proces deze pagina al op, dan wachten we op zijn resultaat
+            with single_flight("page", url):
+                cached = _cached_page(url)
+                if cached is not None:
+                    return cached
+                
+                # Tijdens het wachten kan de host of URL als slecht gemarkeerd zijn
+                blocked = fetch_guard.check(url)
+                if blocked:
+                    logger.warning(f"Fetch overgeslagen voor {url}: {blocked}")
+                    return f"HTTP error bij ophalen webpage: {blocked}"
+                
+                logger.info("Maken HTTP request...")
+                get_rate_limiter("fetch").acquire()
+                page = record_call("fetch", {"url": url}, lambda: _http_get(url))
+                fetch_guard.record(url, page)
+                if page.get("error"):
+                    error_msg = f"HTTP error bij ophalen webpage: {page['error']}"
+                    logger.error(error_msg)
+                    _store_page_error(url, error_msg)
+                    return error_msg
+                
+                logger.info("Parsen van HTML...")
+                cleaned_text = _html_to_text(page["text"])
+                _log_fetched(cleaned_text)
+                _store_page(url, cleaned_text)
+            
+            return cleaned_text
         
-        # Verwijder scripts, styles en andere niet-relevante elementen
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-            element.decompose()
+        except Exception as e:
+            error_msg = f"Onverwachte error bij ophalen webpage: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return error_msg
+
+# Een async HTTP client per event loop, gedeeld door alle fetches in die loop
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _get_async_client():
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(FETCH_TIMEOUT),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        _async_clients[loop] = client
+    return client
+
+async def _ahttp_get(url: str) -> Dict[str, Any]:
+    """Async variant van _http_get met de gedeelde httpx client."""
+    import httpx
+    try:
+        response = await asyncio.wait_for(_get_async_client().get(url), timeout=deadline.remaining(FETCH_TIMEOUT))
+        response.raise_for_status()
+        return {"text": response.text, "status": response.status_code}
+    except httpx.HTTPStatusError as e:
+        return {"error": str(e), "status": e.response.status_code}
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        return {"error": str(e) or type(e).__name__, "status": None}
+
+async def _afetch_webpage_content(url: str) -> str:
+    """Async variant van _fetch_webpage_content met een gedeelde httpx client."""
+    logger.info(f"Start async webpage fetch: {url}")
+    deadline.check("fetch")
+    try:
+        # De gedeelde cache is SQLite; lezen en schrijven in een thread
+        cached = await asyncio.to_thread(_cached_page, url)
+        if cached is not None:
+            return cached
         
-        # Haal tekst op en verwijder lege regels
-        text = soup.get_text(separator='\n')
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        cleaned_text = '\n'.join(lines)
+        blocked = fetch_guard.check(url)
+        if blocked:
+            logger.warning(f"Fetch overgeslagen voor {url}: {blocked}")
+            return f"HTTP error bij ophalen webpage: {blocked}"
         
-        logger.info(f"Succesvol opgehaald, {len(cleaned_text)} karakters gevonden")
-        # Log een preview van de content
-        preview = cleaned_text[:200] + "..." if len(cleaned_text) > 200 else cleaned_text
-        logger.info(f"Content preview: {preview}")
+        async with asingle_flight("page", url):
+            cached = await asyncio.to_thread(_cached_page, url)
+            if cached is not None:
+                return cached
+            
+            blocked = fetch_guard.check(url)
+            if blocked:
+                logger.warning(f"Fetch overgeslagen voor {url}: {blocked}")
+                return f"HTTP error bij ophalen webpage: {blocked}"
+            
+            await get_rate_limiter("fetch").aacquire()
+            page = await arecord_call("fetch", {"url": url}, lambda: _ahttp_get(url))
+            fetch_guard.record(url, page)
+            if page.get("error"):
+                error_msg = f"HTTP error bij ophalen webpage: {page['error']}"
+                logger.error(error_msg)
+                await asyncio.to_thread(_store_page_error, url, error_msg)
+                return error_msg
+            
+            # HTML parsen is CPU werk; doe het buiten de event loop
+            cleaned_text = await asyncio.to_thread(_html_to_text, page["text"])
+            _log_fetched(cleaned_text)
+            await asyncio.to_thread(_store_page, url, cleaned_text)
         
         return cleaned_text
-        
-    except requests.RequestException as e:
-        error_msg = f"HTTP error bij ophalen webpage: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        return error_msg
+    
     except Exception as e:
         error_msg = f"Onverwachte error bij ophalen webpage: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return error_msg
 
-# Exporteer de tool objecten
-search_web = _search_web
-fetch_webpage_content = _fetch_webpage_content
+# Exporteer de tool objecten, met zowel een sync als een async implementatie
+search_web = StructuredTool.from_function(
+    func=_search_web,
+    coroutine=_asearch_web,
+    name="_search_web"
+)
+fetch_webpage_content = StructuredTool.from_function(
+    func=_fetch_webpage_content,
+    coroutine=_afetch_webpage_content,
+    name="_fetch_webpage_content"
+)
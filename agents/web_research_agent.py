@@ -1,20 +1,23 @@
 from typing import Dict, Any
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from agents.llm import create_chat_model
 import os
-from dotenv import load_dotenv
 import json
 import logging
 
 # Update imports naar nieuwe locatie
 from agents.tools.web_tools import search_web, fetch_webpage_content
+from agents.research_cache import lookup_report, find_offer, store_report, describe_reuse
+from agents.json_repair import repair_json, parse_report, content_to_text
+from agents.blob_store import offload
+from agents.accounting import BudgetExceededError
+from agents.tool_loop import run_tool_loop
 
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Laad environment variables
-load_dotenv()
+RESEARCH_TOOLS = [search_web, fetch_webpage_content]
 
 def web_research(state: Dict[str, Any]) -> Dict[str, Any]:
     """Web research agent functie."""
@@ -24,12 +27,21 @@ def web_research(state: Dict[str, Any]) -> Dict[str, Any]:
     if not isinstance(last_message, HumanMessage):
         return {"messages": [AIMessage(content="Ik kan alleen reageren op gebruikersvragen.")]}
     
-    # Initialiseer de agent
-    agent = ChatAnthropic(
-        model="claude-3-sonnet-20240229",
-        temperature=0,
-        anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
-    ).bind_tools([search_web, fetch_webpage_content])
+    # Hergebruik een recent rapport voor een (bijna) identieke vraag
+    cached = lookup_report(last_message.content)
+    if cached:
+        return {
+            "messages": [AIMessage(content=describe_reuse(cached))],
+            "research_results": offload(cached.research_results)
+        }
+    
+    # Een vergelijkbaar rapport wordt alleen aangeboden; het onderzoek gaat door
+    offer = find_offer(last_message.content)
+    
+    # Initialiseer de modellen; eenvoudige stappen gaan naar een klein, snel model
+    interpreter = create_chat_model(step="interpret")
+    agent = create_chat_model(RESEARCH_TOOLS, step="tool_calls")
+    analyst = create_chat_model(step="analysis")
     
     # Stap 1: Interpreteer de vraag en maak zoektermen
     interpret_message = HumanMessage(content=f"""
@@ -50,26 +62,30 @@ def web_research(state: Dict[str, Any]) -> Dict[str, Any]:
     Gebruik ALLEEN JSON, geen andere tekst.
     """)
     
-    interpret_response = agent.invoke([interpret_message])
+    interpret_response = interpreter.invoke([interpret_message])
     logger.info(f"Interpretatie resultaat: {interpret_response.content}")
     
     try:
-        # Parse de JSON response
-        if isinstance(interpret_response.content, str):
-            search_info = json.loads(interpret_response.content)
-        else:
-            for item in interpret_response.content:
-                if isinstance(item, dict) and 'text' in item:
-                    search_info = json.loads(item['text'])
-                    break
+        # Parse de JSON response, ook als die in fences of tekst verpakt is
+        search_info = repair_json(content_to_text(interpret_response.content))
         
-        # Voer searches uit voor elke zoekterm
-        all_results = []
-        for term in search_info["zoektermen"]:
-            search_message = HumanMessage(content=f"Gebruik de search_web tool om te zoeken naar: {term}")
-            search_response = agent.invoke([search_message])
-            all_results.append(search_response.content)
-            logger.info(f"Zoekresultaten voor '{term}': {search_response.content}")
+        # Laat de agent zoeken; alle tool calls uit een beurt lopen parallel
+        search_message = HumanMessage(content=f"""
+        Zoek informatie voor deze vraag: {last_message.content}
+
+        Gebruik de search_web tool voor elk van deze zoektermen, tegelijk in een beurt:
+        {json.dumps(search_info["zoektermen"], ensure_ascii=False)}
+
+        Haal met fetch_webpage_content de inhoud op van de meest relevante pagina's.
+        Geef daarna een korte samenvatting van wat je gevonden hebt.
+        """)
+        loop_messages = run_tool_loop(agent, [search_message], RESEARCH_TOOLS)
+        all_results = [
+            content_to_text(message.content)
+            for message in loop_messages
+            if isinstance(message, ToolMessage)
+        ]
+        logger.info(f"{len(all_results)} tool resultaten verzameld")
         
         # Laat de agent de resultaten analyseren
         analyze_message = HumanMessage(content=f"""
@@ -99,23 +115,36 @@ def web_research(state: Dict[str, Any]) -> Dict[str, Any]:
         4. Geen placeholders of algemene tekst gebruiken
         """)
         
-        analysis_response = agent.invoke([analyze_message])
+        analysis_response = analyst.invoke([analyze_message])
         logger.info(f"Analyse resultaat: {analysis_response.content}")
         
+        # Herstel de JSON en vraag alleen ontbrekende secties opnieuw op
+        report = parse_report(
+            analysis_response.content,
+            llm=analyst,
+            context=f"VRAAG: {last_message.content}\nDOEL: {search_info['doel']}"
+        )
+        research_results = json.dumps(report, ensure_ascii=False)
+        store_report(last_message.content, research_results)
+        
         return {
-            "messages": messages + [analysis_response],
-            "research_results": analysis_response.content
+            "messages": [analysis_response],
+            "research_results": offload(research_results),
+            "reuse_offer": offer
         }
         
-    except json.JSONDecodeError as e:
+    except BudgetExceededError:
+        # Niet als gewone fout afhandelen; de run moet stoppen
+        raise
+    except (json.JSONDecodeError, ValueError) as e:
         error_msg = f"Error bij verwerken van zoekresultaten: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
     except Exception as e:
         error_msg = f"Onverwachte error: {str(e)}"
         logger.error(error_msg)
         return {
-            "messages": messages + [AIMessage(content=error_msg)]
+            "messages": [AIMessage(content=error_msg)]
         }
@@ -1,11 +1,18 @@
 from typing import Dict, Any, List, Optional
 from typing_extensions import TypedDict, Annotated
 from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import HumanMessage, BaseMessage
-from langgraph.graph.message import add_messages
+from langchain_core.messages import HumanMessage, BaseMessage, ToolMessage
 from dataclasses import dataclass
 import logging
 
+from agents.state_compaction import bounded_add_messages
+from agents.accounting import BudgetExceededError, RunBudget, finish_usage, track_usage
+from agents.deadline import DeadlineExceededError, partial_report, set_deadline, stream_until_deadline
+from agents.blob_store import offload
+from agents.json_repair import content_to_text
+from agents.step_guard import StepGuard
+from agents.profiling import enable_profiling, finish_profiling, profile_node
+
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,12 +20,14 @@ logger = logging.getLogger(__name__)
 # Definieer de state structuur
 class State(TypedDict):
     """State voor de workflow met uitgebreide functionaliteit."""
-    # Berichten geschiedenis met add_messages reducer
-    messages: Annotated[list[BaseMessage], add_messages]
+    # Berichten geschiedenis, begrensd tot een venster van recente berichten
+    messages: Annotated[list[BaseMessage], bounded_add_messages]
     
     # Web research resultaten
     research_results: Optional[str]
     research_status: Optional[str]  # 'pending', 'completed', 'failed'
+    # Vergelijkbaar eerder rapport dat de gebruiker kan openen (research_cache.find_offer)
+    reuse_offer: Optional[Dict[str, Any]]
     
     # PDF gerelateerde velden
     pdf_path: Optional[str]
@@ -32,6 +41,19 @@ class State(TypedDict):
     # Error handling
     error_message: Optional[str]
     retry_count: Optional[int]
+    
+    # Stapbudget: bezoeken per node, recente stappen en de reden van een gedwongen stop
+    node_visits: Optional[Dict[str, int]]
+    step_trace: Optional[List[str]]
+    terminal_reason: Optional[str]
+
+# Een mislukte research levert geen research_results op en wordt opnieuw
+# geprobeerd; de guard begrenst dat
+STEP_GUARD = StepGuard("v0", max_visits={
+    "web_research": 3,
+    "human_review": 5,
+    "format_pdf": 3,
+})
 
 def get_next_step(state: Dict[str, Any]) -> str:
     """Bepaal de volgende stap in de workflow."""
@@ -76,44 +98,98 @@ def create_workflow() -> StateGraph:
     from agents.pdf_formatting_agent import format_pdf
     from agents.tools.human_review_tool import human_review
     
-    # Voeg nodes toe
-    workflow.add_node("web_research", web_research)
-    workflow.add_node("human_review", human_review)
-    workflow.add_node("format_pdf", format_pdf)
+    # Voeg nodes toe; de guard telt de bezoeken en stopt lussen
+    workflow.add_node("web_research", STEP_GUARD.node("web_research", profile_node("web_research", web_research)))
+    workflow.add_node("human_review", STEP_GUARD.node("human_review", profile_node("human_review", human_review)))
+    workflow.add_node("format_pdf", STEP_GUARD.node("format_pdf", profile_node("format_pdf", format_pdf)))
+    next_step = STEP_GUARD.route(get_next_step)
     
     # Definieer edges met conditionele routing
     workflow.add_conditional_edges(
         START,
-        get_next_step
+        next_step
     )
     workflow.add_conditional_edges(
         "web_research",
-        get_next_step
+        next_step
     )
     workflow.add_conditional_edges(
         "human_review",
-        get_next_step
+        next_step
     )
     workflow.add_conditional_edges(
         "format_pdf",
-        get_next_step
+        next_step
     )
     
     return workflow
 
-# Maak een singleton instance van de workflow
-agent_workflow = create_workflow()
+_agent_workflow = None
+
+def get_agent_workflow():
+    """Geef de gecompileerde workflow; wordt pas bij het eerste gebruik gebouwd."""
+    global _agent_workflow
+    if _agent_workflow is None:
+        _agent_workflow = create_workflow().compile()
+    return _agent_workflow
+
+def __getattr__(name: str):
+    # agent_workflow blijft beschikbaar als module attribuut, maar lui
+    if name == "agent_workflow":
+        return get_agent_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _partial_results(query: str, state: Dict[str, Any], messages: List[BaseMessage], reason: str) -> str:
+    """
+    Gedeeltelijk rapport uit de tool resultaten die voor de deadline binnen waren.
+
+    De tool loop van web_research houdt zijn berichten lokaal; die komen via
+    de DeadlineExceededError mee (messages) naast de berichten in de state.
+    """
+    from agents.tools.web_tools import fetch_webpage_content, is_fetch_error
+
+    all_messages = list(state.get("messages") or []) + list(messages)
+    fetched_urls = {
+        call["id"]: call["args"].get("url")
+        for message in all_messages
+        for call in getattr(message, "tool_calls", None) or []
+        if call["name"] == fetch_webpage_content.name
+    }
+    findings = []
+    sources = []
+    for message in all_messages:
+        if not isinstance(message, ToolMessage):
+            continue
+        text = content_to_text(message.content)
+        if text.startswith("Fout") or is_fetch_error(text):
+            continue
+        findings.append(text)
+        url = fetched_urls.get(message.tool_call_id)
+        if url and all(source["url"] != url for source in sources):
+            sources.append({"url": url, "titel": url})
+    return partial_report(query, reason, findings, sources)
 
-def process_query(query: str, thread_id: str = "default") -> Dict[str, Any]:
+def process_query(
+    query: str,
+    thread_id: str = "default",
+    budget: Optional[RunBudget] = None,
+    deadline: Optional[float] = None,
+    profile: Optional[bool] = None
+) -> Dict[str, Any]:
     """
     Verwerk een zoekopdracht door de workflow.
     
     Args:
         query: De zoekopdracht
         thread_id: Unieke identifier voor het gesprek
+        budget: Limieten voor deze run, standaard uit RUN_BUDGET_* environment variables
+        deadline: Maximale duur van de run in seconden, standaard RUN_DEADLINE_SECONDS
+        profile: Profiel per node wegschrijven, standaard AGENTS_PROFILE
     
     Returns:
-        Dictionary met de eindstatus van de workflow
+        Dictionary met de eindstatus van de workflow, inclusief het verbruik onder "usage".
+        Na de deadline staat er een gedeeltelijk rapport in research_results en is "partial" True.
+        Met profiling staat de directory met profielen onder "profile_dir".
     """
     # Initialiseer de state
     initial_state = {
@@ -121,18 +197,35 @@ def process_query(query: str, thread_id: str = "default") -> Dict[str, Any]:
         "research_results": None,
         "pdf_path": None,
         "research_status": None,
+        "reuse_offer": None,
         "pdf_status": None,
         "human_approved": None,
         "review_comments": None,
         "review_status": None,
         "error_message": None,
-        "retry_count": None
+        "retry_count": None,
+        "node_visits": {},
+        "step_trace": [],
+        "terminal_reason": None
     }
     
-    # Voer de workflow uit
-    final_state = agent_workflow.invoke(
-        initial_state,
-        config={"configurable": {"thread_id": thread_id}}
-    )
+    config = {"configurable": {"thread_id": thread_id}, "recursion_limit": STEP_GUARD.recursion_limit}
+    usage = track_usage(config, budget)
+    set_deadline(config, deadline)
+    profile_dir = enable_profiling(config, thread_id, profile)
     
-    return final_state
+    # Voer de workflow uit
+    try:
+        final_state = stream_until_deadline(get_agent_workflow(), initial_state, config)
+    except DeadlineExceededError as e:
+        final_state = {**(e.partial_state or initial_state), "error_message": str(e), "partial": True}
+        if not final_state.get("research_results"):
+            final_state["research_results"] = offload(_partial_results(query, final_state, e.messages, str(e)))
+    except BudgetExceededError as e:
+        final_state = {**initial_state, "error_message": str(e)}
+    finally:
+        finish_profiling(config)
+    
+    if profile_dir:
+        final_state["profile_dir"] = profile_dir
+    return finish_usage(usage, final_state)
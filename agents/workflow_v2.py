@@ -1,32 +1,54 @@
-from typing import Annotated, TypedDict, Dict, Any, Optional
+from typing import Annotated, TypedDict, Dict, Any, List, Optional
+from functools import lru_cache
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain_anthropic import ChatAnthropic
+from langgraph.types import Command
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, ToolMessage
+from agents.llm import create_chat_model
 import os
-from dotenv import load_dotenv
+import sqlite3
+import threading
+import uuid
+import json
 import logging
 
 # Absolute imports met correcte module paden
 from agents.tools.web_tools import search_web, fetch_webpage_content
 from agents.tools.pdf_tools import generate_pdf
-from agents.tools.human_review_tool import human_review
+from agents.tools.human_review_tool import request_review
+from agents import review_inbox
+from agents.draft_renderer import discard_draft, start_draft, take_draft
+from agents.revision import map_comments_to_sections, revise_sections
+from agents.blob_store import offload, resolve
+from agents.state_compaction import bounded_add_messages
+from agents.research_cache import lookup_report, find_offer, store_report, describe_reuse
+from agents.json_repair import parse_report, content_to_text
+from agents.report_model import pdf_requested
+from agents.accounting import BudgetExceededError, RunBudget, finish_usage, track_usage, UsageCallbackHandler
+from agents.tool_loop import FINAL_ANSWER_PROMPT, execute_tool_calls, max_tool_iterations
+from agents.deadline import DeadlineExceededError, partial_report, set_deadline, stream_until_deadline
+from agents.step_guard import StepGuard
+from agents.profiling import enable_profiling, finish_profiling, profile_node
+from agents.env import getenv
 
 # Configureer logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Laad environment variables
-load_dotenv()
-
 class State(TypedDict):
     """State voor de V2 workflow met uitgebreide functionaliteit."""
-    # Berichten geschiedenis met add_messages reducer
-    messages: Annotated[list[BaseMessage], add_messages]
+    # Berichten geschiedenis, begrensd tot een venster van recente berichten
+    messages: Annotated[list[BaseMessage], bounded_add_messages]
     
     # Web research resultaten
     research_results: Optional[str]
-    research_status: Optional[str]  # 'pending', 'completed', 'failed'
+    research_status: Optional[str]  # 'pending', 'tools', 'completed', 'failed'
+    tool_iterations: Optional[int]  # Aantal uitgevoerde rondes met tool calls
+    # Tool calls en resultaten van de lopende research ronde. Buiten het begrensde
+    # messages venster, zodat het model bij het eindantwoord alle resultaten nog ziet
+    research_messages: Optional[List[BaseMessage]]
+    # Vergelijkbaar eerder rapport dat de gebruiker kan openen (research_cache.find_offer)
+    reuse_offer: Optional[Dict[str, Any]]
     
     # PDF gerelateerde velden
     pdf_path: Optional[str]
@@ -37,32 +59,122 @@ class State(TypedDict):
     review_comments: Optional[str]
     review_status: Optional[str]  # 'pending', 'approved', 'rejected'
     
+    # Revisie na afgekeurde review
+    revision_round: Optional[int]
+    revised_sections: Optional[List[str]]
+    
     # Error handling
     error_message: Optional[str]
     retry_count: Optional[int]
+    
+    # Stapbudget: bezoeken per node, recente stappen en de reden van een gedwongen stop
+    node_visits: Optional[Dict[str, int]]
+    step_trace: Optional[List[str]]
+    terminal_reason: Optional[str]
+
+# Maximum aantal revisierondes na een afgekeurde review
+MAX_REVISION_ROUNDS = 3
+MAX_RETRIES = 3
+
+RESEARCH_TOOLS = [search_web, fetch_webpage_content]
+
+# Een research poging is maximaal MAX_TOOL_ITERATIONS + 1 model beurten
+STEP_GUARD = StepGuard("v2", max_visits=lambda: {
+    "web_research": (max_tool_iterations() + 1) * MAX_RETRIES,
+    "execute_tools": max_tool_iterations() * MAX_RETRIES,
+    "review_research": MAX_REVISION_ROUNDS + 2,
+    "revise_research": MAX_REVISION_ROUNDS,
+    "format_pdf": MAX_RETRIES,
+})
 
 # Initialiseer de agents
-web_research_agent = ChatAnthropic(
-    model="claude-3-sonnet-20240229",
-    temperature=0,
-    anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
-).bind_tools([search_web, fetch_webpage_content])
+@lru_cache(maxsize=1)
+def get_web_research_agent():
+    """Web research agent, aangemaakt bij het eerste gebruik."""
+    return create_chat_model(RESEARCH_TOOLS, step="research")
+
+@lru_cache(maxsize=1)
+def get_planning_model():
+    """Klein en snel model voor eenvoudige stappen zoals commentaar aan secties koppelen."""
+    return create_chat_model(step="map_comments")
+
+def _get_query(state: State) -> str:
+    """Haal de oorspronkelijke vraag van de gebruiker uit de state."""
+    for message in state["messages"]:
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            return message.content
+    return ""
 
-def web_research(state: State) -> Dict[str, Any]:
+def _thread_id(config: RunnableConfig) -> str:
+    return (config or {}).get("configurable", {}).get("thread_id", "default")
+
+def web_research(state: State, config: RunnableConfig) -> Dict[str, Any]:
     """Web research agent functie."""
     try:
-        # Reset error state
-        state["error_message"] = None
-        state["research_status"] = "pending"
+        # Na een mislukte poging begint de research ronde opnieuw; een tool call
+        # zonder resultaten zou door de API geweigerd worden
+        retrying = state.get("research_status") == "failed"
+        round_messages = [] if retrying else list(state.get("research_messages") or [])
+        tool_iterations = 0 if retrying else state.get("tool_iterations") or 0
+        
+        # Hergebruik een recent rapport voor een (bijna) identieke vraag
+        query = _get_query(state)
+        cached = lookup_report(query) if query and not tool_iterations else None
+        if cached:
+            return {
+                "messages": [AIMessage(content=describe_reuse(cached))],
+                "research_results": offload(cached.research_results),
+                "research_status": "completed",
+                "research_messages": [],
+                "tool_iterations": 0,
+                "error_message": None
+            }
         
-        # Voer research uit
-        response = web_research_agent.invoke(state["messages"])
+        # Een vergelijkbaar rapport wordt bij het begin van een ronde alleen aangeboden
+        offer = {"reuse_offer": find_offer(query)} if query and not tool_iterations else {}
         
+        # Voer research uit; na het maximum aantal tool rondes moet het model antwoorden
+        messages = list(state["messages"]) + round_messages
+        max_iterations = max_tool_iterations()
+        if tool_iterations >= max_iterations:
+            messages.append(HumanMessage(content=FINAL_ANSWER_PROMPT))
+        response = get_web_research_agent().invoke(messages)
+        
+        if response.tool_calls and tool_iterations < max_iterations:
+            # Eerst de tools uitvoeren; de resultaten komen via execute_tools terug
+            return {
+                "research_messages": round_messages + [response],
+                "tool_iterations": tool_iterations,
+                "research_status": "tools",
+                "error_message": None,
+                **offer
+            }
+        
+        # Herstel de JSON in plaats van een hele nieuwe research ronde
+        try:
+            report = parse_report(response.content, llm=get_web_research_agent(), context=f"VRAAG: {query}")
+            research_results = json.dumps(report, ensure_ascii=False)
+            store_report(query, research_results)
+            # Begin alvast aan de PDF terwijl het rapport op review wacht
+            if pdf_requested(config):
+                start_draft(_thread_id(config), research_results)
+        except ValueError as e:
+            logger.warning(f"Research resultaten zijn geen geldig rapport: {str(e)}")
+            research_results = response.content
+        
+        # Alleen het eindantwoord gaat naar de berichten; de ronde is klaar
         return {
             "messages": [response],
-            "research_results": response.content,
-            "research_status": "completed"
+            "research_messages": [],
+            "tool_iterations": 0,
+            "research_results": offload(research_results),
+            "research_status": "completed",
+            "error_message": None,
+            **offer
         }
+    except BudgetExceededError:
+        # Geen retry: de run moet stoppen
+        raise
     except Exception as e:
         logger.error(f"Error in web research: {str(e)}")
         return {
@@ -71,47 +183,109 @@ def web_research(state: State) -> Dict[str, Any]:
             "retry_count": (state.get("retry_count") or 0) + 1
         }
 
+def execute_tools(state: State) -> Dict[str, Any]:
+    """Voer de tool calls uit de laatste model beurt parallel uit."""
+    try:
+        round_messages = list(state.get("research_messages") or [])
+        tool_messages = execute_tool_calls(round_messages[-1], RESEARCH_TOOLS)
+        return {
+            "research_messages": round_messages + tool_messages,
+            "tool_iterations": (state.get("tool_iterations") or 0) + 1,
+            "research_status": "pending",
+            "error_message": None
+        }
+    except BudgetExceededError:
+        raise
+    except Exception as e:
+        logger.error(f"Error bij uitvoeren van tools: {str(e)}")
+        return {
+            "error_message": str(e),
+            "research_status": "failed",
+            "retry_count": (state.get("retry_count") or 0) + 1
+        }
+
 def review_research(state: State) -> Dict[str, Any]:
     """Human review functie voor research resultaten."""
+    # Onderbreek de run; die wordt hervat via resume_review(). De interrupt
+    # mag niet door een except-blok afgevangen worden.
+    review_result = request_review(
+        content=state["research_results"],
+        review_type="research"
+    )
+    
+    # Update state met review resultaat
+    return {
+        "human_approved": review_result["human_approved"],
+        "review_comments": review_result["review_comments"],
+        "review_status": review_result["review_status"]
+    }
+
+def revise_research(state: State, config: RunnableConfig) -> Dict[str, Any]:
+    """Herzie alleen de secties waar het reviewcommentaar over gaat."""
     try:
-        state["review_status"] = "pending"
+        report = parse_report(resolve(state["research_results"]))
+        comments = state.get("review_comments") or ""
+        revision_round = (state.get("revision_round") or 0) + 1
         
-        # Vraag om human review
-        review_result = human_review(
-            content=state["research_results"],
-            review_type="research"
-        )
+        targets = map_comments_to_sections(comments, report, llm=get_planning_model())
+        if not targets:
+            logger.warning("Commentaar niet aan secties te koppelen, rapport opnieuw ter review")
+            return {
+                "review_status": None,
+                "revision_round": revision_round,
+                "revised_sections": []
+            }
+        
+        logger.info(f"Revisieronde {revision_round}, secties: {targets}")
+        revised = revise_sections(get_web_research_agent(), report, targets, comments, _get_query(state))
+        research_results = json.dumps(revised, ensure_ascii=False)
+        if pdf_requested(config):
+            start_draft(_thread_id(config), research_results)
         
-        # Update state met review resultaat
         return {
-            "human_approved": review_result["human_approved"],
-            "review_comments": review_result["review_comments"],
-            "review_status": review_result["review_status"]
+            "messages": [AIMessage(content=f"Secties herzien na review: {', '.join(targets)}")],
+            "research_results": offload(research_results),
+            "review_status": None,
+            "revision_round": revision_round,
+            "revised_sections": targets
         }
+    except BudgetExceededError:
+        raise
     except Exception as e:
-        logger.error(f"Error in review: {str(e)}")
+        logger.error(f"Error in revisie: {str(e)}")
         return {
-            "error_message": str(e),
-            "review_status": "failed"
+            "review_status": None,
+            "revision_round": (state.get("revision_round") or 0) + 1,
+            "revised_sections": []
         }
 
-def format_pdf(state: State) -> Dict[str, Any]:
+def format_pdf(state: State, config: RunnableConfig) -> Dict[str, Any]:
     """PDF formatting functie."""
+    if not pdf_requested(config):
+        # De aanroeper maakt de PDF zelf pas als hij nodig is
+        return {"pdf_status": "deferred"}
+    
     try:
         state["pdf_status"] = "pending"
         
-        # Genereer PDF
-        pdf_path = generate_pdf(state["research_results"])
+        # Herstel kleine JSON fouten voordat de PDF gemaakt wordt
+        report = parse_report(resolve(state["research_results"]))
+        content = json.dumps(report, ensure_ascii=False)
+        
+        # Gebruik de speculatieve draft als de content niet veranderd is
+        pdf_path = take_draft(_thread_id(config), content) or generate_pdf(content)
         
         return {
             "pdf_path": pdf_path,
-            "pdf_status": "completed"
+            "pdf_status": "completed",
+            "error_message": None
         }
     except Exception as e:
         logger.error(f"Error in PDF formatting: {str(e)}")
         return {
             "error_message": str(e),
-            "pdf_status": "failed"
+            "pdf_status": "failed",
+            "retry_count": (state.get("retry_count") or 0) + 1
         }
 
 def get_next_step(state: State) -> str:
@@ -120,20 +294,34 @@ def get_next_step(state: State) -> str:
     
     # Check voor errors
     if state.get("error_message"):
-        if (state.get("retry_count") or 0) >= 3:
+        if (state.get("retry_count") or 0) >= MAX_RETRIES:
             logger.error(f"Max retries bereikt. Error: {state['error_message']}")
             return END
         logger.warning(f"Error gevonden: {state['error_message']}, opnieuw proberen...")
+        # Alleen de mislukte stap opnieuw, niet het hele onderzoek
+        if state.get("pdf_status") == "failed" and state.get("research_status") == "completed":
+            return "format_pdf"
         return "web_research"
     
     # Normale flow
+    if state.get("research_status") == "tools":
+        return "execute_tools"
+    
     if not state.get("research_results") or state.get("research_status") != "completed":
         return "web_research"
     
+    # Afgekeurd met commentaar: herzie alleen de betreffende secties
+    if (
+        state.get("review_status") == "rejected"
+        and state.get("review_comments")
+        and (state.get("revision_round") or 0) < MAX_REVISION_ROUNDS
+    ):
+        return "revise_research"
+    
     if state.get("review_status") != "approved":
         return "review_research"
     
-    if not state.get("pdf_path"):
+    if not state.get("pdf_path") and state.get("pdf_status") != "deferred":
         return "format_pdf"
     
     return END
@@ -142,60 +330,264 @@ def create_workflow() -> StateGraph:
     """Maak en configureer de V2 workflow."""
     workflow = StateGraph(State)
     
-    # Voeg nodes toe
-    workflow.add_node("web_research", web_research)
-    workflow.add_node("review_research", review_research)
-    workflow.add_node("format_pdf", format_pdf)
+    # Voeg nodes toe; de guard telt de bezoeken en stopt lussen
+    workflow.add_node("web_research", STEP_GUARD.node("web_research", profile_node("web_research", web_research)))
+    workflow.add_node("execute_tools", STEP_GUARD.node("execute_tools", profile_node("execute_tools", execute_tools)))
+    workflow.add_node("review_research", STEP_GUARD.node("review_research", profile_node("review_research", review_research)))
+    workflow.add_node("revise_research", STEP_GUARD.node("revise_research", profile_node("revise_research", revise_research)))
+    workflow.add_node("format_pdf", STEP_GUARD.node("format_pdf", profile_node("format_pdf", format_pdf)))
+    next_step = STEP_GUARD.route(get_next_step)
     
     # Definieer edges met conditionele routing
     workflow.add_conditional_edges(
         START,
-        get_next_step
+        next_step
     )
     workflow.add_conditional_edges(
         "web_research",
-        get_next_step
+        next_step
+    )
+    workflow.add_conditional_edges(
+        "execute_tools",
+        next_step
     )
     workflow.add_conditional_edges(
         "review_research",
-        get_next_step
+        next_step
+    )
+    workflow.add_conditional_edges(
+        "revise_research",
+        next_step
     )
     workflow.add_conditional_edges(
         "format_pdf",
-        get_next_step
+        next_step
     )
     
     return workflow
 
-def process_query_v2(query: str, thread_id: str = "default") -> Dict[str, Any]:
+def _checkpoint_path() -> str:
+    """Checkpoints van onderbroken runs, zodat een review later hervat kan worden."""
+    return getenv("WORKFLOW_CHECKPOINT_PATH", os.path.join("output", "checkpoints.db"))
+
+_app = None
+_app_lock = threading.Lock()
+
+def _create_checkpointer():
+    """Maak een persistente checkpointer, of val terug op geheugen."""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import MemorySaver
+        logger.warning("langgraph-checkpoint-sqlite niet geinstalleerd, reviews overleven geen herstart")
+        return MemorySaver()
+    
+    path = _checkpoint_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(conn)
+
+def get_app():
+    """Geef de gecompileerde V2 workflow met checkpointer (een keer per proces)."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_workflow().compile(checkpointer=_create_checkpointer())
+        return _app
+
+def _partial_results(query: str, state: Dict[str, Any], reason: str) -> str:
+    """Gedeeltelijk rapport uit de tool resultaten die voor de deadline binnen waren."""
+    findings = [
+        content_to_text(message.content)
+        for message in (state.get("messages") or []) + (state.get("research_messages") or [])
+        if isinstance(message, ToolMessage) and not content_to_text(message.content).startswith("Fout")
+    ]
+    return partial_report(query, reason, findings, [])
+
+def _finish_run(
+    app,
+    config: Dict[str, Any],
+    query: str,
+    usage: UsageCallbackHandler,
+    error: Optional[str] = None,
+    partial: bool = False
+) -> Dict[str, Any]:
+    """Lees de eindstatus en parkeer de run in de inbox als er een review openstaat."""
+    snapshot = app.get_state(config)
+    final_state = dict(snapshot.values)
+    final_state["thread_id"] = config["configurable"]["thread_id"]
+    if config["configurable"].get("profile_dir"):
+        final_state["profile_dir"] = config["configurable"]["profile_dir"]
+    
+    if error or not snapshot.next:
+        # Klaar of afgebroken (niet geparkeerd): een ongebruikte draft wordt niet meer opgehaald
+        discard_draft(final_state["thread_id"])
+    
+    if error:
+        # Afgebroken run (bijvoorbeeld over budget); niet parkeren
+        final_state["error_message"] = error
+        if partial:
+            # Deadline: geef wat er tot dan toe gevonden is
+            final_state["partial"] = True
+            if not resolve(final_state.get("research_results")):
+                final_state["research_results"] = offload(_partial_results(query, final_state, error))
+    elif snapshot.next:
+        # De run staat stil op een interrupt; alle resources worden vrijgegeven
+        review_inbox.park_review(
+            final_state["thread_id"],
+            query=query,
+            content=resolve(final_state.get("research_results")) or "",
+            review_type="research",
+            render_pdf=pdf_requested(config)
+        )
+        final_state["review_status"] = "pending"
+    
+    return finish_usage(usage, final_state)
+
+def process_query_v2(
+    query: str,
+    thread_id: str = "default",
+    render_pdf: bool = True,
+    budget: Optional[RunBudget] = None,
+    deadline: Optional[float] = None,
+    profile: Optional[bool] = None
+) -> Dict[str, Any]:
     """
     Verwerk een zoekopdracht met de V2 workflow.
     
     Args:
         query: De zoekopdracht
         thread_id: Unieke identifier voor het gesprek
+        render_pdf: False om geen (draft) PDF te maken; die wordt dan pas op aanvraag gemaakt
+        budget: Limieten voor deze run, standaard uit RUN_BUDGET_* environment variables
+        deadline: Maximale duur van de run in seconden, standaard RUN_DEADLINE_SECONDS
+        profile: Profiel per node wegschrijven, standaard AGENTS_PROFILE
     
     Returns:
-        Dictionary met de eindstatus van de workflow
+        Dictionary met de eindstatus van de workflow, inclusief het verbruik onder "usage".
+        Na de deadline staat er een gedeeltelijk rapport in research_results en is "partial" True.
+        Met profiling staat de directory met profielen onder "profile_dir".
     """
     # Maak initiele state
     initial_state = {
         "messages": [HumanMessage(content=query)],
         "research_results": None,
         "research_status": None,
+        "tool_iterations": 0,
+        "research_messages": [],
+        "reuse_offer": None,
         "pdf_path": None,
         "pdf_status": None,
         "human_approved": None,
         "review_comments": None,
         "review_status": None,
+        "revision_round": 0,
+        "revised_sections": None,
         "error_message": None,
-        "retry_count": 0
+        "retry_count": 0,
+        "node_visits": {},
+        "step_trace": [],
+        "terminal_reason": None
     }
     
-    # Maak en configureer de workflow
-    workflow = create_workflow()
+    # Elke run krijgt een eigen checkpoint thread, zodat hij los hervat kan worden
+    config = {
+        "configurable": {"thread_id": f"{thread_id}-{uuid.uuid4().hex[:8]}", "render_pdf": render_pdf},
+        "recursion_limit": STEP_GUARD.recursion_limit
+    }
+    
+    usage = track_usage(config, budget)
+    set_deadline(config, deadline)
+    enable_profiling(config, thread_id, profile)
+    
+    # Voer de workflow uit tot het einde of tot de review
+    app = get_app()
+    try:
+        stream_until_deadline(app, initial_state, config)
+    except DeadlineExceededError as e:
+        return _finish_run(app, config, query, usage, error=str(e), partial=True)
+    except BudgetExceededError as e:
+        return _finish_run(app, config, query, usage, error=str(e))
+    finally:
+        finish_profiling(config)
+    
+    return _finish_run(app, config, query, usage)
+
+def resume_review(
+    thread_id: str,
+    approved: bool,
+    comments: str = "",
+    deadline: Optional[float] = None,
+    profile: Optional[bool] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Hervat een geparkeerde run met de beslissing van een reviewer.
+    
+    Args:
+        thread_id: De thread_id uit de inbox
+        approved: Of het onderzoek is goedgekeurd
+        comments: Eventueel commentaar van de reviewer
+        deadline: Maximale duur van het vervolg in seconden, standaard RUN_DEADLINE_SECONDS
+        profile: Profiel per node wegschrijven, standaard AGENTS_PROFILE
+    
+    Returns:
+        De nieuwe eindstatus, of None als de review niet meer openstaat
+    """
+    review = review_inbox.get_review(thread_id)
+    if not review or not review_inbox.record_decision(thread_id, approved, comments):
+        logger.warning(f"Geen openstaande review voor {thread_id}")
+        return None
+    
+    # render_pdf staat niet in het checkpoint; neem hem over uit de geparkeerde review
+    config = {
+        "configurable": {"thread_id": thread_id, "render_pdf": bool(review.get("render_pdf", 1))},
+        "recursion_limit": STEP_GUARD.recursion_limit
+    }
+    usage = track_usage(config)
+    set_deadline(config, deadline)
+    enable_profiling(config, thread_id, profile)
+    app = get_app()
+    try:
+        stream_until_deadline(
+            app,
+            Command(resume={"approved": "ja" if approved else "nee", "comments": comments}),
+            config
+        )
+    except DeadlineExceededError as e:
+        return _finish_run(app, config, review["query"], usage, error=str(e), partial=True)
+    except BudgetExceededError as e:
+        return _finish_run(app, config, review["query"], usage, error=str(e))
+    except Exception:
+        # Zet de review terug zodat de beslissing niet verloren gaat
+        review_inbox.park_review(
+            thread_id, review["query"], review["content"], review["review_type"], pdf_requested(config)
+        )
+        raise
+    finally:
+        finish_profiling(config)
+    return _finish_run(app, config, review["query"], usage)
+
+def resume_reviews(decisions: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Verwerk meerdere reviewbeslissingen in een keer.
     
-    # Voer de workflow uit
-    final_state = workflow.invoke(initial_state)
+    Args:
+        decisions: Lijst met dicts met thread_id, approved en optioneel comments
     
-    return final_state
+    Returns:
+        Eindstatus per thread_id
+    """
+    results = {}
+    for decision in decisions:
+        try:
+            results[decision["thread_id"]] = resume_review(
+                decision["thread_id"],
+                decision["approved"],
+                decision.get("comments", "")
+            )
+        except Exception as e:
+            logger.error(f"Error bij hervatten van {decision['thread_id']}: {str(e)}")
+            results[decision["thread_id"]] = {"error_message": str(e)}
+    return results
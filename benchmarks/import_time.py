@@ -0,0 +1,97 @@
+"""
+Import-time benchmark voor de entry points.
+
+Gebruik:
+    python benchmarks/import_time.py [--repeat 3] [--scale 1.0]
+
+Elke module wordt in een schoon proces geimporteerd met `python -X importtime`.
+Het script faalt (exit code 1) als een import boven zijn budget komt, of als
+er bij het importeren al zware dependencies geladen worden die pas bij
+gebruik nodig zijn.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget per entry point in milliseconden (cumulatief, beste van --repeat runs)
+BUDGETS_MS = {
+    "agents": 20,
+    "agents.batch": 100,
+    "agents.review_inbox": 100,
+    "agents.research_agents": 1500,
+    "agents.workflow": 1500,
+    "agents.workflow_v2": 1500,
+}
+
+# Dependencies die pas bij het eerste gebruik geladen mogen worden
+HEAVY_MODULES = [
+    "reportlab", "bs4", "duckduckgo_search", "langchain_anthropic",
+    "anthropic", "tavily", "dotenv", "streamlit",
+]
+
+PROBE = (
+    "import sys, json; import {target}; "
+    "print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({heavy!r}))))"
+)
+
+def measure(target: str):
+    """Importeer target in een nieuw proces; geef (ms, zware modules) terug."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(target=target, heavy=HEAVY_MODULES)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        raise RuntimeError(last_line)
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[2].strip() == target:
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"Geen importtime regel gevonden voor {target}")
+
+    return cumulative_us / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Meet de import tijd van de entry points.")
+    parser.add_argument("--repeat", type=int, default=3, help="Aantal metingen per module")
+    parser.add_argument("--scale", type=float, default=float(os.getenv("IMPORT_BUDGET_SCALE", "1.0")),
+                        help="Vermenigvuldig alle budgetten, bijvoorbeeld voor trage CI machines")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for target, budget in BUDGETS_MS.items():
+        budget *= args.scale
+        try:
+            runs = [measure(target) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"ERROR {target}: {e}")
+            failures += 1
+            continue
+
+        best_ms = min(ms for ms, _ in runs)
+        heavy = runs[0][1]
+        status = "OK"
+        if best_ms > budget:
+            status = "TRAAG"
+            failures += 1
+        if heavy:
+            status = "ZWAAR"
+            failures += 1
+        print(f"{status:6} {target:28} {best_ms:8.1f} ms (budget {budget:.0f} ms)"
+              + (f" laadt: {', '.join(heavy)}" if heavy else ""))
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Render benchmark voor lange rapporten.
+
+Gebruik:
+    python benchmarks/pdf_render.py [--sections 40] [--paragraphs 25] [--repeat 1] [--max-seconds 0]
+
+Bouwt een synthetisch rapport met lange alinea's, markdown koppen, lijsten,
+tabellen en losse `<`/`&` tekens, en rendert het met render_pdf_bytes.
+Rapporteert rendertijd, aantal pagina's en piekgeheugen (tracemalloc).
+Met --max-seconds faalt het script (exit code 1) als de render te lang duurt.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+WORDS = (
+    "onderzoek resultaat analyse markt groei kosten data model vraag bron "
+    "energie beleid europa trend risico kans prijs sector rapport studie"
+).split()
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.1:
+        words.insert(rng.randint(0, len(words)), rng.choice(["<5%", "R&D", "a < b", "**belangrijk**"]))
+    return " ".join(words).capitalize() + "."
+
+def synthetic_report(sections: int, paragraphs: int, seed: int = 42) -> str:
+    """Maak een rapport JSON string zoals de agents die opleveren, maar groot."""
+    rng = random.Random(seed)
+    report = {"title": "Benchmark rapport: groei & risico's <2024>", "sections": {}}
+    for s in range(sections):
+        lines = []
+        for p in range(paragraphs):
+            kind = p % 10
+            if kind == 0:
+                lines.append(f"## Onderdeel {s}.{p}")
+            elif kind == 4:
+                lines.extend(f"- {_sentence(rng)}" for _ in range(5))
+            elif kind == 7:
+                lines.append("| Jaar | Waarde | Toelichting |")
+                lines.append("|---|---:|---|")
+                lines.extend(f"| {2000 + r} | {rng.randint(1, 999)} | {_sentence(rng)} |" for r in range(8))
+            else:
+                # Lange alinea's, zoals een LLM ze soms zonder witregels teruggeeft
+                lines.append(" ".join(_sentence(rng) for _ in range(rng.randint(5, 60))))
+            lines.append("")
+        report["sections"][f"Sectie {s + 1}"] = "\n".join(lines)
+    report["sections"]["Bronnen"] = [
+        {"url": f"https://example.com/bron?id={i}&lang=nl", "titel": f"Bron {i}", "relevantie": _sentence(rng)}
+        for i in range(50)
+    ]
+    return json.dumps(report, ensure_ascii=False)
+
+def run(content: str):
+    """Render een keer; geef (seconden, pagina's, piek MB, bytes) terug."""
+    from agents.tools.pdf_tools import render_pdf_bytes
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = render_pdf_bytes(content)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pages = data.count(b"/Type /Page") - data.count(b"/Type /Pages")
+    return elapsed, pages, peak / 1024 / 1024, len(data)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Meet de rendertijd van lange PDF rapporten.")
+    parser.add_argument("--sections", type=int, default=40, help="Aantal secties")
+    parser.add_argument("--paragraphs", type=int, default=25, help="Aantal blokken per sectie")
+    parser.add_argument("--repeat", type=int, default=1, help="Aantal metingen")
+    parser.add_argument("--max-seconds", type=float, default=0, help="Faal als de snelste render langer duurt")
+    args = parser.parse_args(argv)
+
+    # De renderer logt per sectie; dat hoort niet in de meting
+    import logging
+    logging.disable(logging.INFO)
+
+    content = synthetic_report(args.sections, args.paragraphs)
+    print(f"Rapport: {len(content) / 1024:.0f} KB JSON, {args.sections} secties")
+
+    runs = [run(content) for _ in range(args.repeat)]
+    best = min(runs, key=lambda r: r[0])
+    elapsed, pages, peak_mb, size = best
+    print(f"Render: {elapsed:.2f} s, {pages} pagina's ({elapsed / max(pages, 1) * 1000:.1f} ms/pagina), "
+          f"piek {peak_mb:.1f} MB, PDF {size / 1024:.0f} KB")
+
+    if args.max_seconds and elapsed > args.max_seconds:
+        print(f"TRAAG: boven budget van {args.max_seconds:.1f} s")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Offline run benchmark met een cassette.
+
+Gebruik:
+    python benchmarks/replay_run.py cassette.jsonl.gz "vraag" [--record] [--workflow v1] [--latency-scale 1.0]
+
+Met --record wordt een echte run (met netwerk en API key) opgenomen. Zonder
+--record wordt de cassette afgespeeld: geen netwerk, dezelfde antwoorden en
+de opgenomen latencies (vermenigvuldigd met --latency-scale). Rapporteert de
+totale duur, de latency per model tier en het verbruik per node, zodat
+stage timings tussen code wijzigingen vergeleken kunnen worden.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+def run(query: str, workflow: str):
+    """Voer een run uit; geef (seconden, eindstatus) terug."""
+    start = time.perf_counter()
+    if workflow == "v2":
+        from agents.workflow_v2 import process_query_v2
+        result = process_query_v2(query, thread_id="replay", render_pdf=False)
+    else:
+        from agents.research_agents import process_query_external
+        result = process_query_external(query, thread_id="replay", render_pdf=False)
+    return time.perf_counter() - start, result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Neem een run op of speel hem offline af.")
+    parser.add_argument("cassette", help="Pad van het cassette bestand (.gz voor gzip)")
+    parser.add_argument("query", help="De onderzoeksvraag")
+    parser.add_argument("--record", action="store_true", help="Neem een echte run op")
+    parser.add_argument("--workflow", choices=["v1", "v2"], default="v1")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Factor op opgenomen latencies, 0 = geen")
+    args = parser.parse_args(argv)
+
+    # Een hergebruikt rapport zou de hele run overslaan
+    os.environ["RESEARCH_CACHE_ENABLED"] = "0"
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from agents import metrics
+    from agents.cassette import use_cassette
+    use_cassette(args.cassette, "record" if args.record else "replay", args.latency_scale)
+
+    elapsed, result = run(args.query, args.workflow)
+    print(f"Run ({'opname' if args.record else 'afspelen'}, {args.workflow}): {elapsed:.2f} s")
+    if result.get("error_message"):
+        print(f"Fout: {result['error_message']}")
+
+    for name, stats in sorted(metrics.snapshot()["latency"].items()):
+        print(f"  {name}: {json.dumps(stats)}")
+    for node, usage in sorted((result.get("usage") or {}).get("nodes", {}).items()):
+        print(f"  node {node}: {usage['llm_calls']} LLM calls, {sum(usage['tool_calls'].values())} tool calls")
+    return 1 if result.get("error_message") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,8 +10,13 @@ import re
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, root_dir)
 
-from agents.research_agents import process_query_external
-from agents.workflow_v2 import process_query_v2
+# De workflows (LLM clients, ReportLab, zoekmachines) worden pas geladen als
+# er echt een vraag verwerkt wordt (load_workflow), zodat een Streamlit rerun snel blijft
+from agents import review_inbox
+from agents.blob_store import resolve
+from agents.report_model import build_document
+from agents.research_cache import describe_offer, load_report
+from agents.tools.pdf_tools import get_pdf_bytes, store_pdf
 
 # Helper functies
 def sanitize_filename(text):
@@ -29,21 +34,111 @@ def get_pdf_path(query):
     safe_query = sanitize_filename(query)
     return os.path.join("output", f"{safe_query}_{timestamp}.pdf")
 
+# Aantal recente PDF's met een eigen download knop; oudere via een keuzelijst
+RECENT_PDFS = 10
+
+# Seconden dat de review inbox en de PDF lijst gecached worden; andere processen
+# kunnen reviews parkeren en PDF's schrijven
+INBOX_TTL = 30
+
+# Streamlit voert het hele script uit bij elke interactie. Graphs en model
+# clients zijn singletons per server proces (cache_resource); catalogus
+# queries en rapporten staan in cache_data en worden expliciet geleegd
+# zodra er iets verandert.
+@st.cache_resource(show_spinner="Workflow laden...")
+def load_workflow(version):
+    """Laad en compileer de workflow van een versie een keer per proces."""
+    if version == "v1":
+        from agents import research_agents as module
+        module.get_agent_workflow()
+        module.get_web_research_agent()
+        module.get_pdf_formatting_agent()
+    else:
+        from agents import workflow_v2 as module
+        module.get_app()
+        module.get_web_research_agent()
+    module.get_planning_model()
+    return module
+
+@st.cache_data(ttl=INBOX_TTL)
 def list_pdf_files():
-    """Lijst alle PDF bestanden in de output directory."""
+    """Lijst alle PDF bestanden in de output directory, nieuwste eerst."""
     if not os.path.exists("output"):
         os.makedirs("output")
-    return glob.glob("output/*.pdf")
+    files = []
+    for path in glob.glob("output/*.pdf"):
+        try:
+            files.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            # Verwijderd tussen de glob en de stat
+            continue
+    return [path for _, path in sorted(files, reverse=True)]
+
+@st.cache_data(max_entries=RECENT_PDFS * 2)
+def load_pdf_bytes(pdf_path):
+    """Bytes van een PDF voor een download knop."""
+    # Streamlit bewaart download data zelf in het geheugen; hier is een kopie nodig
+    return bytes(get_pdf_bytes(pdf_path) or b"")
+
+@st.cache_data(ttl=INBOX_TTL)
+def list_pending_reviews():
+    """Openstaande reviews uit de inbox."""
+    return review_inbox.list_pending()
+
+@st.cache_data(max_entries=20)
+def render_report(content):
+    """
+    Render een rapport naar HTML en Markdown.
+    
+    Returns:
+        Tuple van (html, markdown, foutmelding); bij een fout zijn html en markdown None
+    """
+    try:
+        document = build_document(content)
+    except (ValueError, AttributeError) as e:
+        return None, None, str(e)
+    return document.to_html(), document.to_markdown(), None
+
+def invalidate_reports():
+    """Leeg de caches van de PDF lijst en de inbox na een nieuwe of verwijderde PDF of review."""
+    list_pdf_files.clear()
+    list_pending_reviews.clear()
 
 def delete_pdf(pdf_path):
     """Verwijder een PDF bestand."""
     try:
         os.remove(pdf_path)
+        list_pdf_files.clear()
+        load_pdf_bytes.clear()
         return True
     except Exception as e:
         st.error(f"Fout bij verwijderen: {str(e)}")
         return False
 
+def pdf_download(pdf_path, key=None):
+    """Download knop met verwijderknop voor een PDF."""
+    col1, col2 = st.columns([3, 1])
+    
+    # Bestandsnaam zonder pad
+    filename = os.path.basename(pdf_path)
+    
+    # Open PDF knop; recente PDF's komen direct uit het geheugen
+    with col1:
+        st.download_button(
+            label=filename,
+            data=load_pdf_bytes(pdf_path),
+            file_name=filename,
+            mime="application/pdf",
+            key=key or f"download_{filename}"
+        )
+    
+    # Delete knop
+    with col2:
+        if st.button("🗑️", key=f"delete_{filename}"):
+            if delete_pdf(pdf_path):
+                st.success("PDF verwijderd!")
+                st.rerun()
+
 # Pagina configuratie
 st.set_page_config(
     page_title="Web Research Assistant",
@@ -88,6 +183,8 @@ with st.sidebar:
     if st.button("Begin nieuw onderzoek"):
         st.session_state.messages = []
         st.session_state.thread_id = str(uuid.uuid4())
+        st.session_state.report = None
+        st.session_state.reuse_offer = None
         st.rerun()
     
     # Toon lijst van PDFs
@@ -97,28 +194,74 @@ with st.sidebar:
     if not pdf_files:
         st.info("Nog geen PDF rapporten gegenereerd")
     else:
-        for pdf_path in pdf_files:
-            col1, col2 = st.columns([3, 1])
-            
-            # Bestandsnaam zonder pad
-            filename = os.path.basename(pdf_path)
-            
-            # Open PDF knop
-            with col1:
-                with open(pdf_path, "rb") as pdf_file:
-                    st.download_button(
-                        label=filename,
-                        data=pdf_file,
-                        file_name=filename,
-                        mime="application/pdf"
-                    )
+        # Alleen de recente PDF's worden bij elke rerun geladen
+        for pdf_path in pdf_files[:RECENT_PDFS]:
+            pdf_download(pdf_path)
+        
+        older = pdf_files[RECENT_PDFS:]
+        if older:
+            selected_pdf = st.selectbox(
+                f"Oudere rapporten ({len(older)})",
+                older,
+                index=None,
+                format_func=os.path.basename
+            )
+            if selected_pdf:
+                pdf_download(selected_pdf, key="download_older")
+
+# Review inbox voor geparkeerde V2 runs
+if st.session_state.version == "v2":
+    pending_reviews = list_pending_reviews()
+    # Uitkomsten van de vorige beslissing; die zouden anders door de rerun verdwijnen
+    review_outcomes = st.session_state.pop("review_outcomes", [])
+    with st.expander(
+        f"📥 Review inbox ({len(pending_reviews)})",
+        expanded=bool(pending_reviews) or bool(review_outcomes)
+    ):
+        for level, text in review_outcomes:
+            if level == "success":
+                st.success(text)
+            else:
+                st.error(text)
+        
+        if not pending_reviews:
+            st.info("Geen openstaande reviews")
+        else:
+            with st.form("review_inbox"):
+                selected = []
+                for review in pending_reviews:
+                    thread_id = review["thread_id"]
+                    if st.checkbox(review["query"], key=f"select_{thread_id}"):
+                        selected.append(thread_id)
+                    st.code(review["content"] or "", language="json")
+                    st.text_input("Commentaar", key=f"comments_{thread_id}")
+                
+                col1, col2 = st.columns(2)
+                approve = col1.form_submit_button("✅ Goedkeuren")
+                reject = col2.form_submit_button("❌ Afwijzen")
             
-            # Delete knop
-            with col2:
-                if st.button("🗑️", key=f"delete_{filename}"):
-                    if delete_pdf(pdf_path):
-                        st.success("PDF verwijderd!")
-                        st.rerun()
+            if (approve or reject) and selected:
+                decisions = [
+                    {
+                        "thread_id": thread_id,
+                        "approved": bool(approve),
+                        "comments": st.session_state.get(f"comments_{thread_id}", "")
+                    }
+                    for thread_id in selected
+                ]
+                with st.spinner(f"{len(decisions)} review(s) verwerken..."):
+                    outcomes = load_workflow("v2").resume_reviews(decisions)
+                invalidate_reports()
+                messages = []
+                for thread_id, outcome in outcomes.items():
+                    if outcome and outcome.get("pdf_path"):
+                        messages.append(("success", f"PDF gegenereerd: {os.path.basename(outcome['pdf_path'])}"))
+                    elif outcome and outcome.get("error_message"):
+                        messages.append(("error", f"Fout bij {thread_id}: {outcome['error_message']}"))
+                    elif outcome:
+                        messages.append(("success", f"Review verwerkt: {thread_id}"))
+                st.session_state.review_outcomes = messages
+                st.rerun()
 
 # Chat input
 vraag = st.chat_input("Waar wil je meer over weten?")
@@ -137,22 +280,24 @@ if vraag:
     # Voeg vraag toe aan history
     st.session_state.messages.append({"role": "user", "content": vraag})
     
-    # Maak output directory als die niet bestaat
-    if not os.path.exists("output"):
-        os.makedirs("output")
-    
-    # Genereer PDF pad
+    # Genereer de bestandsnaam voor de download
     pdf_path = get_pdf_path(vraag)
     
     # Toon "aan het werk" indicator
     with st.chat_message("assistant"):
         with st.spinner("Even zoeken en verwerken..."):
-            # Kies de juiste workflow op basis van versie
+            # Kies de juiste workflow op basis van versie; de PDF wordt pas bij download gemaakt
             if st.session_state.version == "v1":
-                result = process_query_external(vraag, thread_id=st.session_state.thread_id)
+                result = load_workflow("v1").process_query_external(
+                    vraag, thread_id=st.session_state.thread_id, render_pdf=False
+                )
                 status_message = "Onderzoek voltooid!"
             else:
-                result = process_query_v2(vraag, thread_id=st.session_state.thread_id)
+                result = load_workflow("v2").process_query_v2(
+                    vraag, thread_id=st.session_state.thread_id, render_pdf=False
+                )
+                # Een nieuwe PDF of geparkeerde review moet in de lijsten verschijnen
+                invalidate_reports()
                 
                 # Toon extra informatie voor V2
                 if result.get("review_status") == "approved":
@@ -162,26 +307,31 @@ if vraag:
                 else:
                     status_message = "Onderzoek voltooid, wachtend op review..."
             
-            # Toon resultaat en PDF link
-            if "pdf_path" in result and result["pdf_path"]:
-                # Hernoem de gegenereerde PDF
-                if os.path.exists(result["pdf_path"]):
-                    os.rename(result["pdf_path"], pdf_path)
-                    st.success(f"{status_message} De resultaten zijn opgeslagen in: {os.path.basename(pdf_path)}")
-                    
-                    # Toon download knop
-                    with open(pdf_path, "rb") as pdf_file:
-                        st.download_button(
-                            label="Download PDF Rapport",
-                            data=pdf_file,
-                            file_name=os.path.basename(pdf_path),
-                            mime="application/pdf"
-                        )
+            # Na de deadline komt er een gedeeltelijk rapport terug in plaats van niets
+            if result.get("partial"):
+                status_message = f"Tijd verstreken, dit is een gedeeltelijk rapport ({result.get('error_message')})"
+            
+            # Een vergelijkbaar eerder rapport wordt aangeboden, niet automatisch gebruikt
+            st.session_state.reuse_offer = result.get("reuse_offer")
+            
+            # Bewaar het rapport, zodat het na een rerun (bijvoorbeeld de PDF knop) blijft staan
+            research_results = resolve(result.get("research_results"))
+            if research_results:
+                st.session_state.report = {
+                    "content": research_results,
+                    "pdf_path": result.get("pdf_path"),
+                    "file_name": os.path.basename(pdf_path)
+                }
+                if result.get("partial"):
+                    st.warning(status_message)
+                else:
+                    st.success(status_message)
             else:
+                st.session_state.report = None
                 if st.session_state.version == "v2" and result.get("error_message"):
                     st.error(f"Fout: {result['error_message']}")
                 else:
-                    st.error("Er is iets misgegaan bij het genereren van de PDF.")
+                    st.error("Er is iets misgegaan bij het onderzoek.")
     
     # Voeg antwoord toe aan history
     st.session_state.messages.append({
@@ -189,6 +339,56 @@ if vraag:
         "content": status_message
     })
 
+# Aanbod van een vergelijkbaar eerder rapport
+offer = st.session_state.get("reuse_offer")
+if offer:
+    st.info(describe_offer(offer))
+    if st.button("Toon eerder rapport"):
+        previous = load_report(offer["report_id"])
+        if previous:
+            st.session_state.report = {
+                "content": previous,
+                "pdf_path": None,
+                "file_name": os.path.basename(get_pdf_path(offer["query"]))
+            }
+            st.session_state.reuse_offer = None
+            st.rerun()
+        st.warning("Het eerdere rapport is niet meer beschikbaar.")
+
+# Toon het laatste rapport direct als HTML; de PDF wordt pas op aanvraag gebouwd
+report = st.session_state.get("report")
+if report:
+    report_html, report_markdown, render_error = render_report(report["content"])
+    if render_error:
+        st.warning(f"Rapport kan niet weergegeven worden: {render_error}")
+    
+    if report_html is not None:
+        with st.container(border=True):
+            st.markdown(report_html, unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="Download Markdown",
+                data=report_markdown,
+                file_name=report["file_name"].replace(".pdf", ".md"),
+                mime="text/markdown"
+            )
+        with col2:
+            pdf_bytes = load_pdf_bytes(report["pdf_path"]) if report.get("pdf_path") else None
+            if pdf_bytes:
+                st.download_button(
+                    label="Download PDF Rapport",
+                    data=pdf_bytes,
+                    file_name=report["file_name"],
+                    mime="application/pdf"
+                )
+            elif st.button("Maak PDF"):
+                with st.spinner("PDF maken..."):
+                    report["pdf_path"] = store_pdf(build_document(report["content"]).to_pdf_bytes())
+                list_pdf_files.clear()
+                st.rerun()
+
 # Toon extra informatie over de actieve versie
 st.sidebar.markdown("---")
 st.sidebar.markdown(f"**Actieve versie: {'V1' if st.session_state.version == 'v1' else 'V2'}**")
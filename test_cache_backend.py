@@ -0,0 +1,41 @@
+import sys
+import os
+
+import pytest
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("dotenv")
+from agents.cache_backend import SharedCache
+
+def test_items_en_trim(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    for key in ["a", "b", "c"]:
+        cache.set("test", key, key.upper())
+    assert cache.items("test") == [("a", "A"), ("b", "B"), ("c", "C")]
+    assert cache.trim("test", 2) == ["a"]
+    cache.delete("test", "b")
+    assert cache.items("test") == [("c", "C")]
+    cache.clear("test")
+    assert cache.items("test") == []
+
+def test_onleesbare_entry_wordt_overgeslagen(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    cache.set("test", "a", "A")
+    cache.set("test", "b", "B")
+    with cache._transaction() as conn:
+        conn.execute("UPDATE entries SET value = ? WHERE key = 'a'", (b"kapot",))
+    assert cache.items("test") == [("b", "B")]
+
+def test_sqlite_fouten_worden_afgevangen(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    cache.set("test", "a", "A")
+    cache._conn().execute("DROP TABLE entries")
+
+    assert cache.get("test", "a") is None
+    assert cache.items("test") == []
+    assert cache.trim("test", 0) == []
+    cache.delete("test", "a")
+    cache.clear("test")
+    cache.clear()
@@ -0,0 +1,43 @@
+import sys
+import os
+import time
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.tools.fetch_guard import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, NegativeCache
+
+def test_breaker_gaat_open_na_genoeg_fouten():
+    breaker = CircuitBreaker("a.com", failure_rate=0.5, min_calls=3, open_seconds=60)
+    assert breaker.record(False) is False
+    assert breaker.record(True) is False
+    assert breaker.record(False) is True
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+def test_breaker_half_open_laat_een_proef_door():
+    breaker = CircuitBreaker("a.com", failure_rate=0.5, min_calls=1, open_seconds=0)
+    assert breaker.record(False) is True
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+
+    # Een mislukte proef opent de breaker weer, een geslaagde sluit hem
+    assert breaker.record(False) is True
+    assert breaker.allow() is True
+    assert breaker.record(True) is False
+    assert breaker.state == CLOSED
+    assert breaker.as_dict() == {"state": CLOSED, "calls": 0, "failures": 0}
+
+def test_negatieve_cache_vergeet_na_ttl():
+    cache = NegativeCache(ttl=0.05)
+    cache.add("https://a.com", "timeout")
+    assert cache.get("https://a.com") == "timeout"
+    time.sleep(0.06)
+    assert cache.get("https://a.com") is None
+
+def test_negatieve_cache_begrensd():
+    cache = NegativeCache(ttl=60, max_size=2)
+    for key in ["a", "b", "c"]:
+        cache.add(key, "fout")
+    assert cache.get("a") is None
+    assert cache.get("c") == "fout"
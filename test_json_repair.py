@@ -0,0 +1,62 @@
+import sys
+import os
+
+import pytest
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("langchain_core")
+from agents.json_repair import REPORT_SECTIONS, parse_report
+
+def report_json(sections=REPORT_SECTIONS, title="Toller"):
+    body = ", ".join(f'"{section}": "tekst over {section}"' for section in sections)
+    return f'{{"title": "{title}", "sections": {{{body}}}}}'
+
+class SectionModel:
+    """Geeft alleen de gevraagde secties terug."""
+
+    def __init__(self, sections):
+        self.sections = sections
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[0].content)
+        body = ", ".join(f'"{section}": "aangevuld"' for section in self.sections)
+        return type("Response", (), {"content": f"{{{body}}}"})()
+
+def test_code_fence_en_tekst_rondom():
+    content = f"Hier is het rapport:\n```json\n{report_json()}\n```\nSucces!"
+    report = parse_report(content)
+    assert report["title"] == "Toller"
+    assert list(report["sections"]) == REPORT_SECTIONS
+
+def test_trailing_comma_en_smart_quotes():
+    content = report_json().replace('"Toller"', "“Toller”").replace("}}", ",},}")
+    assert parse_report(content)["title"] == "Toller"
+
+def test_anthropic_content_blokken():
+    content = [{"type": "text", "text": "Rapport:"}, {"type": "tool_use", "input": {"content": report_json()}}]
+    assert parse_report(content)["sections"]["Bronnen"] == "tekst over Bronnen"
+
+def test_afgekapt_rapport_wordt_afgesloten():
+    content = report_json()[:-2]
+    assert parse_report(content)["sections"]["Bronnen"] == "tekst over Bronnen"
+
+def test_standaard_titel():
+    assert parse_report(report_json(title=""))["title"] == "Onderzoeksrapport"
+
+def test_ontbrekende_sectie_zonder_llm():
+    with pytest.raises(ValueError, match="Bronnen"):
+        parse_report(report_json(REPORT_SECTIONS[:-1]))
+
+def test_alleen_ontbrekende_secties_worden_opgevraagd():
+    model = SectionModel(["Bronnen"])
+    report = parse_report(report_json(REPORT_SECTIONS[:-1]), llm=model)
+    assert report["sections"]["Bronnen"] == "aangevuld"
+    assert report["sections"]["Samenvatting"] == "tekst over Samenvatting"
+    assert len(model.prompts) == 1 and "Bronnen" in model.prompts[0]
+
+def test_geen_json():
+    with pytest.raises(ValueError):
+        parse_report("Sorry, dat kan ik niet.")
@@ -0,0 +1,25 @@
+import sys
+import os
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.report_model import inline_html
+
+def test_link_gevolgd_door_cursief():
+    assert inline_html("[a](https://a.com) is _belangrijk_") == (
+        '<a href="https://a.com" target="_blank">a</a> is <em>belangrijk</em>'
+    )
+
+def test_url_met_underscores_blijft_heel():
+    assert inline_html("zie [bron](https://a.com/a_b_c) en *dit*") == (
+        'zie <a href="https://a.com/a_b_c" target="_blank">bron</a> en <em>dit</em>'
+    )
+
+def test_vet_cursief_en_code():
+    assert inline_html("**vet**, *cursief* en `**code**`") == (
+        "<strong>vet</strong>, <em>cursief</em> en <code>**code**</code>"
+    )
+
+def test_html_wordt_escaped():
+    assert inline_html("<b>x</b> & y") == "&lt;b&gt;x&lt;/b&gt; &amp; y"
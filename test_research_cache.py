@@ -0,0 +1,41 @@
+import sys
+import os
+
+import pytest
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("dotenv")
+from agents import research_cache
+from agents.research_cache import _similarity, extract_terms
+
+def score(query, other):
+    return _similarity(query, [{"terms": extract_terms(other)}])[0]
+
+def test_zelfde_vraag_met_andere_schrijfwijze():
+    assert score("wat is een toller", "Wat is een toller?") == pytest.approx(1.0)
+    assert score("geschiedenis van de eiffeltoren", "de geschiedenis van de Eiffeltoren") == pytest.approx(1.0)
+
+def test_andere_vraag_onder_drempel_voor_hergebruik():
+    threshold = research_cache._similarity_threshold()
+    for query, other in [
+        ("wat is een toller", "wat eet een toller"),
+        ("tesla model 3", "tesla model y"),
+        ("wat is een toller", "hoe oud wordt een toller"),
+    ]:
+        assert score(query, other) < threshold
+
+def test_vergelijkbare_vraag_wordt_alleen_aangeboden(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESEARCH_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("AGENTS_SHARED_CACHE", raising=False)
+    report = '{"title": "Toller", "sections": {"Samenvatting": "Een jachthond."}}'
+    research_cache.store_report("wat is een toller", report)
+
+    assert research_cache.lookup_report("wat eet een toller") is None
+    offer = research_cache.find_offer("wat eet een toller")
+    assert offer["query"] == "wat is een toller"
+    assert research_cache.load_report(offer["report_id"]) == report
+
+    assert research_cache.lookup_report("Wat is een toller?").research_results == report
+    assert research_cache.find_offer("Wat is een toller?") is None
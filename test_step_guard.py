@@ -0,0 +1,55 @@
+import sys
+import os
+
+import pytest
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("langgraph")
+from langgraph.graph import END
+
+from agents.step_guard import StepGuard, state_fingerprint
+
+def test_fingerprint_negeert_berichten_en_guard_velden():
+    state = {"query": "toller", "research_status": "pending"}
+    noisy = {
+        **state,
+        "messages": ["nieuw bericht"],
+        "node_visits": {"web_research": 3},
+        "step_trace": ["web_research:abc"],
+    }
+    assert state_fingerprint(noisy) == state_fingerprint(state)
+
+def test_fingerprint_onafhankelijk_van_volgorde():
+    assert state_fingerprint({"a": 1, "b": [1, 2]}) == state_fingerprint({"b": [1, 2], "a": 1})
+    assert state_fingerprint({"a": 1}) != state_fingerprint({"a": 2})
+
+def test_lus_zonder_voortgang_stopt_de_run():
+    guard = StepGuard("test", max_steps=10, default_max_visits=10, max_repeats=1)
+    node = guard.node("research", lambda state: {"research_status": "pending"})
+    state = {"research_status": "pending"}
+
+    state = {**state, **node(state)}
+    assert not state.get("terminal_reason")
+    # Tweede bezoek met dezelfde state is een lus
+    state = {**state, **node(state)}
+    assert state["terminal_reason"].startswith("Lus gedetecteerd")
+    assert guard.route(lambda s: "research")(state) == END
+
+def test_maximum_bezoeken_per_node():
+    guard = StepGuard("test", max_steps=10, max_visits=lambda: {"research": 2})
+    node = guard.node("research", lambda state: {"count": state.get("count", 0) + 1})
+    state = {}
+    for _ in range(3):
+        state = {**state, **node(state)}
+    assert state["count"] == 2
+    assert "maximaal 2" in state["terminal_reason"]
+
+def test_stapbudget():
+    guard = StepGuard("test", max_steps=2)
+    node = guard.node("research", lambda state: {"count": state.get("count", 0) + 1})
+    state = {}
+    for _ in range(3):
+        state = {**state, **node(state)}
+    assert state["terminal_reason"].startswith("Stapbudget op")
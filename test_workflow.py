@@ -0,0 +1,28 @@
+import sys
+import os
+import json
+
+import pytest
+
+# Voeg de project root toe aan Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("langgraph")
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agents.tools.web_tools import fetch_webpage_content
+from agents.workflow import _partial_results
+
+def test_partial_report_met_bronnen():
+    url = "https://example.com/toller"
+    call = {"id": "call-1", "name": fetch_webpage_content.name, "args": {"url": url}}
+    loop_messages = [
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="De toller is een jachthond.", tool_call_id="call-1", name=call["name"]),
+    ]
+    state = {"messages": [HumanMessage(content="wat is een toller")]}
+
+    report = json.loads(_partial_results("wat is een toller", state, loop_messages, "Deadline verstreken"))
+    sections = report["sections"]
+    assert "De toller is een jachthond." in sections["Belangrijkste Resultaten"]
+    assert sections["Bronnen"] == [{"url": url, "titel": url}]